@@ -0,0 +1,69 @@
+"""Per-entry memory footprint of Entry model instances vs EntryRecords, as they sit in InsertBuffer
+
+Usage: python benchmarks/entry_footprint.py [number of entries]
+"""
+import os
+import sys
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'glommer.settings')
+os.environ.setdefault('SECRET_KEY', 'benchmark')
+
+import django  # noqa: E402
+django.setup()
+
+from webscraper.models import Channel, Entry  # noqa: E402
+from webscraper.records import EntryRecord  # noqa: E402
+
+ITEMS = {'images': ['http://host.com/img/%d.jpg' % i for i in range(5)]}
+
+
+def make_models(channel, n):
+    entries = []
+
+    for i in range(n):
+        entry = Entry(channel=channel, url='http://host.com/entry/%d' % i, title='Entry title %d' % i)
+        entry.clean_fields(exclude=['channel'])
+        entry.status, entry.items = Entry.ST_OK, ITEMS
+        entries.append(entry)
+
+    return entries
+
+
+def make_records(channel, n):
+    records = []
+
+    for i in range(n):
+        record = EntryRecord(channel.id, 'http://host.com/entry/%d' % i, 'Entry title %d' % i)
+        record.status, record.items = Entry.ST_OK, ITEMS
+        records.append(record)
+
+    return records
+
+
+def measure(factory, channel, n):
+    tracemalloc.start()
+    before, _ = tracemalloc.get_traced_memory()
+    objects = factory(channel, n)
+    after, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del objects
+    return (after - before) / n
+
+
+def main():
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 10000
+    channel = Channel(id=1, title='Benchmark', url='http://host.com/')
+
+    model_size = measure(make_models, channel, n)
+    record_size = measure(make_records, channel, n)
+
+    print('%d entries' % n)
+    print('Entry model instance: %8.0f bytes/entry' % model_size)
+    print('EntryRecord:          %8.0f bytes/entry' % record_size)
+    print('Reduction:            %8.1fx' % (model_size / record_size))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,86 @@
+"""Admin entry search on a generated large table, with trigram indexes vs sequential scan
+
+Generates entries inside a transaction in the configured database and rolls it back afterwards.
+
+Usage: python benchmarks/entry_search.py [number of entries] [search term]
+"""
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'glommer.settings')
+os.environ.setdefault('SECRET_KEY', 'benchmark')
+
+import django  # noqa: E402
+django.setup()
+
+from django.contrib import admin  # noqa: E402
+from django.db import connection, transaction  # noqa: E402
+from django.test.client import RequestFactory  # noqa: E402
+
+from webscraper.admin import EntryAdmin  # noqa: E402
+from webscraper.insbuffer import InsertBuffer, CopyWriter  # noqa: E402
+from webscraper.models import Channel, Entry  # noqa: E402
+from webscraper.records import EntryRecord  # noqa: E402
+
+BATCH_SIZE = 10000
+REPEAT = 5
+WORDS = ['video', 'gallery', 'photo', 'review', 'news', 'music', 'travel', 'sport', 'movie', 'weekly']
+
+
+class Rollback(Exception):
+    pass
+
+
+def generate(channel, n):
+    with InsertBuffer(BATCH_SIZE, writer=CopyWriter()) as buf:
+        for i in range(n):
+            words = ' '.join(WORDS[(i * k) % len(WORDS)] for k in (1, 3, 7))
+            buf.add(EntryRecord(channel.id, 'http://host%d.com/%s/%d' % (i % 100, words.replace(' ', '-'), i),
+                                '%s %d' % (words.title(), i)))
+
+
+def search_sql(term):
+    model_admin = EntryAdmin(Entry, admin.site)
+    qs, _ = model_admin.get_search_results(RequestFactory().get('/'), Entry.objects.all(), term)
+    return qs.query.sql_with_params()
+
+
+def best_time(cursor, sql, params):
+    times = []
+
+    for _ in range(REPEAT):
+        start = time.perf_counter()
+        cursor.execute(sql, params)
+        cursor.fetchall()
+        times.append(time.perf_counter() - start)
+
+    return min(times)
+
+
+def main(n, term):
+    try:
+        with transaction.atomic(), connection.cursor() as cursor:
+            channel = Channel.objects.create(title='Benchmark', url='http://benchmark.com/')
+            start = time.perf_counter()
+            generate(channel, n)
+            print('Generated %d entries in %.1f s' % (n, time.perf_counter() - start))
+            cursor.execute('ANALYZE webscraper_entry')
+
+            sql, params = search_sql(term)
+            indexed = best_time(cursor, sql, params)
+            cursor.execute('SET LOCAL enable_bitmapscan = off')
+            cursor.execute('SET LOCAL enable_indexscan = off')
+            seqscan = best_time(cursor, sql, params)
+
+            print('Search for %r: %.1f ms with trigram indexes, %.1f ms with sequential scan' %
+                  (term, indexed * 1000, seqscan * 1000))
+            raise Rollback
+
+    except Rollback:
+        pass
+
+
+if __name__ == '__main__':
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 1000000, sys.argv[2] if len(sys.argv) > 2 else 'weekly 4242')
@@ -137,10 +137,21 @@ STATIC_URL = '/static/'
 STATICFILES_STORAGE = 'whitenoise.storage.CompressedManifestStaticFilesStorage'
 
 
+# Fraction of per-entry info log records to keep, warnings and errors are always logged
+LOG_ENTRY_SAMPLE_RATE = float(os.environ.get('LOG_ENTRY_SAMPLE_RATE', 1))
+
+# Handlers pass records to a listener thread, so writing them does not block the scraper event loop
 LOGGING = {
     'version': 1,
     'disable_existing_loggers': False,
 
+    'filters': {
+        'entry_sample': {
+            '()': 'webscraper.logqueue.SamplingFilter',
+            'rate': LOG_ENTRY_SAMPLE_RATE,
+        },
+    },
+
     'formatters': {
         'verbose': {
             'format': '%(levelname)s %(asctime)s %(name)s %(message)s',
@@ -154,14 +165,17 @@ LOGGING = {
     'handlers': {
         'console': {
             'level': 'DEBUG',
-            'class': 'logging.StreamHandler',
+            'class': 'webscraper.logqueue.QueueListenerHandler',
+            'target': 'logging.StreamHandler',
             'formatter': 'verbose'
         },
 
         'file': {
             'level': 'DEBUG',
-            'class': 'logging.FileHandler',
+            'class': 'webscraper.logqueue.QueueListenerHandler',
+            'target': 'logging.FileHandler',
             'filename': os.path.join(BASE_DIR, 'debug.log'),
+            'delay': True,
             'formatter': 'simple'
         },
 
@@ -182,10 +196,48 @@ LOGGING = {
             'handlers': ['console'],
             'level': os.getenv('DJANGO_LOG_LEVEL', 'WARNING'),
         },
+
+        'webscraper.processing.entries': {
+            'filters': ['entry_sample'],
+        },
     },
 }
 
 
+# Directory to keep scraper state (host latency statistics etc.) between runs. State is not kept if unset
+SCRAPER_STATE_DIR = os.environ.get('SCRAPER_STATE_DIR')
+
+# Scraper HTTP connection limits, in total and per host, and seconds idle connections are kept open for reuse
+SCRAPER_CONNECTION_LIMIT = int(os.environ.get('SCRAPER_CONNECTION_LIMIT', 100))
+SCRAPER_CONNECTION_LIMIT_PER_HOST = int(os.environ.get('SCRAPER_CONNECTION_LIMIT_PER_HOST', 2))
+SCRAPER_KEEPALIVE_TIMEOUT = float(os.environ.get('SCRAPER_KEEPALIVE_TIMEOUT', 30))
+
+# Directory to archive fetched responses to, for offline re-extraction with `manage.py reextract`. Off if unset
+SCRAPER_ARCHIVE_DIR = os.environ.get('SCRAPER_ARCHIVE_DIR')
+
+# Directory to write scrape traces to, one JSON lines file per run with spans per channel and entry. Off if unset
+SCRAPER_TRACE_DIR = os.environ.get('SCRAPER_TRACE_DIR')
+
+# Store extracted media urls in a separate table, one row per url, and render feeds from it. Off if unset
+MEDIA_ITEMS = bool(os.environ.get('MEDIA_ITEMS'))
+
+# Directory to write channel feed files to after each scrape, for serving them without database access. Off if unset
+FEED_PUBLISH_DIR = os.environ.get('FEED_PUBLISH_DIR')
+
+# Site url that absolute links in published feeds are built from, and published feed formats
+FEED_PUBLISH_URL = os.environ.get('FEED_PUBLISH_URL', 'http://localhost:8080')
+FEED_PUBLISH_FORMATS = os.environ.get('FEED_PUBLISH_FORMATS', 'rss').split(',')
+
+# Default entry retention limits for `manage.py prune`, for channels that do not set their own. No limit if unset
+ENTRY_MAX_ENTRIES = int(os.environ['ENTRY_MAX_ENTRIES']) if os.environ.get('ENTRY_MAX_ENTRIES') else None
+ENTRY_MAX_AGE_DAYS = int(os.environ['ENTRY_MAX_AGE_DAYS']) if os.environ.get('ENTRY_MAX_AGE_DAYS') else None
+
+# Link new entries to earlier ones of the same channel with content fingerprints at most this many bits apart (0-3),
+# drop their items and leave them out of feeds. Off if unset
+ENTRY_DUPLICATE_DISTANCE = os.environ.get('ENTRY_DUPLICATE_DISTANCE')
+ENTRY_DUPLICATE_DISTANCE = int(ENTRY_DUPLICATE_DISTANCE) if ENTRY_DUPLICATE_DISTANCE else None
+
+
 # Honor the 'X-Forwarded-Proto' header for request.is_secure()
 SECURE_PROXY_SSL_HEADER = ('HTTP_X_FORWARDED_PROTO', 'https')
 
@@ -3,3 +3,12 @@ from django.apps import AppConfig
 
 class PubConfig(AppConfig):
     name = 'pub'
+
+    def ready(self):
+        from django.db.models.signals import post_delete
+        from webscraper.models import Channel
+        from webscraper.signals import scrape_finished, feeds_changed
+        from .publishing import publish_scraped, unpublish_deleted
+        scrape_finished.connect(publish_scraped, dispatch_uid='pub.publish_scraped')
+        feeds_changed.connect(publish_scraped, dispatch_uid='pub.publish_changed')
+        post_delete.connect(unpublish_deleted, sender=Channel, dispatch_uid='pub.unpublish_deleted')
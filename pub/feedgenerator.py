@@ -0,0 +1,71 @@
+"""Feed generators that produce the document incrementally, with RFC 5005 feed history links"""
+import io
+
+from django.utils.feedgenerator import Rss201rev2Feed, Atom1Feed
+from django.utils.xmlutils import SimplerXMLGenerator
+
+
+HISTORY_NS = 'http://purl.org/syndication/history/1.0'
+
+
+class StreamingFeedMixin(object):
+
+    """Writes document head and tail once and items as they come, instead of building the whole document.
+
+    Feed history: `archive` marks an archive document, `history_links` is a list of (rel, href) pairs
+    """
+
+    link_element = 'link'
+
+    _head_out = None    # Output of document head while streaming, see write_items()
+
+    def stream(self, items, encoding='utf-8'):
+        """Generates document in chunks, serializing item kwargs dicts from `items` iterable one at a time"""
+        out = io.StringIO()
+        self._head_out = out
+        self.items = []
+
+        try:
+            self.write(out, encoding)
+
+        finally:
+            self._head_out = None
+
+        document = out.getvalue()
+        yield document[:self._items_offset]
+
+        for item in items:
+            out = io.StringIO()
+            self.items = [item]
+            super(StreamingFeedMixin, self).write_items(SimplerXMLGenerator(out, encoding))
+            yield out.getvalue()
+
+        yield document[self._items_offset:]
+
+    def write_items(self, handler):
+        if self._head_out is None:
+            return super(StreamingFeedMixin, self).write_items(handler)
+
+        self._items_offset = self._head_out.tell()   # Items go here, stream() writes them
+
+    def root_attributes(self):
+        attrs = super(StreamingFeedMixin, self).root_attributes()
+        attrs['xmlns:fh'] = HISTORY_NS
+        return attrs
+
+    def add_root_elements(self, handler):
+        super(StreamingFeedMixin, self).add_root_elements(handler)
+
+        if self.feed.get('archive'):
+            handler.addQuickElement('fh:archive', '')
+
+        for rel, href in self.feed.get('history_links') or []:
+            handler.addQuickElement(self.link_element, None, {'rel': rel, 'href': href})
+
+
+class StreamingRssFeed(StreamingFeedMixin, Rss201rev2Feed):
+    link_element = 'atom:link'
+
+
+class StreamingAtomFeed(StreamingFeedMixin, Atom1Feed):
+    pass
@@ -1,7 +1,18 @@
+import os
+from calendar import timegm
+from itertools import islice
+
+from django.conf import settings
 from django.contrib.syndication.views import Feed
+from django.db.models import Max, Prefetch, prefetch_related_objects
+from django.http import FileResponse, Http404, StreamingHttpResponse
 from django.shortcuts import get_object_or_404
 from django.template.loader import get_template, render_to_string
-from webscraper.models import Channel, Entry
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.utils.http import http_date, urlencode
+from webscraper.models import Channel, Entry, MediaItem
+from webscraper.pagination import keyset_cursor, keyset_filter
+from .feedgenerator import StreamingRssFeed, StreamingAtomFeed
 
 
 FEED_TTL = {
@@ -11,10 +22,182 @@ FEED_TTL = {
     Channel.I_MANUAL: 1440
 }
 
+FEED_PAGE_SIZE = 500    # Entries per feed document, older ones are in archive documents
+ITEM_CHUNK_SIZE = 100   # Entries serialized per database round trip while streaming
+CURSOR_VAR = 'before'
+
+
+def published_path(channel_slug, feed_format):
+    """Path to pre-rendered feed file, or None if feeds are not published"""
+    publish_dir = getattr(settings, 'FEED_PUBLISH_DIR', None)
+    return os.path.join(publish_dir, channel_slug, '%s.xml' % feed_format) if publish_dir else None
+
+
+def published_mtime(path, channel):
+    """Modification time of published feed file, None if there is no file or channel changed after it was written"""
+    try:
+        mtime = os.path.getmtime(path) if path is not None else None
+
+    except OSError:
+        return None
+
+    if mtime is not None and channel.updated is not None and mtime < channel.updated.timestamp():
+        return None
+
+    return mtime
+
+
+def media_prefetch():
+    return Prefetch('media', queryset=MediaItem.objects.order_by('position'))
+
+
+def prefetch_media(entries):
+    """Prefetch media items of entries. Deferred items field of entries without media items is loaded in one query"""
+    prefetch_related_objects(entries, media_prefetch())
+    bare = {entry.pk: entry for entry in entries if not entry.media.all()}
+
+    for pk, items in Entry.objects.filter(pk__in=bare).values_list('pk', 'items') if bare else ():
+        bare[pk].items = items
+
+
+def last_modified(channels, entries):
+    """Time entries of channels last changed, as timestamp. Channels never updated fall back to time newest entry
+    was added. None if feed is empty"""
+    times = [channel.updated for channel in channels if channel.updated is not None]
+
+    if len(times) < len(channels):
+        added = entries.aggregate(last_modified=Max('added'))['last_modified']
+        times += [added] if added else []
+
+    return timegm(max(times).utctimetuple()) if times else None
+
+
+def feed_entries(channel_ids):
+    """Feed entries of channels, newest first, in one query"""
+    entries = (Entry.objects
+               .filter(channel_id__in=channel_ids, status=1, duplicate_of__isnull=True)
+               .order_by('-added', '-id'))
+
+    if getattr(settings, 'MEDIA_ITEMS', False):
+        entries = entries.defer('items')    # Read from media items, see prefetch_media()
+
+    return entries
+
+
+class FeedPage:
+
+    """Entries of one feed document: newest ones, or archive page of entries older than cursor (RFC 5005)"""
+
+    def __init__(self, entries, cursor=None, size=FEED_PAGE_SIZE):
+        """`entries` - queryset ordered newest first. Raises ValueError on invalid cursor"""
+        page_entries = entries.filter(keyset_filter(cursor)) if cursor else entries
+        edge = list(page_entries.only('id', 'added')[size - 1:size + 1])
+
+        self.archive = cursor is not None
+        self.entries = page_entries[:size]
+        self.prev_cursor = keyset_cursor(edge[0]) if len(edge) > 1 else None   # Older archive page
+        self.next_cursor = None     # Newer archive page, None if it is the current document
+        self.chunk = []             # Entries being serialized
+        self.links = []
+
+        if cursor:
+            newer_entries = entries.exclude(keyset_filter(cursor)).only('id', 'added').order_by('added', 'id')
+            newer = list(newer_entries[size:size + 1])
+            self.next_cursor = keyset_cursor(newer[0]) if newer else None
+
+
 class ChannelFeed(Feed):
     """Channel feed implementation"""
+    feed_type = StreamingRssFeed
+    feed_format = 'rss'
+    page_size = FEED_PAGE_SIZE
+
+    def __call__(self, request, *args, **kwargs):
+        """Serve published feed file if it is up to date, stream feed document otherwise. Supports conditional GET"""
+        cursor = request.GET.get(CURSOR_VAR)
+        obj = self.get_object(request, *args, **kwargs)
+        path = self.published_path(**kwargs) if cursor is None else None
+        mtime = published_mtime(path, obj)
+
+        if mtime is not None:
+            last_modified = int(mtime)
+            response = get_conditional_response(request, last_modified=last_modified)
+            response = response or FileResponse(open(path, 'rb'), content_type=self.feed_type.content_type)
+
+        else:
+            last_modified = self.last_modified(obj)
+            response = get_conditional_response(request, last_modified=last_modified)
+
+        if response is None:
+            try:
+                feedgen, chunks = self.stream(obj, request, cursor)
+
+            except ValueError:
+                raise Http404('Invalid feed page')
+
+            response = StreamingHttpResponse(chunks, content_type=feedgen.content_type)
+
+        if last_modified is not None:
+            response['Last-Modified'] = http_date(last_modified)
+
+        patch_cache_control(response, max_age=self.ttl(obj) * 60)
+        return response
+
+    def published_path(self, channel_slug):
+        return published_path(channel_slug, self.feed_format)
+
+    def last_modified(self, channel):
+        return last_modified([channel], self.entries(channel))
+
+    def stream(self, channel, request, cursor=None):
+        """Feed generator and its document in chunks, entries are read with server side cursor"""
+        page = FeedPage(self.entries(channel), cursor, self.page_size)
+        page.links = self.history_links(page, request)
+        channel.feed_page = page
+        feedgen = self.get_feed(channel, request)
+        return feedgen, feedgen.stream(self.stream_items(channel, request))
+
+    def stream_items(self, channel, request):
+        """Generates feed item dicts, serializing entries in chunks"""
+        page = channel.feed_page
+        entries = page.entries.iterator()
+
+        while True:
+            page.chunk = list(islice(entries, ITEM_CHUNK_SIZE))
+
+            if not page.chunk:
+                break
+
+            if getattr(settings, 'MEDIA_ITEMS', False):
+                prefetch_media(page.chunk)
+
+            yield from self.get_feed(channel, request).items
+
+    def history_links(self, page, request):
+        """RFC 5005 (rel, href) links of feed document"""
+        def href(cursor=None):
+            return request.build_absolute_uri(request.path + ('?' + urlencode({CURSOR_VAR: cursor}) if cursor else ''))
+
+        links = [('current', href())] if page.archive else []
+
+        if page.prev_cursor:
+            links.append(('prev-archive', href(page.prev_cursor)))
+
+        if page.archive:
+            links.append(('next-archive', href(page.next_cursor)))
+
+        return links
+
+    def feed_extra_kwargs(self, channel):
+        page = getattr(channel, 'feed_page', None)
+        return {'archive': page.archive, 'history_links': page.links} if page is not None else {}
+
     # ttl = 1440 # 60 minutes * 24 hours  TODO: this should
     def ttl(self, channel):
+        if channel.interval == Channel.I_AUTO:
+            interval = channel.auto_interval or Channel.AUTO_INTERVAL_INITIAL
+            return int(interval.total_seconds() // 60)
+
         return FEED_TTL[channel.interval]
 
 
@@ -31,7 +214,21 @@ class ChannelFeed(Feed):
         return "Latest entries from %s" % channel.title
 
     def items(self, channel):
-        return Entry.objects.filter(channel=channel, status=1).order_by('-added')
+        page = getattr(channel, 'feed_page', None)
+
+        if page is not None:
+            return page.chunk
+
+        entries = list(self.entries(channel)[:self.page_size])
+
+        if getattr(settings, 'MEDIA_ITEMS', False):
+            prefetch_media(entries)
+
+        return entries
+
+    def entries(self, channel):
+        """All entries of channel feed, newest first"""
+        return feed_entries([channel.id])
 
     def item_link(self, entry):
         return entry.final_url or entry.url
@@ -40,5 +237,67 @@ class ChannelFeed(Feed):
         return entry.title
 
     def item_description(self, entry):
-        ctx = {'entry': entry, 'itemsets': entry.items}
+        ctx = {'entry': entry, 'itemsets': entry.itemsets()}
         return render_to_string('entry_description.html', ctx)
+
+
+class ChannelSet:
+
+    """Several channels served as one feed"""
+
+    def __init__(self, title, channels, link):
+        self.title = title
+        self.channels = channels
+        self.link = link
+
+
+class AggregateFeed(ChannelFeed):
+    """Entries of several channels merged into one feed. Channels are selected by group or by list of slugs"""
+
+    def get_object(self, request, group=None, channel_slugs=None):
+        if group is not None:
+            channels = Channel.objects.filter(group=group)
+        else:
+            channels = Channel.objects.filter(slug__in=channel_slugs.split(','))
+
+        channels = list(channels.order_by('title'))
+
+        if not channels:
+            raise Http404('No channels')
+
+        return ChannelSet(group or ', '.join(c.title for c in channels), channels, request.path)
+
+    def published_path(self, **kwargs):
+        return None
+
+    def last_modified(self, channel_set):
+        return last_modified(channel_set.channels, self.entries(channel_set))
+
+    def ttl(self, channel_set):
+        return min(super(AggregateFeed, self).ttl(channel) for channel in channel_set.channels)
+
+    def link(self, channel_set):
+        return channel_set.link
+
+    def description(self, channel_set):
+        return "Latest entries from %s" % ', '.join(channel.title for channel in channel_set.channels)
+
+    def entries(self, channel_set):
+        return feed_entries([channel.id for channel in channel_set.channels])
+
+
+class AtomFeedMixin:
+    """Feed in Atom format"""
+    feed_type = StreamingAtomFeed
+    feed_format = 'atom'
+
+    def subtitle(self, obj):
+        return self.description(obj)
+
+
+class AtomChannelFeed(AtomFeedMixin, ChannelFeed):
+    pass
+
+
+class AtomAggregateFeed(AtomFeedMixin, AggregateFeed):
+    pass
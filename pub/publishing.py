@@ -0,0 +1,96 @@
+"""Pre-rendered feed files, written after each scrape so feed requests need no database access"""
+import logging
+import os
+import shutil
+import tempfile
+from urllib.parse import urlparse
+
+from django.conf import settings
+from django.http import HttpRequest
+from django.urls import reverse
+
+from .feeds import ChannelFeed, AtomChannelFeed, published_path
+
+
+FEEDS = {
+    'rss': (ChannelFeed, 'feed'),
+    'atom': (AtomChannelFeed, 'atom_feed'),
+}
+
+logger = logging.getLogger(__name__)
+
+
+class PublishRequest(HttpRequest):
+
+    """Stand-in request for rendering feeds outside of request cycle. Links are built from site url"""
+
+    def __init__(self, site_url, path):
+        super(PublishRequest, self).__init__()
+        parsed = urlparse(site_url)
+        self._scheme, self._host = parsed.scheme, parsed.netloc
+        self.path = self.path_info = path
+
+    @property
+    def scheme(self):
+        return self._scheme
+
+    def get_host(self):
+        return self._host
+
+
+def publish_scraped(sender, channels, **kwargs):
+    """scrape_finished and feeds_changed receiver"""
+    if getattr(settings, 'FEED_PUBLISH_DIR', None):
+        publish_feeds(channels)
+
+
+def unpublish_deleted(sender, instance, **kwargs):
+    """Channel post_delete receiver, removes feed files of deleted channel"""
+    publish_dir = getattr(settings, 'FEED_PUBLISH_DIR', None)
+
+    if publish_dir and instance.slug:
+        shutil.rmtree(os.path.join(publish_dir, instance.slug), ignore_errors=True)
+
+
+def publish_feeds(channels, formats=None):
+    """Render feeds of channels and write them to FEED_PUBLISH_DIR. Failures are logged per feed, they are not
+    raised, so one broken channel or unwritable directory does not fail the scrape or other channels"""
+    formats = formats or settings.FEED_PUBLISH_FORMATS
+    published = 0
+
+    for channel in channels:
+        failed = False
+
+        for feed_format in formats:
+            try:
+                feed_class, url_name = FEEDS[feed_format]
+                path = reverse(url_name, kwargs={'channel_slug': channel.slug})
+                request = PublishRequest(settings.FEED_PUBLISH_URL, path)
+                _, chunks = feed_class().stream(channel, request)
+                content = ''.join(chunks).encode('utf-8')
+                write_atomic(published_path(channel.slug, feed_format), content)
+
+            except Exception:
+                failed = True
+                logger.exception('Failed to publish %s feed of %r', feed_format, channel)
+
+        published += 0 if failed else 1
+
+    logger.info('Published feeds for %d of %d channels', published, len(channels))
+
+
+def write_atomic(path, content):
+    """Write file via temporary file and rename, so readers never see a partially written file"""
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix='.tmp')
+
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            f.write(content)
+
+        os.chmod(tmp_path, 0o644)   # mkstemp creates files readable by owner only, front proxy needs to read them
+        os.replace(tmp_path, path)
+
+    except BaseException:
+        os.unlink(tmp_path)
+        raise
@@ -1,8 +1,16 @@
+from calendar import timegm
+from datetime import timedelta
+from unittest.mock import patch
+from xml.etree import ElementTree
+
 from django.test import TestCase
 from pub.feeds import ChannelFeed
 from webscraper.tests.util import create_channel, create_entry  # TODO refactor to remove this dependency
 from django.test.client import RequestFactory
 from django.http.response import Http404
+from django.utils.http import http_date
+from webscraper.models import Channel, MediaItem
+from pub.feedgenerator import HISTORY_NS
 
 
 class ChannelFeedTestCase(TestCase):
@@ -32,6 +40,11 @@ class ChannelFeedTestCase(TestCase):
     def test_description_returls_description(self):
         self.assertIn(self.chan.title, self.feed.description(self.chan))
 
+    def test_ttl_uses_auto_interval(self):
+        self.chan.interval = Channel.I_AUTO
+        self.chan.auto_interval = timedelta(hours=3)
+        self.assertEqual(self.feed.ttl(self.chan), 180)
+
     def test_items_filters_by_channel(self):
         other_channel = create_channel()
         other_entry = create_entry(channel=other_channel)
@@ -44,6 +57,11 @@ class ChannelFeedTestCase(TestCase):
         rv = self.feed.items(self.chan)
         self.assertEqual(list(rv), [self.entry])
 
+    def test_items_leave_out_duplicates(self):
+        create_entry(channel=self.chan, status=1, url='http://ho.st/1', duplicate_of=self.entry)
+        rv = self.feed.items(self.chan)
+        self.assertEqual(list(rv), [self.entry])
+
     def test_item_link_returns_url(self):
         self.assertEquals(self.feed.item_link(self.entry), self.entry.url)
 
@@ -52,12 +70,151 @@ class ChannelFeedTestCase(TestCase):
 
     def test_item_description_uses_template(self):
         response = self.client.get('/public/feeds/%s/rss/' % self.chan.slug)
-        self.assertTemplateUsed(response, 'entry_description.html')
+
+        with self.assertTemplateUsed('entry_description.html'):     # Items are rendered while streaming
+            b''.join(response.streaming_content)
 
     def test_entry_items_are_in_item_description(self):
         response = self.client.get('/public/feeds/%s/rss/' % self.chan.slug)
-        content = str(response.content)
+        content = b''.join(response.streaming_content).decode('utf-8')
         for set_name, set_urls in self.entry.items.items():
             self.assertIn(set_name, content)
             for url in set_urls:
                 self.assertIn(url, content)
+
+    def test_entry_items_are_read_from_media_items(self):
+        MediaItem.objects.create_for_entries([self.entry])
+
+        with self.settings(MEDIA_ITEMS=True):
+            entry = self.feed.items(self.chan)[0]
+
+            with self.assertNumQueries(0):
+                itemsets = entry.itemsets()
+
+        self.assertEqual(itemsets, self.entry.items)
+
+    def test_entries_without_media_items_use_items_field(self):
+        with self.settings(MEDIA_ITEMS=True):
+            entry = self.feed.items(self.chan)[0]
+
+            with self.assertNumQueries(0):
+                itemsets = entry.itemsets()
+
+        self.assertEqual(itemsets, self.entry.items)
+
+
+@patch.object(ChannelFeed, 'page_size', 2)
+class ChannelFeedPagingTestCase(TestCase):
+
+    def setUp(self):
+        self.chan = create_channel()
+        self.entries = [create_entry(channel=self.chan, status=1, url='http://ho.st/%d' % i, title='Entry %d' % i)
+                        for i in range(5)]
+        self.url = '/public/feeds/%s/rss/' % self.chan.slug
+
+    def get(self, url):
+        response = self.client.get(url)
+        return ElementTree.fromstring(b''.join(response.streaming_content))
+
+    def titles(self, doc):
+        return [item.findtext('title') for item in doc.iter('item')]
+
+    def links(self, doc):
+        return {link.get('rel'): link.get('href') for link in doc.iter('{http://www.w3.org/2005/Atom}link')}
+
+    def test_current_document_has_newest_entries_and_archive_link(self):
+        doc = self.get(self.url)
+        self.assertEqual(self.titles(doc), ['Entry 4', 'Entry 3'])
+        self.assertIn('prev-archive', self.links(doc))
+        self.assertIsNone(doc.find('channel/{%s}archive' % HISTORY_NS))
+
+    def test_archive_documents_are_linked(self):
+        doc = self.get(self.url)
+        archive = self.get(self.links(doc)['prev-archive'])
+        self.assertEqual(self.titles(archive), ['Entry 2', 'Entry 1'])
+        self.assertIsNotNone(archive.find('channel/{%s}archive' % HISTORY_NS))
+
+        oldest = self.get(self.links(archive)['prev-archive'])
+        self.assertEqual(self.titles(oldest), ['Entry 0'])
+        self.assertNotIn('prev-archive', self.links(oldest))
+        self.assertEqual(self.links(oldest)['next-archive'], self.links(doc)['prev-archive'])
+
+    def test_invalid_cursor_returns_404(self):
+        response = self.client.get(self.url + '?before=garbage')
+        self.assertEqual(response.status_code, 404)
+
+    def test_atom_feed_has_archive_links(self):
+        response = self.client.get('/public/feeds/%s/atom/' % self.chan.slug)
+        doc = ElementTree.fromstring(b''.join(response.streaming_content))
+        rels = [link.get('rel') for link in doc.iter('{http://www.w3.org/2005/Atom}link')]
+        self.assertIn('prev-archive', rels)
+
+
+class AggregateFeedTestCase(TestCase):
+
+    def setUp(self):
+        self.chan1 = create_channel(title='First', group='news')
+        self.chan2 = create_channel(title='Second', group='news')
+        self.other = create_channel(title='Other')
+        self.entry1 = create_entry(channel=self.chan1, status=1, title='Entry 1')
+        self.entry2 = create_entry(channel=self.chan2, status=1, title='Entry 2')
+        create_entry(channel=self.other, status=1, title='Other entry')
+
+    def titles(self, response):
+        doc = ElementTree.fromstring(b''.join(response.streaming_content))
+        return [item.findtext('title') for item in doc.iter('item')]
+
+    def test_group_feed_merges_channel_entries(self):
+        response = self.client.get('/public/feeds/group/news/rss/')
+        self.assertEqual(self.titles(response), ['Entry 2', 'Entry 1'])
+
+    def test_slug_list_feed_merges_channel_entries(self):
+        response = self.client.get('/public/feeds/%s,%s/rss/' % (self.chan1.slug, self.other.slug))
+        self.assertEqual(self.titles(response), ['Other entry', 'Entry 1'])
+
+    def test_unknown_group_returns_404(self):
+        self.assertEqual(self.client.get('/public/feeds/group/nothing/rss/').status_code, 404)
+
+    def test_entries_are_read_in_one_query_for_any_number_of_channels(self):
+        # Channels, last modified, page boundary, entries
+        with self.assertNumQueries(4):
+            response = self.client.get('/public/feeds/group/news/atom/')
+            b''.join(response.streaming_content)
+
+
+class ConditionalGetTestCase(TestCase):
+
+    def setUp(self):
+        self.chan = create_channel()
+        self.entry = create_entry(channel=self.chan, status=1)
+        self.url = '/public/feeds/%s/rss/' % self.chan.slug
+
+    def test_response_has_last_modified_and_max_age(self):
+        response = self.client.get(self.url)
+        self.assertEqual(response['Last-Modified'], http_date(timegm(self.entry.added.utctimetuple())))
+        self.assertIn('max-age=86400', response['Cache-Control'])
+
+    def test_not_modified_since_newest_entry(self):
+        response = self.client.get(self.url, HTTP_IF_MODIFIED_SINCE=self.client.get(self.url)['Last-Modified'])
+        self.assertEqual(response.status_code, 304)
+
+    def test_modified_after_new_entry(self):
+        since = http_date(timegm(self.entry.added.utctimetuple()) - 60)
+        response = self.client.get(self.url, HTTP_IF_MODIFIED_SINCE=since)
+        self.assertEqual(response.status_code, 200)
+
+    def test_modified_after_entries_change(self):
+        since = self.client.get(self.url)['Last-Modified']
+        self.entry.delete()
+        Channel.objects.touch([self.chan], now=self.entry.added + timedelta(minutes=1))
+        response = self.client.get(self.url, HTTP_IF_MODIFIED_SINCE=since)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Last-Modified'], http_date(timegm(self.chan.updated.utctimetuple())))
+
+    def test_aggregate_feed_modified_when_any_channel_changes(self):
+        other = create_channel(group='news')
+        Channel.objects.filter(id=self.chan.id).update(group='news')
+        Channel.objects.touch([self.chan], now=self.entry.added - timedelta(days=1))
+        Channel.objects.touch([other], now=self.entry.added + timedelta(minutes=1))
+        response = self.client.get('/public/feeds/group/news/rss/')
+        self.assertEqual(response['Last-Modified'], http_date(timegm(other.updated.utctimetuple())))
@@ -0,0 +1,101 @@
+import os
+import shutil
+import tempfile
+from datetime import timedelta
+from unittest.mock import patch
+
+from django.test import TestCase, override_settings
+from django.utils import timezone
+
+from pub.publishing import publish_feeds, publish_scraped, write_atomic
+from webscraper.models import Channel
+from webscraper.retention import prune
+from webscraper.tests.util import create_channel, create_entry
+
+
+class PublishingTestCase(TestCase):
+
+    def setUp(self):
+        self.publish_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.publish_dir)
+        self.chan = create_channel(title='Published channel')
+        self.entry = create_entry(channel=self.chan, status=1)
+
+    def feed_path(self, feed_format):
+        return os.path.join(self.publish_dir, self.chan.slug, '%s.xml' % feed_format)
+
+    def test_publish_feeds_writes_feed_files(self):
+        with self.settings(FEED_PUBLISH_DIR=self.publish_dir, FEED_PUBLISH_URL='https://glommer.example.com'):
+            publish_feeds([self.chan], formats=['rss', 'atom'])
+
+        with open(self.feed_path('rss'), 'rb') as f:
+            rss = f.read().decode('utf-8')
+
+        self.assertIn('<rss', rss)
+        self.assertIn(self.entry.title, rss)
+        self.assertIn('https://glommer.example.com/public/feeds/%s/rss/' % self.chan.slug, rss)
+        self.assertTrue(os.path.exists(self.feed_path('atom')))
+
+    def test_publish_scraped_does_nothing_if_not_configured(self):
+        with self.settings(FEED_PUBLISH_DIR=None):
+            publish_scraped(None, channels=[self.chan])
+
+        self.assertEqual(os.listdir(self.publish_dir), [])
+
+    def test_feed_view_serves_published_file(self):
+        with self.settings(FEED_PUBLISH_DIR=self.publish_dir):
+            write_atomic(self.feed_path('rss'), b'<rss>published</rss>')
+            response = self.client.get('/public/feeds/%s/rss/' % self.chan.slug)
+
+        self.assertEqual(b''.join(response.streaming_content), b'<rss>published</rss>')
+        self.assertTrue(response.has_header('Last-Modified'))
+        self.assertIn('max-age=86400', response['Cache-Control'])
+
+    def test_feed_view_skips_file_older_than_channel_update(self):
+        with self.settings(FEED_PUBLISH_DIR=self.publish_dir):
+            write_atomic(self.feed_path('rss'), b'<rss>published</rss>')
+            Channel.objects.touch([self.chan], now=timezone.now() + timedelta(minutes=1))
+            response = self.client.get('/public/feeds/%s/rss/' % self.chan.slug)
+
+        self.assertIn(self.entry.title.encode('utf-8'), b''.join(response.streaming_content))
+
+    def test_deleted_channel_feed_is_removed(self):
+        with self.settings(FEED_PUBLISH_DIR=self.publish_dir):
+            write_atomic(self.feed_path('rss'), b'<rss>published</rss>')
+            self.chan.delete()
+            response = self.client.get('/public/feeds/%s/rss/' % self.chan.slug)
+
+        self.assertEqual(response.status_code, 404)
+        self.assertFalse(os.path.exists(self.feed_path('rss')))
+
+    def test_prune_republishes_feeds(self):
+        self.chan.max_entries = 0
+        self.chan.save()
+
+        with self.settings(FEED_PUBLISH_DIR=self.publish_dir, FEED_PUBLISH_FORMATS=['rss']):
+            prune([self.chan])
+
+        with open(self.feed_path('rss'), 'rb') as f:
+            self.assertNotIn(self.entry.title.encode('utf-8'), f.read())
+
+    def test_publish_failures_are_logged_per_feed(self):
+        other = create_channel(title='Other channel')
+
+        error = OSError(13, 'Permission denied')
+
+        with self.settings(FEED_PUBLISH_DIR=self.publish_dir, FEED_PUBLISH_FORMATS=['rss']), \
+                patch('pub.publishing.write_atomic', side_effect=error) as write, self.assertLogs('pub', 'ERROR'):
+            publish_scraped(None, channels=[self.chan, other])
+
+        self.assertEqual(write.call_count, 2)
+
+    @override_settings(FEED_PUBLISH_DIR=None)
+    def test_atom_feed_is_rendered_without_published_file(self):
+        response = self.client.get('/public/feeds/%s/atom/' % self.chan.slug)
+        self.assertIn(b'<feed', b''.join(response.streaming_content))
+
+    def test_write_atomic_leaves_no_temporary_files(self):
+        path = os.path.join(self.publish_dir, 'sub', 'feed.xml')
+        write_atomic(path, b'one')
+        write_atomic(path, b'two')
+        self.assertEqual(os.listdir(os.path.dirname(path)), ['feed.xml'])
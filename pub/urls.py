@@ -1,7 +1,14 @@
 from django.conf.urls import url
-from .feeds import ChannelFeed
+from .feeds import ChannelFeed, AtomChannelFeed, AggregateFeed, AtomAggregateFeed
 
 
 urlpatterns = [
     url(r'^feeds/(?P<channel_slug>[a-zA-Z0-9]{32})/rss/$', ChannelFeed(), name='feed'),
+    url(r'^feeds/(?P<channel_slug>[a-zA-Z0-9]{32})/atom/$', AtomChannelFeed(), name='atom_feed'),
+    url(r'^feeds/(?P<channel_slugs>[a-zA-Z0-9]{32}(?:,[a-zA-Z0-9]{32})+)/rss/$', AggregateFeed(),
+        name='aggregate_feed'),
+    url(r'^feeds/(?P<channel_slugs>[a-zA-Z0-9]{32}(?:,[a-zA-Z0-9]{32})+)/atom/$', AtomAggregateFeed(),
+        name='aggregate_atom_feed'),
+    url(r'^feeds/group/(?P<group>[-\w]+)/rss/$', AggregateFeed(), name='group_feed'),
+    url(r'^feeds/group/(?P<group>[-\w]+)/atom/$', AtomAggregateFeed(), name='group_atom_feed'),
 ]
@@ -1,26 +1,45 @@
 from urllib.parse import urlparse
 
-from django import forms
+from django.conf.urls import url
 from django.contrib import admin
-from .models import Channel, Entry
+from django.contrib.admin.options import IncorrectLookupParameters
+from django.contrib.admin.views.main import ChangeList, ALL_VAR, ORDER_VAR
+from django.core.exceptions import PermissionDenied
+from django.http import JsonResponse
+from django.template.response import TemplateResponse
+from .forms import ChannelForm
+from .models import Channel, Entry, ScrapeRun, ChannelRunStat
+from .pagination import EstimatedCountPaginator, keyset_cursor, keyset_filter
+from .signals import feeds_changed
 from django.contrib.postgres.fields import JSONField
 from prettyjson import PrettyJSONWidget
 from django.utils.html import format_html
 from django.urls import reverse
 
 
+AFTER_VAR = 'after'     # Keyset pagination cursor
+AUTOCOMPLETE_LIMIT = 20
+TREND_RUNS = 10         # Runs averaged in each half of trends comparison
+
+
 class JsonAdmin(admin.ModelAdmin):
     formfield_overrides = {
         JSONField: {'widget': PrettyJSONWidget}
     }
 
 
-class ChannelAdminForm(forms.ModelForm):
-    class Meta:
-        model = Channel
+def feed_changed(channel):
+    """Mark channel feed as changed by admin edit, so published feed files are not served stale"""
+    Channel.objects.touch([channel])
+    feeds_changed.send(sender=Channel, channels=[channel])
+
+
+class ChannelAdminForm(ChannelForm):
+    class Meta(ChannelForm.Meta):
         fields = [
-            'title', 'url', 'enabled', 'interval', 'slug', 'status', 'row_selector', 'url_selector',
-            'title_selector', 'extra_selector']
+            'title', 'url', 'enabled', 'interval', 'slug', 'group', 'status', 'row_selector', 'url_selector',
+            'title_selector', 'extra_selector', 'next_page_selector', 'page_url_template', 'max_pages', 'max_entries',
+            'max_age', 'request_headers']
 
     def __init__(self, *args, **kwargs):
         super(ChannelAdminForm, self).__init__(*args, **kwargs)
@@ -46,22 +65,182 @@ def channel_feed_link(channel):
 
 @admin.register(Channel)
 class ChannelAdmin(admin.ModelAdmin):
-    readonly_fields = (channel_feed_link,)
+    readonly_fields = (channel_feed_link, 'scraped', 'updated', 'auto_interval', 'polls', 'changes')
 
     list_display = ('title', 'enabled', channel_feed_link, 'status')
-    list_filter = ['status', 'enabled', 'interval']
+    list_filter = ['status', 'enabled', 'interval', 'group']
     fieldsets = [
         ('Feed link', {'fields': [channel_feed_link]}),
-        ('Settings', {'fields': ['title', 'url', 'enabled', 'interval', 'slug', 'status']}),
+        ('Settings', {'fields': ['title', 'url', 'enabled', 'interval', 'slug', 'group', 'status']}),
         ('Selectors', {'fields': ['row_selector', 'url_selector', 'title_selector', 'extra_selector']}),
+        ('Pages', {'fields': ['max_pages', 'next_page_selector', 'page_url_template']}),
+        ('Requests', {'fields': ['request_headers']}),
+        ('Polling', {'fields': ['scraped', 'updated', 'auto_interval', 'polls', 'changes']}),
+        ('Retention', {'fields': ['max_entries', 'max_age']}),
     ]
     form = ChannelAdminForm
 
+    def get_urls(self):
+        urls = [
+            url(r'^autocomplete/$', self.admin_site.admin_view(self.autocomplete_view),
+                name='webscraper_channel_autocomplete'),
+        ]
+        return urls + super(ChannelAdmin, self).get_urls()
+
+    def save_model(self, request, obj, form, change):
+        super(ChannelAdmin, self).save_model(request, obj, form, change)
+
+        if change:
+            feed_changed(obj)
+
+    def autocomplete_view(self, request):
+        """Channels with title containing `term`, as JSON"""
+        if not self.has_change_permission(request):
+            raise PermissionDenied
+
+        channels = (Channel.objects.filter(title__icontains=request.GET.get('term', ''))
+                    .order_by('title')
+                    .values('id', 'title'))
+        return JsonResponse({'results': list(channels[:AUTOCOMPLETE_LIMIT])})
+
+
+class ChannelFilter(admin.ListFilter):
+
+    """Filter by channel picked in autocomplete input, instead of listing links to all channels"""
+
+    title = 'channel'
+    parameter_name = 'channel'
+    template = 'admin/webscraper/channel_filter.html'
+
+    def __init__(self, request, params, model, model_admin):
+        super(ChannelFilter, self).__init__(request, params, model, model_admin)
+        value = params.pop(self.parameter_name, None)
+        self.channel = Channel.objects.filter(pk=value).first() if value and value.isdigit() else None
+
+        if value and self.channel is None:
+            raise IncorrectLookupParameters
+
+    def has_output(self):
+        return True
+
+    def expected_parameters(self):
+        return [self.parameter_name]
+
+    def queryset(self, request, queryset):
+        return queryset.filter(channel=self.channel) if self.channel else queryset
+
+    def choices(self, changelist):
+        ignored = (self.parameter_name, AFTER_VAR)
+        yield {
+            'channel': self.channel,
+            'clear_url': changelist.get_query_string(remove=ignored),
+            'autocomplete_url': reverse('admin:webscraper_channel_autocomplete'),
+            'params': sorted((k, v) for k, v in changelist.params.items() if k not in ignored),
+        }
+
+
+class KeysetChangeList(ChangeList):
+
+    """Changelist paged by (added, id) cursor instead of OFFSET, unless sorted by another column"""
+
+    def __init__(self, request, *args, **kwargs):
+        self.keyset = ORDER_VAR not in request.GET and ALL_VAR not in request.GET
+        self.after = request.GET.get(AFTER_VAR)
+        self.first_url = self.next_url = None
+        super(KeysetChangeList, self).__init__(request, *args, **kwargs)
+
+    def get_filters_params(self, params=None):
+        lookup_params = super(KeysetChangeList, self).get_filters_params(params)
+        lookup_params.pop(AFTER_VAR, None)
+        return lookup_params
+
+    def get_results(self, request):
+        if not self.keyset:
+            return super(KeysetChangeList, self).get_results(request)
+
+        queryset = self.queryset
+
+        if self.after:
+            try:
+                queryset = queryset.filter(keyset_filter(self.after))
+
+            except ValueError:
+                raise IncorrectLookupParameters
+
+            self.first_url = self.get_query_string(remove=[AFTER_VAR])
+
+        result_list = list(queryset[:self.list_per_page + 1])
+
+        if len(result_list) > self.list_per_page:
+            result_list = result_list[:self.list_per_page]
+            self.next_url = self.get_query_string({AFTER_VAR: keyset_cursor(result_list[-1])})
+
+        self.paginator = self.model_admin.get_paginator(request, self.queryset, self.list_per_page)
+        self.result_count = self.paginator.count
+        self.show_full_result_count = self.model_admin.show_full_result_count
+        self.full_result_count = self.root_queryset.count() if self.show_full_result_count else None
+        self.show_admin_actions = not self.show_full_result_count or bool(self.full_result_count)
+        self.result_list = result_list
+        self.can_show_all = False
+        self.multi_page = bool(self.first_url or self.next_url)
+
 
 @admin.register(Entry)
 class EntryAdmin(JsonAdmin):
     date_hierarchy = 'added'
     list_display = ('id', entry_title_with_link, 'added', entry_site, 'status')
-    list_filter = ['channel', 'status']
-    search_fields = ['title', 'url', 'final_url']
-    ordering = ('-added', )
+    list_filter = [ChannelFilter, 'status']
+    search_fields = ['title', 'url', 'final_url']   # Backed by trigram indexes, see migration 0008
+    ordering = ('-added', '-id')
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+
+    def get_changelist(self, request, **kwargs):
+        return KeysetChangeList
+
+    def save_model(self, request, obj, form, change):
+        super(EntryAdmin, self).save_model(request, obj, form, change)
+        feed_changed(obj.channel)
+
+    def delete_model(self, request, obj):
+        super(EntryAdmin, self).delete_model(request, obj)
+        feed_changed(obj.channel)
+
+
+class ChannelRunStatInline(admin.TabularInline):
+    model = ChannelRunStat
+    fields = readonly_fields = ('channel', 'entries', 'bytes', 'fetch_time', 'parse_time', 'entries_new',
+                                'entries_deleted', 'status_before', 'status_after')
+    can_delete = False
+    extra = 0
+
+    def has_add_permission(self, request):
+        return False
+
+
+@admin.register(ScrapeRun)
+class ScrapeRunAdmin(admin.ModelAdmin):
+    date_hierarchy = 'started'
+    list_display = ('started', 'duration', 'channels', 'entries', 'bytes', 'wire_bytes', 'dns_time', 'channels_shed',
+                    'entries_shed')
+    readonly_fields = ('started', 'finished', 'channels', 'entries', 'bytes', 'wire_bytes', 'dns_time',
+                       'channels_shed', 'entries_shed')
+    inlines = [ChannelRunStatInline]
+
+    def has_add_permission(self, request):
+        return False
+
+    def get_urls(self):
+        urls = [
+            url(r'^trends/$', self.admin_site.admin_view(self.trends_view), name='webscraper_scraperun_trends'),
+        ]
+        return urls + super(ScrapeRunAdmin, self).get_urls()
+
+    def trends_view(self, request):
+        """Channels ranked by growth of average cost over recent runs"""
+        if not self.has_change_permission(request):
+            raise PermissionDenied
+
+        context = dict(self.admin_site.each_context(request), opts=self.model._meta, title='Channel cost trends',
+                       runs=TREND_RUNS, trends=ChannelRunStat.objects.trends(TREND_RUNS))
+        return TemplateResponse(request, 'admin/webscraper/scraperun/trends.html', context)
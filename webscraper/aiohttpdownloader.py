@@ -1,11 +1,27 @@
 import asyncio
+import codecs
+import functools
+import logging
+import re
+import time
 
 import aiohttp
+import cchardet
 from aiodns.error import DNSError
 
 
-DEFAULT_HEADERS = {'User-agent': 'Mozilla/5.0 Gecko/20100101 glommer/1.0'}
+DEFAULT_HEADERS = {'User-agent': 'Mozilla/5.0 Gecko/20100101 glommer/1.0', 'Accept-Encoding': 'gzip, deflate'}
 DEFAULT_TIMEOUT = 6  # seconds
+CONNECTION_LIMIT = 100          # Open connections in total
+CONNECTION_LIMIT_PER_HOST = 2
+KEEPALIVE_TIMEOUT = 30          # Seconds an idle connection is kept open for reuse
+DEFAULT_ENCODING = 'utf-8'
+META_SCAN_SIZE = 4096   # Look for <meta> charset declaration in this many leading bytes
+
+CONTENT_TYPE_CHARSET_RX = re.compile(r'charset\s*=\s*["\']?([\w.:\-]+)', re.IGNORECASE)
+META_CHARSET_RX = re.compile(br'<meta[^>]+charset\s*=\s*["\']?\s*([\w.:\-]+)', re.IGNORECASE)
+
+logger = logging.getLogger(__name__)
 
 
 class DownloadError(Exception):
@@ -24,11 +40,18 @@ class RetryableDownloadError(DownloadError):
     pass
 
 
-async def fetch(url, *, session):
+async def fetch(url, *, session, latency=None, headers=None):
+    """Download url. If `latency` (HostLatency) is given, request timeout is derived from and recorded to it.
+    `headers` are sent in addition to session headers, overriding them"""
+    timeout = latency.timeout(url) if latency is not None else None
+    started = time.monotonic()
+
     try:
-        async with session.get(url, timeout=None) as resp:
+        async with session.get(url, timeout=timeout, headers=headers) as resp:
+            protocol = getattr(resp, '_protocol', None)     # Connection may be released already, if body was read
             resp.raise_for_status()
-            body = await resp.text(errors='ignore')
+            body = await resp.read()
+            resp.wire_size = received_bytes(protocol)
 
     except aiohttp.client_exceptions.ClientResponseError as e:
         if 400 <= e.code < 500:
@@ -45,35 +68,141 @@ async def fetch(url, *, session):
         raise DownloadError('DNS error: %r' % e) from e
 
     except asyncio.TimeoutError as e:
+        if latency is not None:
+            latency.record_timeout(url)
+
         raise RetryableDownloadError(message='Timeout') from e
 
-    return resp, body
+    if latency is not None:
+        latency.record(url, time.monotonic() - started)
+
+    return resp, body, detect_encoding(body, resp.charset)
+
+
+class CountingConnector(aiohttp.TCPConnector):
+
+    """TCPConnector whose connections count bytes they receive, before decompression. See received_bytes()"""
+
+    def __init__(self, *args, **kwargs):
+        super(CountingConnector, self).__init__(*args, **kwargs)
+        factory = self._factory
+        self._factory = functools.partial(counting_protocol(factory.func), *factory.args, **factory.keywords)
+
+
+@functools.lru_cache(maxsize=None)
+def counting_protocol(cls):
+    """Subclass of aiohttp client protocol class that counts received bytes"""
+
+    class CountingProtocol(cls):
+        received = 0    # Bytes received on connection
+        counted = 0     # Part of them attributed to responses so far
+
+        def data_received(self, data):
+            self.received += len(data)
+            super(CountingProtocol, self).data_received(data)
+
+    return CountingProtocol
+
+
+def received_bytes(protocol):
+    """Bytes connection protocol received since previous call, so for response just read as connections don't
+    pipeline requests. None if protocol does not count them"""
+    received = getattr(protocol, 'received', None)
+
+    if received is None:
+        return None
+
+    size, protocol.counted = received - protocol.counted, received
+    return size
+
 
+class ClientFactory:
 
-def make_session(loop, headers=None, *args, **kw):
-    """Create and configure aiohttp.ClientSession"""
+    """Makes client sessions with given connection limits and headers (added to DEFAULT_HEADERS, overriding them).
 
-    sess_headers = DEFAULT_HEADERS
-    if headers is not None:
-        sess_headers.update(headers)
+    Holds configuration only, so one factory serves any number of runs and event loops
+    """
 
-    timeout = kw.pop('timeout', DEFAULT_TIMEOUT)
+    def __init__(self, limit=CONNECTION_LIMIT, limit_per_host=CONNECTION_LIMIT_PER_HOST,
+                 keepalive_timeout=KEEPALIVE_TIMEOUT, headers=None):
+        self.limit = limit
+        self.limit_per_host = limit_per_host
+        self.keepalive_timeout = keepalive_timeout
+        self.headers = dict(DEFAULT_HEADERS)
+        self.headers.update(headers or {})
 
-    resolver = aiohttp.resolver.AsyncResolver(loop=loop)
+    def session(self, loop, timeout=DEFAULT_TIMEOUT, resolver=None):
+        """Create aiohttp.ClientSession, resolving through aiodns unless `resolver` is given"""
+        resolver = resolver or aiohttp.resolver.AsyncResolver(loop=loop)
+        conn = CountingConnector(verify_ssl=False, limit=self.limit, limit_per_host=self.limit_per_host,
+                                    keepalive_timeout=self.keepalive_timeout, loop=loop, resolver=resolver)
 
-    conn = aiohttp.TCPConnector(verify_ssl=False, limit_per_host=2, loop=loop, resolver=resolver)
+        return aiohttp.ClientSession(loop=loop, connector=conn, headers=self.headers,
+                                     read_timeout=timeout, conn_timeout=timeout)
 
-    session = aiohttp.ClientSession(loop=loop, connector=conn, headers=sess_headers,
-                                    read_timeout=timeout, conn_timeout=timeout)
 
-    return session
+def make_session(loop, headers=None, timeout=DEFAULT_TIMEOUT, resolver=None):
+    """Create and configure aiohttp.ClientSession with default limits"""
+    return ClientFactory(headers=headers).session(loop, timeout=timeout, resolver=resolver)
 
 
-async def download_to_future(url, fut, *, session):
-    """Fetch and store result or exception in future"""
+async def download_to_future(url, fut, *, session, latency=None, archive=None, archive_meta=None, headers=None):
+    """Fetch and store result or exception in future. Successful responses are also written to `archive`, if given,
+    in executor thread. Failed archive writes are logged, they don't fail the download"""
     try:
-        resp, html = await fetch(url, session=session)
-        fut.set_result((resp, html))
+        resp, body, encoding = await fetch(url, session=session, latency=latency, headers=headers)
+        fut.set_result((resp, body, encoding))
 
     except (DownloadError) as e:
         fut.set_exception(e)
+        return
+
+    if archive is not None:
+        write = functools.partial(archive.write, url, resp, body, **(archive_meta or {}))
+
+        try:
+            await asyncio.get_event_loop().run_in_executor(None, write)
+
+        except (OSError, ValueError) as e:  # ValueError if archive was closed meanwhile
+            logger.warning('Failed to archive %s - %r', url, e)
+
+
+def transfer_size(resp, body):
+    """Bytes received for response: as counted by connection (including headers) if it was, otherwise Content-Length
+    of compressed responses or body size"""
+    if getattr(resp, 'wire_size', None):
+        return resp.wire_size
+
+    length = resp.headers.get('Content-Length') if resp.headers.get('Content-Encoding') else None
+    return int(length) if length and length.isdigit() else len(body)
+
+
+def detect_encoding(body, header_charset=None):
+    """Detect document encoding from HTTP header charset, <meta> declaration or content itself, in that order"""
+    encoding = codec_name(header_charset) or codec_name(meta_charset(body))
+
+    if encoding is None:
+        encoding = codec_name(cchardet.detect(body)['encoding'])
+
+    return encoding or DEFAULT_ENCODING
+
+
+def content_type_charset(content_type):
+    """Charset parameter of Content-Type header value, if any"""
+    match = CONTENT_TYPE_CHARSET_RX.search(content_type or '')
+    return match.group(1) if match else None
+
+
+def meta_charset(body):
+    """Charset from <meta charset> or <meta http-equiv="Content-Type"> tag, if any"""
+    match = META_CHARSET_RX.search(body, 0, META_SCAN_SIZE)
+    return match.group(1).decode('ascii') if match else None
+
+
+def codec_name(encoding):
+    """Normalized codec name, None if encoding is empty or unknown"""
+    try:
+        return codecs.lookup(encoding).name if encoding else None
+
+    except LookupError:
+        return None
@@ -1,33 +1,86 @@
 """Task scheduling/queueing and scrape flow control"""
 import asyncio
 import logging
-from collections import deque
-
-from .aiohttpdownloader import make_session, download_to_future
+import os
+import time
+import weakref
+from collections import deque, Counter
+
+from django.conf import settings
+from django.utils import timezone
+
+from .archive import open_run_archive
+from .aiohttpdownloader import (ClientFactory, download_to_future, DEFAULT_TIMEOUT, RetryableDownloadError,
+                                CONNECTION_LIMIT, CONNECTION_LIMIT_PER_HOST, KEEPALIVE_TIMEOUT)
+from .concurrency import AdaptiveLimiter
+from .dnscache import DnsCache, CachingResolver
 from .futurelite import FutureLite
-from .insbuffer import InsertBuffer
-from .processing import process_channel, process_entry
+from .hoststats import HostLatency, TIMEOUT_MAX, host_of
+from .insbuffer import InsertBuffer, BulkCreateWriter
+from .models import Channel, Entry, MediaItem
+from .processing import process_channel, process_entry, next_page_url
+from .profiling import TimedWriter, null_profiler
+from .runhistory import RunRecorder, response_size, wire_size
+from .tracing import TracedWriter, null_tracer, open_run_trace
+from .signals import scrape_finished
 
 # Default values
 CHANNEL_POOL_SIZE = 2
-ENTRY_POOL_SIZE = 32
+ENTRY_POOL_SIZE = 32        # Number of entry workers, upper bound for adaptive concurrency limit
+ENTRY_POOL_MIN = 4          # Lower bound for adaptive concurrency limit
+ENTRY_POOL_INITIAL = 16
 INSERT_BUFFER_SIZE = 150
+DEADLINE_MARGIN = TIMEOUT_MAX       # stop dispatching this many seconds before the deadline
+HOST_LATENCY_FILE = 'host_latency.json'
+DNS_CACHE_FILE = 'dns_cache.json'
+DNS_PREFETCH_TIMEOUT = 10   # Seconds to wait for channel host lookups started alongside first downloads
 
 logger = logging.getLogger(__name__)
 
+_sessions = weakref.WeakKeyDictionary()     # loop -> (session, resolver), see client_session()
+
+
+class Deadline:
+    """Point in loop time after which no new work is dispatched"""
+
+    def __init__(self, loop, seconds=None, margin=DEADLINE_MARGIN):
+        self._loop = loop
+        self._expires_at = None if seconds is None else loop.time() + max(seconds - margin, 0)
+
+    def expired(self):
+        return self._expires_at is not None and self._loop.time() >= self._expires_at
+
 
 class AioScraper:
     """Holds scrape state, like queues, client sessions etc"""
 
-    def __init__(self, loop, insert_buffer, entry_queue):
+    def __init__(self, loop, insert_buffer, entry_queue, deadline=None, latency=None, archive=None, profiler=None,
+                 recorder=None, tracer=None, dns_cache=None, client=None):
         self._loop = loop
         self._insert_buffer = insert_buffer
         self._entry_queue = entry_queue
         self._channel_queue = None
+        self._deadline_seconds = deadline
+        self._deadline = None
+        self.stats = Counter()
+        self._limiter = None
+        self._latency = latency if latency is not None else HostLatency(DEFAULT_TIMEOUT)
+        self._archive = archive
+        self._profiler = profiler if profiler is not None else null_profiler
+        self._recorder = recorder
+        self._tracer = tracer if tracer is not None else null_tracer
+        self._dns_cache = dns_cache if dns_cache is not None else DnsCache()
+        self._client = client if client is not None else ClientFactory()
+        self._channel_headers = {}
 
     def run(self, channels):
         self._channel_queue = deque(channels)
+        self._channel_headers = {channel.id: channel.request_headers for channel in channels
+                                 if channel.request_headers}
         self._channel_queue.extend([None] * CHANNEL_POOL_SIZE)   # Signal channel workers to shut down
+        self._deadline = Deadline(self._loop, self._deadline_seconds)
+        self._limiter = AdaptiveLimiter(floor=ENTRY_POOL_MIN, ceiling=ENTRY_POOL_SIZE, initial=ENTRY_POOL_INITIAL,
+                                        stats=self.stats, loop=self._loop)
 
         try:
             self._loop.run_until_complete(self._run())
@@ -35,73 +88,350 @@ class AioScraper:
         finally:
             self._insert_buffer.flush()
 
+        return self.stats
+
     async def _run(self):
-        self._session = make_session(self._loop)
+        self._session, resolver = client_session(self._loop, self._client, self._dns_cache, self.stats)
+        prefetch = self.prefetch_dns(resolver, self.channel_hosts())
         workers = self.make_channel_workers() + self.make_entry_workers()
+        await asyncio.gather(prefetch, *workers, loop=self._loop)
+
+    def channel_hosts(self):
+        return {host_of(url) for channel in self._channel_queue if channel is not None
+                for url in [channel.url] + channel.page_urls()}
 
-        async with self._session:
-            await asyncio.gather(*workers, loop=self._loop)
+    async def prefetch_dns(self, resolver, hosts):
+        """Resolve channel hosts in parallel, alongside first downloads, which share lookups still in flight"""
+        started = self._loop.time()
+
+        try:
+            resolved = await asyncio.wait_for(resolver.prefetch(hosts), DNS_PREFETCH_TIMEOUT)
+
+        except asyncio.TimeoutError:
+            logger.warning('Prefetching %d channel hosts timed out after %.2fs', len(hosts),
+                           self._loop.time() - started)
+
+        else:
+            logger.info('Resolved %d of %d channel hosts in %.2fs', resolved, len(hosts),
+                        self._loop.time() - started)
 
     def make_channel_workers(self):
         args = (self._channel_queue, self._entry_queue, self._session)
-        return [channel_worker(i, *args) for i in range(CHANNEL_POOL_SIZE)]
+        kw = {'deadline': self._deadline, 'stats': self.stats, 'limiter': self._limiter, 'latency': self._latency,
+              'archive': self._archive, 'profiler': self._profiler, 'recorder': self._recorder, 'tracer': self._tracer}
+        return [channel_worker(i, *args, **kw) for i in range(CHANNEL_POOL_SIZE)]
 
     def make_entry_workers(self):
         args = (self._entry_queue, self._session, self._insert_buffer)
-        return [entry_worker(i, *args) for i in range(ENTRY_POOL_SIZE)]
+        kw = {'deadline': self._deadline, 'stats': self.stats, 'limiter': self._limiter, 'latency': self._latency,
+              'archive': self._archive, 'profiler': self._profiler, 'recorder': self._recorder, 'tracer': self._tracer,
+              'channel_headers': self._channel_headers}
+        return [entry_worker(i, *args, **kw) for i in range(ENTRY_POOL_SIZE)]
+
+
+def scrape(channels, deadline=None, writer=None, profiler=None):
+    """Scrape channels, return run statistics. Stops dispatching new work `deadline` seconds after start.
+    Stage timings are recorded to `profiler` (ScrapeProfiler) if given. Run history is saved as ScrapeRun.
+    Event loop and client session stay open for following runs, see close_client()"""
+    channels = list(channels)
+    started = timezone.now()
+    recorder = RunRecorder(channels)
+    loop = asyncio.get_event_loop()
+    on_insert = make_on_insert(getattr(settings, 'ENTRY_DUPLICATE_DISTANCE', None),
+                               getattr(settings, 'MEDIA_ITEMS', False))
 
+    trace_dir = getattr(settings, 'SCRAPER_TRACE_DIR', None)
+    tracer = open_run_trace(trace_dir) if trace_dir else None
+    batch_size = getattr(writer, 'batch_size', None)
 
-def scrape(channels):
-    loop = asyncio.get_event_loop()
-    buf = InsertBuffer(INSERT_BUFFER_SIZE)
+    if profiler is not None:
+        writer = TimedWriter(writer or BulkCreateWriter(), profiler)
+
+    if tracer is not None:
+        writer = TracedWriter(writer or BulkCreateWriter(), tracer)
+
+    buf = InsertBuffer(batch_size or INSERT_BUFFER_SIZE, writer=writer, on_insert=on_insert)
     eq = asyncio.Queue(ENTRY_POOL_SIZE * 2, loop=loop)
-    scraper = AioScraper(loop=loop, insert_buffer=buf, entry_queue=eq)
+    latency_path = state_path(HOST_LATENCY_FILE)
+    latency = HostLatency.load(latency_path, DEFAULT_TIMEOUT) if latency_path else None
+    archive_dir = getattr(settings, 'SCRAPER_ARCHIVE_DIR', None)
+    archive = open_run_archive(archive_dir) if archive_dir else None
+    dns_cache_path = state_path(DNS_CACHE_FILE)
+    dns_cache = DnsCache.load(dns_cache_path) if dns_cache_path else None
+    scraper = AioScraper(loop=loop, insert_buffer=buf, entry_queue=eq, deadline=deadline, latency=latency,
+                         archive=archive, profiler=profiler, recorder=recorder, tracer=tracer, dns_cache=dns_cache,
+                         client=make_client_factory())
+
+    if profiler is not None:
+        profiler.start()
+
     try:
-        scraper.run(channels)
+        stats = scraper.run(channels)
 
     finally:
-        loop.close()
+        if archive is not None:
+            archive.close()
+
+        if tracer is not None:
+            tracer.close()
+
+        if latency_path:
+            save_state(latency, latency_path)
+
+        if dns_cache_path:
+            save_state(dns_cache, dns_cache_path)
+
+        if profiler is not None:
+            profiler.stop()
+
+    scraped = [channel for channel in channels if channel.scraped is not None and channel.scraped >= started]
+    stats['channels_deferred'] = defer_shed(scraped, recorder)
+    Channel.objects.touch(recorder.changed(scraped))
+    recorder.save(scraped, stats)
+    scrape_finished.send(sender=AioScraper, channels=scraped)
+    return stats
+
+
+def defer_shed(channels, recorder):
+    """Restore last scraped time of channels that had entries shed, so they keep their place in scrape order and
+    next run picks up the rest. Returns their number"""
+    deferred = [channel for channel in channels if channel.id in recorder.shed]
+
+    for channel in deferred:
+        channel.scraped = recorder.scraped_before[channel.id]
+        Channel.objects.filter(id=channel.id).update(scraped=channel.scraped)
+
+    return len(deferred)
+
+
+def make_on_insert(duplicate_distance=None, media_items=False):
+    """Callback for inserted entries: link near-duplicates, then store media items of the rest. None if both are off"""
+    if duplicate_distance is None and not media_items:
+        return None
+
+    def on_insert(entries):
+        if duplicate_distance is not None:
+            linked = Entry.objects.link_duplicates(entries, duplicate_distance)
+            entries = [entry for entry in entries if entry not in linked]
+
+        if media_items:
+            MediaItem.objects.create_for_entries(entries)
+
+    return on_insert
+
+
+def make_client_factory():
+    """ClientFactory with connection limits from settings"""
+    limit_per_host = getattr(settings, 'SCRAPER_CONNECTION_LIMIT_PER_HOST', CONNECTION_LIMIT_PER_HOST)
+    return ClientFactory(limit=getattr(settings, 'SCRAPER_CONNECTION_LIMIT', CONNECTION_LIMIT),
+                         limit_per_host=limit_per_host,
+                         keepalive_timeout=getattr(settings, 'SCRAPER_KEEPALIVE_TIMEOUT', KEEPALIVE_TIMEOUT))
+
+
+def client_session(loop, client, dns_cache, stats):
+    """Client session and its resolver, kept open between runs on the same loop so long-lived processes reuse warm
+    connections. Resolver answers from `dns_cache` and adds to `stats` of current run. See close_client()"""
+    session, resolver = _sessions.get(loop, (None, None))
+
+    if session is None or session.closed:
+        resolver = CachingResolver(dns_cache, loop=loop, stats=stats)
+        session = client.session(loop, timeout=TIMEOUT_MAX, resolver=resolver)    # See latency
+        _sessions[loop] = session, resolver
+
+    resolver.cache, resolver.stats = dns_cache, stats
+    return session, resolver
+
+
+def close_client(loop=None):
+    """Close client session kept by scrape() on loop, e.g. before process exit"""
+    loop = loop or asyncio.get_event_loop()
+    session, _ = _sessions.pop(loop, (None, None))
+
+    if session is not None and not session.closed:
+        loop.run_until_complete(session.close())
 
 
-async def channel_worker(worker_no, channel_queue, entry_queue, session):
-    logger.info('Channel worker #%d started' % worker_no)
+def state_path(filename):
+    """Path to file in scraper state directory, or None if state is not persisted"""
+    state_dir = getattr(settings, 'SCRAPER_STATE_DIR', None)
+    return os.path.join(state_dir, filename) if state_dir else None
+
+
+def save_state(state, path):
+    """Save HostLatency or DnsCache to file, creating state directory. Errors are logged, the run is not failed"""
+    try:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        state.save(path)
+
+    except OSError as e:
+        logger.warning('Not saving scraper state to %s - %r', path, e)
+
+
+async def channel_worker(worker_no, channel_queue, entry_queue, session, *, deadline=None, stats=None,
+                         limiter=None, latency=None, archive=None, profiler=null_profiler, recorder=None,
+                         tracer=null_tracer):
+    logger.info('Channel worker #%d started', worker_no)
+    stats = Counter() if stats is None else stats
 
     while True:
+        if deadline is not None and deadline.expired():
+            shed_channels(channel_queue, stats)
+
         channel = channel_queue.popleft()
 
         if channel is None:
             break
 
         fut = FutureLite()
-        await download_to_future(channel.url, fut, session=session)
-        new_entries = process_channel(channel, fut)
-        channel.save()
+        started = time.monotonic()
+
+        with tracer.channel_span(channel) as span:
+            download_span = tracer.span('download', span)
+
+            with profiler.stage('download', channel.id, channel.url, cpu=False), download_span:
+                more_pages = await download_channel_pages(channel, fut, session=session, latency=latency,
+                                                          archive=archive, deadline=deadline)
+
+            fetched = time.monotonic()
+            size = sum(response_size(page) for page in [fut] + more_pages)
+            wire = sum(wire_size(page) for page in [fut] + more_pages)
+            download_span.set(bytes=size, wire_bytes=wire, pages=1 + len(more_pages), error=fut.exception())
+            channel_stats = Counter()
+
+            with tracer.span('parse', span):
+                new_entries = process_channel(channel, fut, profiler, channel_stats, more_pages)
+
+            channel.save()
+            span.set(bytes=size, status=channel.status, entries_new=len(new_entries), **channel_stats)
+            tracer.adopt(span, new_entries)
+
+        stats['channels'] += 1
+        stats['bytes'] += size
+        stats['wire_bytes'] += wire
+
+        if recorder is not None:
+            recorder.add(channel.id, fetch_time=fetched - started, parse_time=time.monotonic() - fetched,
+                         bytes=size, entries_new=len(new_entries), **channel_stats)
 
         for entry in new_entries:
             await entry_queue.put(entry)
 
     if not channel_queue:   # this is the last channel worker left
-        logger.info('Channel worker #%d signaling entry workers to shut down' % worker_no)
+        logger.info('Channel worker #%d signaling entry workers to shut down', worker_no)
+
+        if limiter is not None:
+            limiter.drain()
 
         for _ in range(ENTRY_POOL_SIZE):
             await entry_queue.put(None)
 
-    logger.info('Terminating channel worker #%d' % worker_no)
+    logger.info('Terminating channel worker #%d', worker_no)
+
 
+async def download_channel_pages(channel, fut, *, session, latency=None, archive=None, deadline=None):
+    """Download first channel page to `fut`, then following pages up to channel.max_pages. Returns their futures.
+
+    Pages with urls from page url template are downloaded concurrently with the first one,
+    otherwise each next page link is followed after its page is downloaded, until `deadline` expires
+    """
+    kw = {'session': session, 'latency': latency, 'archive': archive, 'headers': channel.request_headers or None,
+          'archive_meta': {'kind': 'channel', 'channel': channel.id}}
+    urls = channel.page_urls()
+
+    if urls:
+        more_pages = [FutureLite() for _ in urls]
+        downloads = [download_to_future(channel.url, fut, **kw)]
+        downloads.extend(download_to_future(url, page, **kw) for url, page in zip(urls, more_pages))
+        await asyncio.gather(*downloads)
+        return more_pages
+
+    await download_to_future(channel.url, fut, **kw)
+    more_pages, seen, page = [], {channel.url}, fut
+
+    while channel.next_page_selector and len(more_pages) + 1 < channel.max_pages:
+        if deadline is not None and deadline.expired():
+            logger.info('%r - Deadline expired, not following more pages', channel)
+            break
 
-async def entry_worker(worker_no, entry_queue, session, buffer):
-    logger.info('Entry worker #%d started' % worker_no)
+        url = next_page_url(channel, page)
+
+        if url is None or url in seen:
+            break
+
+        seen.add(url)
+        page = FutureLite()
+        await download_to_future(url, page, **kw)
+        more_pages.append(page)
+
+    return more_pages
+
+
+async def entry_worker(worker_no, entry_queue, session, buffer, *, deadline=None, stats=None, limiter=None,
+                       latency=None, archive=None, profiler=null_profiler, recorder=None, tracer=null_tracer,
+                       channel_headers=None):
+    logger.info('Entry worker #%d started', worker_no)
+    stats = Counter() if stats is None else stats
 
     while True:
+        if limiter is not None:
+            await limiter.wait_turn(worker_no)
+
         entry = await entry_queue.get()
 
         if entry is None:
             break
 
+        if deadline is not None and deadline.expired():
+            stats['entries_shed'] += 1     # Not stored, so next run will pick it up as new again
+
+            if recorder is not None:
+                recorder.shed.add(entry.channel_id)
+
+            continue
+
         lfut = FutureLite()
-        await asyncio.shield(download_to_future(entry.url, lfut, session=session))
-        process_entry(entry, lfut)
+        started = time.monotonic()
+        meta = {'kind': 'entry', 'channel': entry.channel_id}
+        headers = channel_headers.get(entry.channel_id) if channel_headers else None
+
+        with tracer.entry_span(entry) as span:
+            download_span = tracer.span('download', span)
+
+            with profiler.stage('download', entry.channel_id, entry.url, cpu=False), download_span:
+                await asyncio.shield(download_to_future(entry.url, lfut, session=session, latency=latency,
+                                                        archive=archive, archive_meta=meta, headers=headers))
+
+            fetched = time.monotonic()
+            size, wire = response_size(lfut), wire_size(lfut)
+            download_span.set(bytes=size, wire_bytes=wire, error=lfut.exception())
+
+            if limiter is not None:
+                limiter.record(fetched - started, error=isinstance(lfut.exception(), RetryableDownloadError))
+
+            with tracer.span('parse', span):
+                process_entry(entry, lfut, profiler)
+
+            span.set(bytes=size, status=entry.status)
+
+        if recorder is not None:
+            recorder.add(entry.channel_id, entries=1, fetch_time=fetched - started,
+                         parse_time=time.monotonic() - fetched, bytes=size)
 
         buffer.add(entry)
+        stats['entries'] += 1
+        stats['bytes'] += size
+        stats['wire_bytes'] += wire
+
+    logger.info('Entry worker #%d got None, terminating', worker_no)
+
+
+def shed_channels(channel_queue, stats):
+    """Drop all pending channels from queue, keeping shutdown signals for channel workers"""
+    pending = [channel for channel in channel_queue if channel is not None]
 
-    logger.info('Entry worker #%d got None, terminating' % worker_no)
+    if pending:
+        logger.warning('Deadline reached, shedding %d channels', len(pending))
+        stats['channels_shed'] += len(pending)
+        num_signals = len(channel_queue) - len(pending)
+        channel_queue.clear()
+        channel_queue.extend([None] * num_signals)
@@ -0,0 +1,167 @@
+"""WARC-style archive of fetched responses, for offline re-extraction"""
+import gzip
+import io
+import logging
+import os
+import threading
+import uuid
+import zlib
+from collections import namedtuple
+from datetime import datetime, timezone
+
+
+DECODED_BODY_HEADERS = {'content-encoding', 'content-length', 'transfer-encoding'}  # Not archived, body is decoded
+META_PREFIX = 'WARC-Glommer-'   # Prefix for extension headers carrying scraper metadata (page kind, channel id etc)
+READ_SIZE = 64 * 1024           # Compressed bytes read at once when scanning archive members
+
+logger = logging.getLogger(__name__)
+
+ArchivedResponse = namedtuple('ArchivedResponse', 'url final_url status headers body timestamp meta')
+
+
+class ResponseArchive:
+
+    """Appends responses to a gzipped WARC-style file, one gzip member per record. Writes are thread-safe"""
+
+    def __init__(self, path):
+        self.path = path
+        self._file = open(path, 'ab')
+        self._lock = threading.Lock()
+        self.records = 0
+
+    def write(self, url, response, body, **meta):
+        """Append response record. `meta` is stored as extension headers and returned on read"""
+        final_url = str(response.url)
+        status_line = 'HTTP/1.1 %d %s' % (response.status, response.reason or '')
+        http_headers = ''.join('%s: %s\r\n' % (k, v) for k, v in response.headers.items()
+                               if k.lower() not in DECODED_BODY_HEADERS)
+        block = ('%s\r\n%s\r\n' % (status_line, http_headers)).encode('utf-8', 'replace') + body
+
+        warc_headers = [
+            ('WARC-Type', 'response'),
+            ('WARC-Record-ID', '<urn:uuid:%s>' % uuid.uuid4()),
+            ('WARC-Date', datetime.now(timezone.utc).strftime('%Y-%m-%dT%H:%M:%SZ')),
+            ('WARC-Target-URI', final_url),
+            (META_PREFIX + 'Request-URI', url),
+        ]
+        warc_headers.extend((META_PREFIX + name.title(), value) for name, value in sorted(meta.items()))
+        warc_headers.extend([
+            ('Content-Type', 'application/http; msgtype=response'),
+            ('Content-Length', len(block)),
+        ])
+
+        head = 'WARC/1.0\r\n' + ''.join('%s: %s\r\n' % h for h in warc_headers) + '\r\n'
+        record = gzip.compress(head.encode('utf-8') + block + b'\r\n\r\n')
+
+        with self._lock:
+            self._file.write(record)
+            self.records += 1
+
+    def close(self):
+        self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+
+def read_archive(path):
+    """Generates ArchivedResponse for each record in archive file"""
+    with gzip.open(path, 'rb') as f:
+        yield from read_records(f, path)
+
+
+def index_archive(path):
+    """Generates (offset, ArchivedResponse) for each record in archive file, offset of its gzip member in file.
+    Only one record is held in memory at a time, use read_record() to read it again by offset"""
+    with open(path, 'rb') as f:
+        offset = 0
+
+        while True:
+            data, size = read_member(f, offset)
+
+            if not size:
+                break
+
+            for response in read_records(io.BytesIO(data), path):
+                yield offset, response
+
+            offset += size
+
+
+def read_record(path, offset):
+    """Read ArchivedResponse from gzip member starting at offset in archive file"""
+    with open(path, 'rb') as f:
+        data, _ = read_member(f, offset)
+
+    return next(read_records(io.BytesIO(data), path))
+
+
+def read_member(f, offset):
+    """Decompress one gzip member starting at offset. Returns (data, compressed size), size is 0 at end of file"""
+    f.seek(offset)
+    decompressor = zlib.decompressobj(16 + zlib.MAX_WBITS)
+    chunks, size = [], 0
+
+    while not decompressor.eof:
+        chunk = f.read(READ_SIZE)
+
+        if not chunk:
+            if not size:
+                return b'', 0
+
+            raise ValueError('Unexpected end of archive')
+
+        size += len(chunk)
+        chunks.append(decompressor.decompress(chunk))
+
+    return b''.join(chunks), size - len(decompressor.unused_data)
+
+
+def read_records(f, path):
+    while True:
+        version = f.readline()
+
+        if not version:
+            break
+
+        if not version.startswith(b'WARC/'):
+            raise ValueError('%s: invalid record header %r' % (path, version))
+
+        warc_headers = read_headers(f)
+        block = f.read(int(warc_headers['Content-Length']))
+        f.read(4)   # Record separator
+        yield parse_record(warc_headers, block)
+
+
+def parse_record(warc_headers, block):
+    head, _, body = block.partition(b'\r\n\r\n')
+    status_line, *header_lines = head.decode('utf-8').split('\r\n')
+    http_headers = dict(line.split(': ', 1) for line in header_lines if line)
+    meta = {k[len(META_PREFIX):].lower(): v for k, v in warc_headers.items() if k.startswith(META_PREFIX)}
+    url = meta.pop('request-uri', warc_headers['WARC-Target-URI'])
+
+    return ArchivedResponse(url=url, final_url=warc_headers['WARC-Target-URI'], status=int(status_line.split()[1]),
+                            headers=http_headers, body=body, timestamp=warc_headers['WARC-Date'], meta=meta)
+
+
+def read_headers(f):
+    headers = {}
+
+    for line in iter(f.readline, b'\r\n'):
+        if not line:
+            raise ValueError('Unexpected end of archive')
+
+        name, _, value = line.decode('utf-8').partition(':')
+        headers[name] = value.strip()
+
+    return headers
+
+
+def open_run_archive(archive_dir):
+    """Create archive file for current scrape run in given directory"""
+    os.makedirs(archive_dir, exist_ok=True)
+    filename = 'responses-%s.warc.gz' % datetime.now(timezone.utc).strftime('%Y%m%d-%H%M%S')
+    return ResponseArchive(os.path.join(archive_dir, filename))
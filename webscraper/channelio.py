@@ -0,0 +1,94 @@
+"""Bulk channel import and export, as JSON list of objects or CSV with header row"""
+import csv
+import json
+
+from django.db import transaction
+from django.utils.duration import duration_string
+
+from .forms import ChannelForm
+from .models import Channel
+
+FORMATS = ('json', 'csv')
+FIELDS = ChannelForm.Meta.fields
+
+
+class ChannelImportError(Exception):
+
+    def __init__(self, errors):
+        super(ChannelImportError, self).__init__('%d invalid channels' % len(errors))
+        self.errors = errors    # [(row number, {field: [messages]})]
+
+
+def read_channels(f, fmt):
+    """Channel rows (dicts) from file"""
+    if fmt == 'csv':
+        return list(csv.DictReader(f))
+
+    rows = json.load(f)
+
+    if not isinstance(rows, list) or not all(isinstance(row, dict) for row in rows):
+        raise ValueError('Expected a list of objects')
+
+    return rows
+
+
+def write_channels(f, channels, fmt):
+    """Write channels in format read by read_channels()"""
+    rows = [export_row(channel) for channel in channels]
+
+    if fmt == 'csv':
+        writer = csv.DictWriter(f, FIELDS)
+        writer.writeheader()
+        writer.writerows({name: json.dumps(value) if isinstance(value, dict) else value
+                          for name, value in row.items()} for row in rows)
+    else:
+        f.write(json.dumps(rows, indent=2) + '\n')
+
+
+def export_row(channel):
+    row = {name: getattr(channel, name) for name in FIELDS}
+    row['max_age'] = duration_string(channel.max_age) if channel.max_age is not None else None
+    return row
+
+
+def validate_channels(rows):
+    """Unsaved channels from rows, fields missing from a row get model defaults. Raises ChannelImportError"""
+    defaults = {f.name: f.get_default() for f in Channel._meta.fields if f.name in FIELDS and f.has_default()}
+    channels, errors = [], []
+
+    for num, row in enumerate(rows, 1):
+        form = ChannelForm(data=dict(defaults, **row))
+
+        if form.is_valid():
+            channels.append(form.save(commit=False))
+        else:
+            errors.append((num, form.errors))
+
+    if errors:
+        raise ChannelImportError(errors)
+
+    return channels
+
+
+def import_channels(rows, skip_existing=False):
+    """Validate rows and create channels in one transaction. None are created if any row is invalid.
+    With `skip_existing`, rows with urls of existing channels or of earlier rows are left out.
+    Returns created channels"""
+    channels = validate_channels(rows)
+
+    if skip_existing:
+        seen = set(Channel.objects.filter(url__in=[c.url for c in channels]).values_list('url', flat=True))
+        new_channels = []
+
+        for channel in channels:
+            if channel.url not in seen:
+                seen.add(channel.url)
+                new_channels.append(channel)
+
+        channels = new_channels
+
+    for channel, slug in zip(channels, Channel.make_slugs(len(channels))):
+        channel.slug = slug
+
+    with transaction.atomic():
+        return Channel.objects.bulk_create(channels)
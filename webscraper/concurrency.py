@@ -0,0 +1,101 @@
+"""Adaptive concurrency control for entry workers"""
+import asyncio
+import logging
+import time
+
+
+WINDOW_SIZE = 16            # Number of completed requests between limit adjustments
+ERROR_THRESHOLD = 0.2       # Back off if more than this share of requests in window failed
+LATENCY_TOLERANCE = 2.0     # Back off if average latency is this many times higher than baseline
+BASELINE_DRIFT = 1.05       # Let baseline latency creep up between windows to follow slow changes
+BACKOFF_FACTOR = 0.75       # Multiplicative decrease
+
+logger = logging.getLogger(__name__)
+
+
+class AdaptiveLimiter:
+
+    """AIMD controller for the number of active workers.
+
+    Workers numbered below `limit` are active, the rest wait until the limit grows. After every window of completed
+    requests the limit grows by one if error rate and latency are acceptable and throughput is not dropping,
+    or shrinks multiplicatively otherwise.
+    """
+
+    def __init__(self, *, floor, ceiling, initial=None, window=WINDOW_SIZE, stats=None, loop=None):
+        self.floor = floor
+        self.ceiling = ceiling
+        self.limit = max(floor, min(ceiling, initial or floor))
+        self._window = window
+        self._stats = stats
+        self._loop = loop
+        self._changed = asyncio.Event(loop=loop)
+        self._draining = False
+        self._latencies = []
+        self._errors = 0
+        self._window_started = time.monotonic()
+        self._baseline = None
+        self._throughput = None
+        self._publish()
+
+    async def wait_turn(self, worker_no):
+        """Wait until worker is allowed to take work"""
+        while not self._draining and worker_no >= self.limit:
+            await self._changed.wait()
+
+    def drain(self):
+        """Wake all workers, so they can pick up shutdown signals"""
+        self._draining = True
+        self._set_limit(self.ceiling)
+
+    def record(self, latency, error=False):
+        """Register completed request"""
+        self._latencies.append(latency)
+        self._errors += bool(error)
+
+        if len(self._latencies) >= self._window:
+            self._adjust()
+
+    def _adjust(self):
+        now = time.monotonic()
+        num_requests = len(self._latencies)
+        error_rate = self._errors / num_requests
+        latency = sum(self._latencies) / num_requests
+        throughput = num_requests / max(now - self._window_started, 1e-6)
+
+        if self._baseline is None:
+            self._baseline = latency
+        else:
+            self._baseline = min(latency, self._baseline * BASELINE_DRIFT)
+
+        if error_rate > ERROR_THRESHOLD or latency > self._baseline * LATENCY_TOLERANCE:
+            new_limit = int(self.limit * BACKOFF_FACTOR)
+        elif self._throughput is not None and throughput < self._throughput * BACKOFF_FACTOR:
+            new_limit = self.limit - 1      # More workers are not helping
+        else:
+            new_limit = self.limit + 1
+
+        logger.debug('%r: errors %.2f latency %.3fs (baseline %.3fs) throughput %.1f/s',
+                     self, error_rate, latency, self._baseline, throughput)
+
+        self._set_limit(new_limit)
+        self._throughput = throughput
+        self._latencies, self._errors, self._window_started = [], 0, now
+
+    def _set_limit(self, value):
+        value = max(self.floor, min(self.ceiling, value))
+
+        if value != self.limit:
+            logger.info('%r: limit changed from %d to %d', self, self.limit, value)
+            self.limit = value
+            self._publish()
+
+        self._changed.set()     # Wake up waiting workers, they will recheck their numbers
+        self._changed = asyncio.Event(loop=self._loop)
+
+    def _publish(self):
+        if self._stats is not None:
+            self._stats['entry_limit'] = self.limit
+
+    def __repr__(self):
+        return '<%s(limit=%d, floor=%d, ceiling=%d)>' % (self.__class__.__name__, self.limit, self.floor, self.ceiling)
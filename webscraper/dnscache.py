@@ -0,0 +1,126 @@
+"""DNS cache kept between runs and aiohttp resolver answering from it"""
+import asyncio
+import json
+import logging
+import os
+import socket
+import time
+from collections import Counter
+
+import aiodns
+from aiohttp.abc import AbstractResolver
+from aiohttp.helpers import is_ip_address
+
+
+TTL_MIN = 60            # seconds, records with shorter TTL are cached this long
+TTL_MAX = 6 * 3600
+
+logger = logging.getLogger(__name__)
+
+
+class DnsCache:
+
+    """Host addresses with expiry times (unix time), so they stay valid across runs for their TTL"""
+
+    def __init__(self, entries=None):
+        self._entries = {host: (expires, list(addresses)) for host, (expires, addresses) in (entries or {}).items()}
+
+    def get(self, host, now=None):
+        """Cached addresses of host, None if host is unknown or its record has expired"""
+        entry = self._entries.get(host)
+        now = time.time() if now is None else now
+
+        if entry is None or entry[0] <= now:
+            return None
+
+        return entry[1]
+
+    def put(self, host, addresses, ttl, now=None):
+        ttl = max(TTL_MIN, min(TTL_MAX, ttl))
+        self._entries[host] = ((time.time() if now is None else now) + ttl, list(addresses))
+
+    def to_dict(self, now=None):
+        """Unexpired records"""
+        now = time.time() if now is None else now
+        return {host: entry for host, entry in self._entries.items() if entry[0] > now}
+
+    def save(self, path):
+        """Atomically write unexpired records to a json file"""
+        tmp_path = path + '.tmp'
+
+        with open(tmp_path, 'w') as f:
+            json.dump(self.to_dict(), f)
+
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path):
+        """Create instance from file written by save(), start from scratch if file is missing or broken"""
+        try:
+            with open(path) as f:
+                return cls(json.load(f))
+
+        except (OSError, ValueError, TypeError) as e:
+            logger.info('Not loading DNS cache from %s - %r', path, e)
+            return cls()
+
+    def __len__(self):
+        return len(self._entries)
+
+
+class CachingResolver(AbstractResolver):
+
+    """Resolves from DnsCache, queries A records through aiodns on misses and caches them for their TTL.
+
+    Lookup counts and time spent in queries are added to `stats` as dns_lookups, dns_cache_hits and dns_time
+    """
+
+    def __init__(self, cache, loop=None, stats=None, resolver=None):
+        self.cache = cache
+        self.stats = Counter() if stats is None else stats
+        self._resolver = resolver if resolver is not None else aiodns.DNSResolver(loop=loop)
+        self._pending = {}  # host -> lookup future, shared by concurrent lookups of same host
+
+    async def resolve(self, host, port=0, family=socket.AF_INET):
+        addresses = self.cache.get(host)
+
+        if addresses is None:
+            addresses = await self.lookup(host)
+        else:
+            self.stats['dns_cache_hits'] += 1
+
+        return [{'hostname': host, 'host': address, 'port': port, 'family': family, 'proto': 0,
+                 'flags': socket.AI_NUMERICHOST} for address in addresses]
+
+    async def lookup(self, host):
+        """Query addresses of host and cache them. Cancelling one lookup doesn't cancel query shared with others"""
+        fut = self._pending.get(host)
+
+        if fut is None:
+            fut = self._pending[host] = asyncio.ensure_future(self._query(host))
+            fut.add_done_callback(lambda _: self._pending.pop(host, None))
+
+        return await asyncio.shield(fut)
+
+    async def _query(self, host):
+        started = time.monotonic()
+
+        try:
+            records = await self._resolver.query(host, 'A')
+
+        finally:
+            self.stats['dns_lookups'] += 1
+            self.stats['dns_time'] += time.monotonic() - started
+
+        addresses = [record.host for record in records]
+        self.cache.put(host, addresses, min((record.ttl for record in records), default=TTL_MIN))
+        return addresses
+
+    async def prefetch(self, hosts):
+        """Resolve uncached hosts in parallel, return their number. Failures are left for downloads to report"""
+        hosts = {host for host in hosts if host and not is_ip_address(host) and self.cache.get(host) is None}
+        await asyncio.gather(*[self.lookup(host) for host in hosts], return_exceptions=True)
+        return len(hosts)
+
+    async def close(self):
+        self._resolver.cancel()
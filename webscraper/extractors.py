@@ -1,9 +1,10 @@
 """Low-level html parsing primitives"""
 
+from functools import lru_cache
 from string import ascii_uppercase, ascii_lowercase
 import re
 import lxml.html
-from lxml.etree import XMLSyntaxError, XPathEvalError, ParserError
+from lxml.etree import XMLSyntaxError, XPathError, ParserError, XPath
 from urllib.parse import urljoin
 
 RE_NS = "http://exslt.org/regular-expressions"  # this is the namespace for the EXSLT extensions
@@ -27,9 +28,9 @@ class RowExtractor:
     def extract(self, doc_or_tree, base_url='.'):
         try:
             etree = ensure_element(doc_or_tree, base_url)
-            return etree.xpath(self.selector, namespaces={'re': RE_NS})
+            return compile_selector(self.selector)(etree)
 
-        except (XMLSyntaxError, XPathEvalError) as e:
+        except (XMLSyntaxError, XPathError) as e:
             raise ParseError(str(e)) from e
 
 
@@ -50,8 +51,9 @@ class DatasetExtractor:
         self.row_extractor = RowExtractor(selector=selector)
         self.field_extractors = {name: FieldExtractor(selector=fs) for name, fs in fields.items()}
 
-    def extract(self, doc_or_tree, base_url='.'):
-        rows = self.row_extractor.extract(doc_or_tree, base_url)
+    def extract(self, doc_or_tree, base_url='.', encoding=None):
+        etree = ensure_element(doc_or_tree, base_url, encoding)
+        rows = self.row_extractor.extract(etree, base_url)
         return [self.extract_fields(row, base_url) for row in rows]
 
     def extract_fields(self, row, base_url):
@@ -91,11 +93,11 @@ class EntryExtractor:
         self._videos_extractor = link_extractor(VIDEO_EXTENSIONS)
         self._streaming_extractor = RegexExtractor(STREAMING_EXTENSIONS)
 
-    def extract(self, doc, base_url='.'):
-        etree = ensure_element(doc, base_url)
+    def extract(self, doc, base_url='.', encoding=None):
+        etree = ensure_element(doc, base_url, encoding)
         image_urls = [row['url'] for row in self._images_extractor.extract(etree, base_url)]
         video_urls = [row['url'] for row in self._videos_extractor.extract(etree, base_url)]
-        streaming_urls = self._streaming_extractor.extract(doc, base_url)
+        streaming_urls = self._streaming_extractor.extract(doc, base_url, encoding)
 
         return {
             'images': image_urls,
@@ -104,24 +106,52 @@ class EntryExtractor:
         }
 
     @classmethod
-    def extract_items(cls, doc, base_url='.'):      # TODO refactor this
+    def extract_items(cls, doc, base_url='.', encoding=None):      # TODO refactor this
         try:
-            return cls._instance.extract(doc, base_url)
+            return cls._instance.extract(doc, base_url, encoding)
         except AttributeError:
             cls._instance = cls()
-            return cls._instance.extract(doc, base_url)
+            return cls._instance.extract(doc, base_url, encoding)
 
 
 class RegexExtractor:
 
-    """Extracts text fragment from document using regular expression"""
+    """Extracts text fragment from document using regular expression.
+
+    Undecoded documents in ASCII-compatible encodings are searched as bytes, only candidate matches are decoded
+    and matched again as text
+    """
 
     def __init__(self, extensions):
         ext_frag = '\.(?:%s)' % '|'.join(extensions)
         self._ext_rx = re.compile('([\w\.\-\/]+%s)' % ext_frag, re.IGNORECASE)
+        self._ext_rx_bytes = re.compile(br'([\w\.\-\/\x80-\xff]+%s)' % ext_frag.encode(), re.IGNORECASE)
+
+    def extract(self, doc, base_url='.', encoding=None):
+        if isinstance(doc, bytes):
+            encoding = encoding or 'utf-8'
+
+            if not ascii_compatible(encoding):
+                return self.extract(doc.decode(encoding, errors='ignore'), base_url)
+
+            candidates = self._ext_rx_bytes.findall(doc)    # May span non-word characters, like no-break space
+            urls = [url for candidate in candidates
+                    for url in self._ext_rx.findall(candidate.decode(encoding, errors='ignore'))]
+
+        else:
+            urls = self._ext_rx.findall(doc)
 
-    def extract(self, doc, base_url='.'):
-        return [urljoin(base_url, url) for url in self._ext_rx.findall(doc)]
+        return [urljoin(base_url, url) for url in urls]
+
+
+@lru_cache(maxsize=1024)
+def compile_selector(selector):
+    """Compiled XPath selector, with EXSLT regular expressions under `re` prefix. Raises ParseError if invalid"""
+    try:
+        return XPath(selector, namespaces={'re': RE_NS})
+
+    except XPathError as e:
+        raise ParseError(str(e)) from e
 
 
 def first_or_none(scalar_or_seq):
@@ -136,13 +166,22 @@ def first_or_none(scalar_or_seq):
         return scalar_or_seq
 
 
-def ensure_element(doc_or_tree, base_url='.'):
-    """Returns lxml.html.HtmlElement, creates it from string if necessary"""
+def ensure_element(doc_or_tree, base_url='.', encoding=None):
+    """Returns lxml.html.HtmlElement, creates it from string or bytes if necessary.
+
+    Bytes are decoded by lxml itself, using `encoding` if given or document's own charset declaration otherwise
+    """
     if isinstance(doc_or_tree, lxml.html.HtmlElement):
         return doc_or_tree
 
     try:
-        tree = lxml.html.fromstring(doc_or_tree, base_url=base_url)
+        parser = html_parser(encoding) if isinstance(doc_or_tree, bytes) else None
+
+    except LookupError:     # Codec libxml2 does not know under Python's name, e.g. euc_jp
+        doc_or_tree, parser = decode(doc_or_tree, encoding), None
+
+    try:
+        tree = lxml.html.fromstring(doc_or_tree, base_url=base_url, parser=parser)
         tree.make_links_absolute(resolve_base_href=True)    # TODO handle_failures='ignore'?
         return tree
 
@@ -151,6 +190,30 @@ def ensure_element(doc_or_tree, base_url='.'):
         raise ParseError(message) from e
 
 
+def decode(doc, encoding):
+    """Document bytes as text, undecodable bytes replaced. Falls back to utf-8 for unknown encoding"""
+    try:
+        return doc.decode(encoding, errors='replace')
+
+    except LookupError:
+        return doc.decode('utf-8', errors='replace')
+
+
+@lru_cache()
+def html_parser(encoding=None):
+    """Shared html parser for given encoding"""
+    return lxml.html.HTMLParser(encoding=encoding)
+
+
+def ascii_compatible(encoding):
+    """True if ASCII characters are encoded as single ASCII bytes in this encoding"""
+    try:
+        return 'a/.'.encode(encoding) == b'a/.'
+
+    except LookupError:
+        return False
+
+
 def xpath_tolower(what):
     """Uses XPath 1.0 translate() to emulate XPAth 2.0 lower-case()"""
 
@@ -0,0 +1,48 @@
+"""Entry content fingerprints: 64-bit simhash over media file names and title words, for near-duplicate detection"""
+import hashlib
+import posixpath
+import re
+from urllib.parse import urlsplit
+
+
+BITS = 64
+BANDS = 4   # Fingerprint is indexed as 16-bit bands, fingerprints differing in less than BANDS bits share a band
+BAND_BITS = BITS // BANDS
+BAND_MASK = (1 << BAND_BITS) - 1
+
+WORD_RX = re.compile(r'\w+', re.UNICODE)
+
+
+def entry_fingerprint(title, items):
+    """Fingerprint of entry content, None if entry has no media. Mirrors keep file names, so hosts and paths are
+    left out"""
+    names = [posixpath.basename(urlsplit(url).path).lower() for urls in (items or {}).values() for url in urls]
+
+    if not names:
+        return None
+
+    return simhash(names + WORD_RX.findall((title or '').lower()))
+
+
+def simhash(features):
+    """Simhash of feature strings, as signed 64-bit integer to fit bigint column"""
+    weights = [0] * BITS
+
+    for feature in set(features):
+        digest = int.from_bytes(hashlib.md5(feature.encode('utf-8')).digest()[:BITS // 8], 'big')
+
+        for bit in range(BITS):
+            weights[bit] += 1 if digest >> bit & 1 else -1
+
+    value = sum(1 << bit for bit, weight in enumerate(weights) if weight > 0)
+    return value - (1 << BITS) if value >> (BITS - 1) else value
+
+
+def hamming(a, b):
+    """Number of differing bits"""
+    return bin((a ^ b) & ((1 << BITS) - 1)).count('1')
+
+
+def bands(fingerprint):
+    """16-bit bands of fingerprint, same as band index expressions `(fingerprint >> N) & 65535`"""
+    return [fingerprint >> (band * BAND_BITS) & BAND_MASK for band in range(BANDS)]
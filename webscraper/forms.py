@@ -0,0 +1,66 @@
+from string import Formatter
+
+from django import forms
+
+from .extractors import ParseError, compile_selector
+from .models import Channel
+
+
+SELECTOR_FIELDS = ['row_selector', 'url_selector', 'title_selector', 'extra_selector', 'next_page_selector']
+
+
+class ChannelForm(forms.ModelForm):
+
+    """Channel settings that can be edited or imported, with selectors checked by compiling them"""
+
+    class Meta:
+        model = Channel
+        fields = [
+            'title', 'url', 'enabled', 'interval', 'group', 'row_selector', 'url_selector', 'title_selector',
+            'extra_selector', 'next_page_selector', 'page_url_template', 'max_pages', 'max_entries', 'max_age',
+            'request_headers']
+
+    def clean(self):
+        cleaned_data = super(ChannelForm, self).clean()
+
+        for name in SELECTOR_FIELDS:
+            if cleaned_data.get(name):
+                try:
+                    compile_selector(cleaned_data[name])
+
+                except ParseError as e:
+                    self.add_error(name, 'Invalid XPath selector: %s' % e)
+
+        return cleaned_data
+
+    def clean_page_url_template(self):
+        template = self.cleaned_data['page_url_template']
+
+        if template:
+            try:
+                fields = {name for _, name, _, _ in Formatter().parse(template) if name is not None}
+                template.format(page=2)
+
+            except (KeyError, IndexError, ValueError, AttributeError):
+                fields = None
+
+            if fields != {'page'}:
+                raise forms.ValidationError('Enter an url with {page} as the only placeholder')
+
+        return template
+
+    def clean_max_pages(self):
+        max_pages = self.cleaned_data['max_pages']
+
+        if max_pages is not None and max_pages < 1:
+            raise forms.ValidationError('Ensure this value is at least 1')
+
+        return max_pages
+
+    def clean_request_headers(self):
+        headers = self.cleaned_data['request_headers'] or {}
+
+        if not isinstance(headers, dict) or not all(isinstance(v, str) for v in headers.values()):
+            raise forms.ValidationError('Enter an object of header names and string values')
+
+        return headers
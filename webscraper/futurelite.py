@@ -49,5 +49,12 @@ class FutureLite:
 
         return self._result
 
+    def exception(self):
+        """Return the exception that was set on this future, or None"""
+        if not self.done():
+            raise InvalidStateError('Exception is not set.')
+
+        return self._exception
+
     def _raise_for_state(self):
         raise InvalidStateError('Invalid future state: {}'.format(self._state))
@@ -0,0 +1,92 @@
+"""Per-host latency tracking and adaptive request timeouts"""
+import json
+import logging
+import os
+from collections import defaultdict, deque
+from urllib.parse import urlsplit
+
+
+TIMEOUT_MIN = 2             # seconds
+TIMEOUT_MAX = 20
+TIMEOUT_PERCENTILE = 0.95
+TIMEOUT_FACTOR = 3          # Timeout is this many times the percentile latency
+SAMPLE_SIZE = 50            # Keep this many most recent samples per host
+MIN_SAMPLES = 5             # Use default timeout until host has this many samples
+TIMEOUT_RATE_MAX = 0.5      # Timeout is capped at default for hosts with this share of recent requests timing out
+
+logger = logging.getLogger(__name__)
+
+
+class HostLatency:
+
+    """Keeps moving window of request latencies per host and derives request timeouts from it.
+    Timed out requests are kept in the window as None, they count towards timeout rate but not latency"""
+
+    def __init__(self, default_timeout, samples=None):
+        self.default_timeout = default_timeout
+        self._samples = defaultdict(lambda: deque(maxlen=SAMPLE_SIZE))
+
+        for host, values in (samples or {}).items():
+            self._samples[host].extend(values)
+
+    def record(self, url, latency):
+        """Register latency of completed request"""
+        self._samples[host_of(url)].append(round(latency, 3))
+
+    def record_timeout(self, url):
+        """Register request that timed out"""
+        self._samples[host_of(url)].append(None)
+
+    def timeout(self, url):
+        """Request timeout for url, based on latency percentile for its host.
+        Not above default timeout if host times out often, so dead hosts don't hold up the run"""
+        samples = self._samples.get(host_of(url)) or ()
+        latencies = [value for value in samples if value is not None]
+
+        if len(latencies) < MIN_SAMPLES:
+            value = self.default_timeout
+        else:
+            value = percentile(latencies, TIMEOUT_PERCENTILE) * TIMEOUT_FACTOR
+            value = max(TIMEOUT_MIN, min(TIMEOUT_MAX, value))
+
+        if samples and len(samples) - len(latencies) >= len(samples) * TIMEOUT_RATE_MAX:
+            value = min(value, self.default_timeout)
+
+        return value
+
+    def to_dict(self):
+        return {host: list(samples) for host, samples in self._samples.items()}
+
+    def save(self, path):
+        """Atomically write samples to a json file"""
+        tmp_path = path + '.tmp'
+
+        with open(tmp_path, 'w') as f:
+            json.dump(self.to_dict(), f)
+
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path, default_timeout):
+        """Create instance from file written by save(), start from scratch if file is missing or broken"""
+        try:
+            with open(path) as f:
+                return cls(default_timeout, samples=json.load(f))
+
+        except (OSError, ValueError) as e:
+            logger.info('Not loading host latencies from %s - %r', path, e)
+            return cls(default_timeout)
+
+    def __len__(self):
+        return len(self._samples)
+
+
+def host_of(url):
+    return urlsplit(url).hostname
+
+
+def percentile(values, q):
+    """Nearest-rank percentile of non-empty sequence"""
+    ordered = sorted(values)
+    rank = max(int(round(q * len(ordered))) - 1, 0)
+    return ordered[min(rank, len(ordered) - 1)]
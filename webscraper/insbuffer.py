@@ -1,5 +1,13 @@
+import io
 import logging
+from datetime import date, datetime
 
+from django.db import connections, router, transaction
+from psycopg2.extras import Json
+
+
+# Default values
+COPY_BATCH_SIZE = 2000  # Records per COPY, larger than multi-row INSERT batches to spread out statement overhead
 
 logger = logging.getLogger(__name__)
 
@@ -8,9 +16,11 @@ class InsertBuffer:
 
     """Accumulate db records and insert them in batches"""
 
-    def __init__(self, batch_size):
+    def __init__(self, batch_size, writer=None, on_insert=None):
         self._batch_size = batch_size
         self._buf = []
+        self._writer = writer or BulkCreateWriter()
+        self._on_insert = on_insert     # Called with list of inserted model instances after each batch
 
     def add(self, obj):
         """Add one record to buffer"""
@@ -24,9 +34,13 @@ class InsertBuffer:
         """Remove one batch from buffer and insert to database"""
 
         chunk, self._buf = split_chunk(self._buf, self._batch_size)
+        chunk = [as_model(obj) for obj in chunk]
         cls = type(chunk[0])
-        cls.objects.bulk_create(chunk)
-        logger.debug('%r inserted %d records' % (self, len(chunk)))
+        inserted = self._writer.write(cls, chunk)
+        logger.debug('%r inserted %d records', self, len(inserted))
+
+        if self._on_insert is not None:
+            self._on_insert(inserted)
 
     def flush(self):
         """Insert all records from buffer to DB"""
@@ -44,6 +58,111 @@ class InsertBuffer:
         self.flush()
 
 
+class BulkCreateWriter:
+
+    """Inserts model instances with multi-row INSERT statements.
+
+    Writers return list of instances that were inserted, with primary keys set
+    """
+
+    batch_size = None   # Records per write, None for InsertBuffer default
+
+    def write(self, model, objs):
+        return model.objects.bulk_create(objs)
+
+
+class CopyWriter:
+
+    """Inserts model instances with COPY FROM STDIN into a temporary staging table, then merges it into the model
+    table. Requires PostgreSQL 9.5+, falls back to bulk_create on other databases.
+
+    Unlike bulk_create, rows that violate unique constraints are skipped instead of failing the batch. Only
+    instances that were inserted are returned, matched by model's first unique_together fields. Staging table is
+    created once per database session and emptied on commit
+    """
+
+    batch_size = COPY_BATCH_SIZE
+
+    def __init__(self):
+        self._fallback = BulkCreateWriter()
+
+    def write(self, model, objs):
+        connection = connections[router.db_for_write(model)]
+
+        if connection.vendor != 'postgresql':
+            return self._fallback.write(model, objs)
+
+        fields = [f for f in model._meta.concrete_fields if not f.primary_key]
+        key = [model._meta.get_field(name) for name in next(iter(model._meta.unique_together), ())]
+        qn = connection.ops.quote_name
+        table = qn(model._meta.db_table)
+        staging = qn('%s_staging' % model._meta.db_table)
+        columns = ', '.join(qn(f.column) for f in fields)
+        returning = ', '.join(qn(f.column) for f in [model._meta.pk] + key)
+        data = io.StringIO()
+
+        for obj in objs:
+            values = [f.get_db_prep_save(f.pre_save(obj, True), connection) for f in fields]
+            data.write('\t'.join(copy_value(v) for v in values))
+            data.write('\n')
+
+        data.seek(0)
+
+        with transaction.atomic(using=connection.alias), connection.cursor() as cursor:
+            cursor.execute('CREATE TEMPORARY TABLE IF NOT EXISTS %s ON COMMIT DELETE ROWS AS SELECT %s FROM %s '
+                           'WITH NO DATA' % (staging, columns, table))
+            cursor.copy_expert('COPY %s (%s) FROM STDIN' % (staging, columns), data)
+            cursor.execute('INSERT INTO %s (%s) SELECT %s FROM %s ON CONFLICT DO NOTHING RETURNING %s' %
+                           (table, columns, columns, staging, returning))
+            rows = cursor.fetchall()
+            cursor.execute('DELETE FROM %s' % staging)     # Not committed yet if called in outer transaction
+
+        if not key:
+            return objs     # Nothing to skip on without unique constraint
+
+        pks = {tuple(row[1:]): row[0] for row in rows}
+        inserted = [obj for obj in objs if tuple(getattr(obj, f.attname) for f in key) in pks]
+
+        for obj in inserted:
+            obj.pk = pks[tuple(getattr(obj, f.attname) for f in key)]
+
+        return inserted
+
+
+WRITERS = {
+    'bulk_create': BulkCreateWriter,
+    'copy': CopyWriter,
+}
+
+
+def make_writer(name):
+    """Create writer by name, see WRITERS"""
+    return WRITERS[name]()
+
+
+def as_model(obj):
+    """Convert lightweight record to model instance, pass model instances through"""
+    to_model = getattr(obj, 'to_model', None)
+    return obj if to_model is None else to_model()
+
+
+def copy_value(value):
+    """Format value for COPY text format"""
+    if value is None:
+        return '\\N'
+
+    if isinstance(value, Json):
+        value = value.dumps(value.adapted)
+    elif isinstance(value, bool):
+        value = 't' if value else 'f'
+    elif isinstance(value, (date, datetime)):
+        value = value.isoformat()
+    else:
+        value = str(value)
+
+    return value.replace('\\', '\\\\').replace('\t', '\\t').replace('\n', '\\n').replace('\r', '\\r')
+
+
 def split_chunk(lst, size):
     """Cut a chunk from a list. Returns (chunk, remaining_list)"""
     return lst[:size], lst[size:]
@@ -0,0 +1,69 @@
+"""Logging off the event loop thread: queue handler with listener thread, sampling filter"""
+import logging
+import os
+import queue
+import random
+from logging.handlers import QueueHandler, QueueListener
+
+from django.utils.module_loading import import_string
+
+
+class QueueListenerHandler(QueueHandler):
+
+    """Puts records on a queue, a listener thread passes them to `target` handler (dotted path, built from kwargs).
+
+    Message is merged with its args in the logging thread, target handler formats and writes it in listener thread.
+    Usable from dictConfig, formatter set on this handler goes to target.
+
+    Forked processes (e.g. reextract workers) inherit the handler but not the listener thread, they write to target
+    directly and leave the queue alone
+    """
+
+    def __init__(self, target, **kwargs):
+        super(QueueListenerHandler, self).__init__(queue.Queue(-1))
+        self.target = import_string(target)(**kwargs)
+        self.listener = QueueListener(self.queue, self.target)
+        self.listener.start()
+        self._pid = os.getpid()
+        self._stopped = False
+
+    def setFormatter(self, fmt):
+        self.target.setFormatter(fmt)
+
+    def emit(self, record):
+        if self.forked():
+            self.target.handle(record)
+        else:
+            super(QueueListenerHandler, self).emit(record)
+
+    def forked(self):
+        """True in child process forked after listener was started"""
+        return os.getpid() != self._pid
+
+    def close(self):
+        """Stop listener after it has handled queued records, close target"""
+        if not self._stopped:
+            self._stopped = True
+
+            if not self.forked():
+                self.listener.stop()
+
+            self.target.close()
+
+        super(QueueListenerHandler, self).close()
+
+
+class SamplingFilter(logging.Filter):
+
+    """Passes given fraction of records below `level`, all records at or above it"""
+
+    def __init__(self, rate=1.0, level=logging.WARNING, name=''):
+        super(SamplingFilter, self).__init__(name)
+        self.rate = float(rate)
+        self.level = level
+
+    def filter(self, record):
+        if record.levelno >= self.level or self.rate >= 1:
+            return super(SamplingFilter, self).filter(record)
+
+        return random.random() < self.rate and super(SamplingFilter, self).filter(record)
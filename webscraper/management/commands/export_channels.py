@@ -0,0 +1,19 @@
+from django.core.management.base import BaseCommand
+from webscraper.channelio import FORMATS, write_channels
+from webscraper.models import Channel
+
+
+class Command(BaseCommand):
+    help = 'Writes channel settings as JSON or CSV, for import_channels'
+
+    def add_arguments(self, parser):
+        parser.add_argument('channels', nargs='*', metavar='slug', help='Channels to export. Default: all channels')
+        parser.add_argument('--format', choices=FORMATS, default='json')
+
+    def handle(self, *args, **options):
+        channels = Channel.objects.order_by('id')
+
+        if options.get('channels'):
+            channels = channels.filter(slug__in=options['channels'])
+
+        write_channels(self.stdout, channels, options.get('format') or 'json')
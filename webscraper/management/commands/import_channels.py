@@ -0,0 +1,53 @@
+import csv
+import os
+import sys
+
+from django.core.management.base import BaseCommand, CommandError
+from webscraper.channelio import ChannelImportError, FORMATS, import_channels, read_channels, validate_channels
+
+
+class Command(BaseCommand):
+    help = ('Creates channels from JSON list of objects or CSV with header row, field names as in export_channels. '
+            'Nothing is created if any channel is invalid')
+    requires_migrations_checks = True
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help='File to import, "-" for standard input')
+        parser.add_argument('--format', choices=FORMATS, default=None, help='Default: from file extension, or json')
+        parser.add_argument('--skip-existing', action='store_true', default=False,
+                            help='Leave out channels with url of an existing channel or of an earlier row')
+        parser.add_argument('--dry-run', action='store_true', default=False, help='Only validate channels')
+
+    def handle(self, *args, **options):
+        path = options['path']
+        fmt = options.get('format') or file_format(path)
+
+        try:
+            if path == '-':
+                rows = read_channels(sys.stdin, fmt)
+            else:
+                with open(path, newline='') as f:
+                    rows = read_channels(f, fmt)
+
+            if options.get('dry_run'):
+                msg = '{} valid channels'.format(len(validate_channels(rows)))
+            else:
+                channels = import_channels(rows, skip_existing=options.get('skip_existing', False))
+                msg = 'Imported {} of {} channels'.format(len(channels), len(rows))
+
+        except ChannelImportError as e:
+            for num, errors in e.errors:
+                for field, messages in errors.items():
+                    self.stderr.write('Channel #{} {}: {}'.format(num, field, ' '.join(messages)))
+
+            raise CommandError('{}, nothing imported'.format(e))
+
+        except (OSError, ValueError, csv.Error) as e:
+            raise CommandError('Can not read {}: {}'.format(path, e))
+
+        self.stdout.write(self.style.SUCCESS(msg))
+
+
+def file_format(path):
+    ext = os.path.splitext(path)[1].lstrip('.').lower()
+    return ext if ext in FORMATS else 'json'
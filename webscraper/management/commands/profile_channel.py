@@ -0,0 +1,79 @@
+import asyncio
+
+from django.core.management.base import BaseCommand, CommandError
+from webscraper.aiohttpdownloader import DownloadError, detect_encoding, fetch, make_session
+from webscraper.extractors import ParseError
+from webscraper.models import Channel
+from webscraper.profiling import SELECTOR_REPEAT, profile_selectors, selector_hints
+
+
+class Command(BaseCommand):
+    help = 'Times channel page parsing and each channel selector, to find expensive selectors'
+
+    def add_arguments(self, parser):
+        parser.add_argument('slug', help='Channel slug')
+        parser.add_argument('--file', help='Read channel page from this file instead of downloading it')
+        parser.add_argument('--repeat', type=int, default=SELECTOR_REPEAT,
+                            help='Runs per measurement, best time is reported')
+
+    def handle(self, *args, **options):
+        repeat = options.get('repeat', SELECTOR_REPEAT)
+
+        if repeat < 1:
+            raise CommandError('--repeat must be at least 1')
+
+        try:
+            channel = Channel.objects.get(slug=options['slug'])
+
+        except Channel.DoesNotExist:
+            raise CommandError('No channel with slug {}'.format(options['slug']))
+
+        if options.get('file'):
+            try:
+                with open(options['file'], 'rb') as f:
+                    body = f.read()
+
+            except OSError as e:
+                raise CommandError('Can not read {}: {!r}'.format(options['file'], e))
+
+            base_url, encoding = channel.url, detect_encoding(body)
+
+        else:
+            base_url, body, encoding = self.download(channel)
+
+        try:
+            profile = profile_selectors(channel, body, base_url, encoding, repeat=repeat)
+
+        except ParseError as e:
+            raise CommandError('Can not extract channel: {!r}'.format(e))
+
+        self.stdout.write('{}: {} bytes, {} rows'.format(channel, len(body), profile.rows))
+        self.stdout.write('Parse {:.2f} ms, extract (parse and all selectors) {:.2f} ms, peak Python heap {} KiB '
+                          '(libxml2 memory not counted)'.format(profile.parse_time * 1000, profile.extract_time * 1000,
+                                                                profile.peak_memory // 1024))
+
+        for timing in profile.selectors:
+            self.stdout.write('{:>16} {:10.3f} ms {:6d} matches  {}'.format(
+                timing.name, timing.time * 1000, timing.matches, timing.selector))
+
+        for hint in selector_hints(profile):
+            self.stdout.write(self.style.WARNING(hint))
+
+    def download(self, channel):
+        """Download channel page with channel request headers. Returns (final url, body, encoding)"""
+        loop = asyncio.new_event_loop()
+        url = channel.url
+
+        async def go():
+            async with make_session(loop) as session:
+                resp, body, encoding = await fetch(url, session=session, headers=channel.request_headers or None)
+                return str(resp.url), body, encoding
+
+        try:
+            return loop.run_until_complete(go())
+
+        except DownloadError as e:
+            raise CommandError('Can not download {}: {!r}'.format(url, e))
+
+        finally:
+            loop.close()
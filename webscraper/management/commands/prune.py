@@ -0,0 +1,27 @@
+from django.core.management.base import BaseCommand
+from webscraper.models import Channel
+from webscraper.retention import prune, BATCH_SIZE
+
+
+class Command(BaseCommand):
+    help = ('Deletes entries over channel retention limits. Their urls are remembered, so entries still listed on '
+            'channel page are not added again')
+    requires_migrations_checks = True
+
+    def add_arguments(self, parser):
+        parser.add_argument('channels', nargs='*', metavar='slug', help='Channels to prune. Default: all channels')
+        parser.add_argument('--batch-size', type=int, default=BATCH_SIZE, help='Entries deleted per transaction')
+        parser.add_argument('--dry-run', action='store_true', default=False,
+                            help='Only count entries that would be deleted')
+
+    def handle(self, *args, **options):
+        channels = Channel.objects.all()
+
+        if options.get('channels'):
+            channels = channels.filter(slug__in=options['channels'])
+
+        dry_run = options.get('dry_run', False)
+        stats = prune(channels, batch_size=options.get('batch_size', BATCH_SIZE), dry_run=dry_run)
+        msg = '{} {} entries from {} channels'.format('Would delete' if dry_run else 'Deleted', stats['entries'],
+                                                      stats['channels'])
+        self.stdout.write(self.style.SUCCESS(msg))
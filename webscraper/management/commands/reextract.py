@@ -0,0 +1,26 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from webscraper.reextraction import reextract, archive_paths
+
+
+class Command(BaseCommand):
+    help = 'Re-extracts channels and entries from archived responses, without network access'
+
+    def add_arguments(self, parser):
+        parser.add_argument('paths', nargs='*', help='Archive files. Default: all archives in SCRAPER_ARCHIVE_DIR')
+        parser.add_argument('--processes', type=int, default=None,
+                            help='Number of parser processes. Default: number of CPUs')
+
+    def handle(self, *args, **options):
+        paths = options.get('paths') or []
+
+        if not paths and settings.SCRAPER_ARCHIVE_DIR:
+            paths = archive_paths(settings.SCRAPER_ARCHIVE_DIR)
+
+        if not paths:
+            raise CommandError('No archives to re-extract')
+
+        stats = reextract(paths, processes=options.get('processes'))
+        msg = 'Re-extracted {} channel pages and {} entry pages, updated {} entries'
+        self.stdout.write(self.style.SUCCESS(msg.format(stats['channel_pages'], stats['entry_pages'],
+                                                        stats['entries_updated'])))
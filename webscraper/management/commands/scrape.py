@@ -1,14 +1,68 @@
+import os
+from datetime import datetime
+
 from django.core.management.base import BaseCommand, CommandError
 from webscraper.models import Channel
-from webscraper.aioscraper import scrape
+from webscraper.aioscraper import scrape, close_client
+from webscraper.insbuffer import make_writer, WRITERS
+from webscraper.profiling import ScrapeProfiler
 
 
 class Command(BaseCommand):
     help = 'Runs scrape tasks for channels'
     requires_migrations_checks = True
 
+    def add_arguments(self, parser):
+        parser.add_argument('--deadline', type=int, default=None,
+                            help='Stop dispatching new work after this many seconds, defer the rest to the next run')
+        parser.add_argument('--writer', choices=sorted(WRITERS), default='bulk_create',
+                            help='How to insert new entries. "copy" uses PostgreSQL COPY in larger batches, for large '
+                                 'backfills. It skips entries that already exist instead of failing')
+        parser.add_argument('--profile', action='store_true',
+                            help='Time scrape stages, write report ranking slowest channels and hosts')
+        parser.add_argument('--cprofile', action='store_true', help='Also run under cProfile, implies --profile')
+        parser.add_argument('--tracemalloc', action='store_true',
+                            help='Also take tracemalloc snapshot at the end, implies --profile')
+        parser.add_argument('--profile-dir', default='.', help='Directory for profile report and data files')
+
     def handle(self, *args, **options):
-        channels = Channel.objects.enabled()
-        scrape(channels)
-        msg = 'Processed {} channels'.format(len(channels))
+        channels = Channel.objects.due()
+        writer = make_writer(options.get('writer', 'bulk_create'))
+        profiler = None
+
+        if options.get('profile') or options.get('cprofile') or options.get('tracemalloc'):
+            profiler = ScrapeProfiler(cprofile=options.get('cprofile'), trace_malloc=options.get('tracemalloc'))
+
+        try:
+            stats = scrape(channels, deadline=options.get('deadline'), writer=writer, profiler=profiler)
+
+        finally:
+            close_client()
+
+        msg = 'Processed {} channels'.format(stats['channels'] - stats['channels_deferred'])
         self.stdout.write(self.style.SUCCESS(msg))
+        msg = 'DNS: {} lookups in {:.2f}s, {} answered from cache'
+        self.stdout.write(msg.format(stats['dns_lookups'], stats['dns_time'], stats['dns_cache_hits']))
+        self.stdout.write('Received {} bytes, {} after decompression'.format(stats['wire_bytes'], stats['bytes']))
+
+        if profiler is not None:
+            self.write_profile(profiler, channels, options.get('profile_dir') or '.')
+
+        if stats['channels_shed'] or stats['entries_shed']:
+            msg = 'Deadline reached, deferred {} channels and {} entries of {} more channels to the next run'
+            self.stdout.write(self.style.WARNING(msg.format(stats['channels_shed'], stats['entries_shed'],
+                                                            stats['channels_deferred'])))
+
+    def write_profile(self, profiler, channels, profile_dir):
+        os.makedirs(profile_dir, exist_ok=True)
+        prefix = 'scrape-profile-%s' % datetime.now().strftime('%Y%m%d-%H%M%S')
+        report = profiler.report(channels)
+        path = os.path.join(profile_dir, prefix + '.txt')
+
+        with open(path, 'w') as f:
+            f.write(report)
+
+        self.stdout.write(report)
+
+        for path in [path] + profiler.dump(profile_dir, prefix):
+            self.stdout.write('Wrote {}'.format(path))
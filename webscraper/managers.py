@@ -1,4 +1,8 @@
-from django.db import models
+from django.db import connections, models, transaction
+from django.db.models import F, Q, Avg, Case, Count, DateTimeField, ExpressionWrapper, FloatField, Value, When
+from django.utils import timezone
+
+from .fingerprint import BANDS, BAND_BITS, BAND_MASK, bands, hamming
 
 
 class ChannelManager(models.Manager):
@@ -8,22 +12,269 @@ class ChannelManager(models.Manager):
     def enabled(self):
         return super(ChannelManager, self).get_queryset().filter(enabled=True)
 
+    def due(self, now=None):
+        """Enabled channels in scrape priority order, least recently scraped first.
+
+        Channels with automatic interval are only included when their learned interval has passed
+        """
+        now = now or timezone.now()
+        next_scrape = ExpressionWrapper(F('scraped') + F('auto_interval'), output_field=DateTimeField())
+        auto_due = Q(scraped__isnull=True) | Q(auto_interval__isnull=True) | Q(next_scrape__lte=now)
+
+        return (self.enabled()
+                .annotate(next_scrape=next_scrape)
+                .filter(~Q(interval=self.model.I_AUTO) | auto_due)
+                .order_by(F('scraped').asc(nulls_first=True), 'id'))
+
+    def touch(self, channels, now=None):
+        """Mark entries of channels as changed, after they were scraped, pruned or re-extracted"""
+        now = now or timezone.now()
+
+        for channel in channels:
+            channel.updated = now
+
+        return self.filter(id__in=[channel.id for channel in channels]).update(updated=now)
+
 
 class EntryManager(models.Manager):
 
     """Table level operations for Entry model"""
 
-    def track_entries(self, channel, new_entries):
-        """Deletes from DB entries that are not in in new_entries, returns entries that are not in DB"""
+    def track_entries(self, channel, new_entries, stats=None, delete_missing=True):
+        """Deletes from DB entries that are not in in new_entries, returns entries that are not in DB and were not
+        pruned (see PrunedEntry). Number of deleted entries is added to `stats` counter as 'entries_deleted' if given.
+        Set `delete_missing` to False when new_entries are incomplete, e.g. some channel pages failed to download"""
         new_url2entry = {entry.url: entry for entry in new_entries}
         existing_url2id = {r['url']: r['id'] for r in self.get_id_url_for_channel(channel)}
-        new_urls = new_url2entry.keys() - existing_url2id.keys()
-        old_urls = existing_url2id.keys() - new_url2entry.keys()
-        self.delete_from_channel_by_ids(channel, [existing_url2id[url] for url in old_urls])
+        pruned_urls = set(channel.pruned_entries.values_list('url', flat=True))
+        new_urls = new_url2entry.keys() - existing_url2id.keys() - pruned_urls
+        old_urls = existing_url2id.keys() - new_url2entry.keys() if delete_missing else ()
+        _, deleted = self.delete_from_channel_by_ids(channel, [existing_url2id[url] for url in old_urls])
+
+        if delete_missing and pruned_urls - new_url2entry.keys():     # Off the listing, would not come back anyway
+            channel.pruned_entries.filter(url__in=pruned_urls - new_url2entry.keys()).delete()
+
+        if stats is not None:
+            stats['entries_deleted'] += deleted.get(self.model._meta.label, 0)
+
         return [new_url2entry[url] for url in new_urls]
 
+    def with_media(self, kind):
+        """Entries having media items of given kind"""
+        return super(EntryManager, self).get_queryset().filter(media__kind=kind).distinct()
+
     def get_id_url_for_channel(self, channel):
         return super(EntryManager, self).get_queryset().values('id', 'url').filter(channel=channel)
 
     def delete_from_channel_by_ids(self, channel, ids):
-        return super(EntryManager, self).get_queryset().filter(channel=channel, id__in=ids).delete()
+        with transaction.atomic(using=self.db):
+            self.promote_duplicates(ids)
+            return super(EntryManager, self).get_queryset().filter(channel=channel, id__in=ids).delete()
+
+    def delete_by_ids(self, ids):
+        """Delete entries and their media items with plain DELETE statements, without loading rows into Python.
+        Returns number of deleted entries"""
+        connection = connections[self.db]
+        qn = connection.ops.quote_name
+        media_table = self.model._meta.get_field('media').related_model._meta.db_table
+        self.promote_duplicates(ids)
+
+        with connection.cursor() as cursor:
+            cursor.execute('DELETE FROM %s WHERE entry_id = ANY(%%s)' % qn(media_table), [list(ids)])
+            cursor.execute('DELETE FROM %s WHERE id = ANY(%%s)' % qn(self.model._meta.db_table), [list(ids)])
+            return cursor.rowcount
+
+    def link_duplicates(self, entries, distance):
+        """Link stored entries to earlier entries of the same channel with fingerprints at most `distance` bits apart,
+        clear their items. Only distances below fingerprint.BANDS are reliably found. Returns linked entries"""
+        entry_ids = self.ids_by_url([e for e in entries if e.fingerprint is not None])
+        entries = sorted((e for e in entries if (e.channel_id, e.url) in entry_ids),
+                         key=lambda e: entry_ids[(e.channel_id, e.url)])
+        candidates = sorted(self.fingerprint_matches([e.fingerprint for e in entries],
+                                                     {e.channel_id for e in entries})) if entries else []
+        linked, linked_ids = [], set()
+
+        for entry in entries:
+            entry_id = entry_ids[(entry.channel_id, entry.url)]
+            originals = (pk for pk, channel_id, fingerprint in candidates
+                         if pk < entry_id and pk not in linked_ids and channel_id == entry.channel_id and
+                         hamming(fingerprint, entry.fingerprint) <= distance)
+            entry.duplicate_of_id = next(originals, None)
+
+            if entry.duplicate_of_id is not None:
+                entry.items = None
+                linked.append(entry)
+                linked_ids.add(entry_id)
+
+        rows = [{'channel_id': e.channel_id, 'url': e.url, 'duplicate_of_id': e.duplicate_of_id, 'items': None}
+                for e in linked]
+        self.bulk_update_by_url(rows, ['duplicate_of', 'items'])
+        return linked
+
+    def promote_duplicates(self, ids):
+        """Before entries with given ids are deleted: the earliest remaining duplicate of each of them takes over its
+        items and media items and stops being a duplicate, other duplicates are linked to it.
+        Returns number of updated entries"""
+        if not ids:
+            return 0
+
+        connection = connections[self.db]
+        qn = connection.ops.quote_name
+        table = qn(self.model._meta.db_table)
+        media_table = qn(self.model._meta.get_field('media').related_model._meta.db_table)
+        ids = list(ids)
+
+        sql = (
+            'WITH heirs AS ('
+            '    SELECT DISTINCT ON (duplicate_of_id) duplicate_of_id AS original_id, id AS heir_id FROM {table}'
+            '    WHERE duplicate_of_id = ANY(%s) AND NOT id = ANY(%s) ORDER BY duplicate_of_id, id'
+            '), media AS ('
+            '    UPDATE {media} AS m SET entry_id = h.heir_id FROM heirs AS h WHERE m.entry_id = h.original_id'
+            ') '
+            'UPDATE {table} AS t'
+            '    SET duplicate_of_id = CASE WHEN t.id = h.heir_id THEN NULL ELSE h.heir_id END,'
+            '        items = CASE WHEN t.id = h.heir_id THEN o.items ELSE t.items END'
+            '    FROM heirs AS h JOIN {table} AS o ON o.id = h.original_id'
+            '    WHERE t.duplicate_of_id = h.original_id AND NOT t.id = ANY(%s)'
+        ).format(table=table, media=media_table)
+
+        with connection.cursor() as cursor:
+            cursor.execute(sql, [ids, ids, ids])
+            return cursor.rowcount
+
+    def fingerprint_matches(self, fingerprints, channel_ids):
+        """(id, channel_id, fingerprint) of entries of given channels that are not duplicates and share a fingerprint
+        band with any of given ones. Uses band expression indexes, see migration 0014"""
+        connection = connections[self.db]
+        qn = connection.ops.quote_name
+        conditions = ' OR '.join('((fingerprint >> %d) & %d) = ANY(%%s)' % (band * BAND_BITS, BAND_MASK)
+                                 for band in range(BANDS))
+        params = [list({bands(fingerprint)[band] for fingerprint in fingerprints}) for band in range(BANDS)]
+        sql = ('SELECT id, channel_id, fingerprint FROM %s '
+               'WHERE duplicate_of_id IS NULL AND channel_id = ANY(%%s) AND (%s)')
+
+        with connection.cursor() as cursor:
+            cursor.execute(sql % (qn(self.model._meta.db_table), conditions), [list(channel_ids)] + params)
+            return cursor.fetchall()
+
+    def ids_by_url(self, entries):
+        """{(channel_id, url): id} for stored entries, looking up ids of entries inserted without returning them"""
+        entry_ids = {(e.channel_id, e.url): e.pk for e in entries if e.pk is not None}
+        missing = [e for e in entries if e.pk is None]
+
+        if missing:
+            rows = (super(EntryManager, self).get_queryset()
+                    .filter(channel_id__in={e.channel_id for e in missing}, url__in={e.url for e in missing})
+                    .values_list('channel_id', 'url', 'id'))
+            entry_ids.update({(channel_id, url): pk for channel_id, url, pk in rows})
+
+        return entry_ids
+
+    def bulk_update_by_url(self, rows, fields, batch_size=500):
+        """Update `fields` of entries identified by channel_id and url from dicts, one query per batch.
+        Returns number of updated entries"""
+        connection = connections[self.db]
+        qn = connection.ops.quote_name
+        opts = self.model._meta
+        key_fields = [opts.get_field('channel'), opts.get_field('url')]
+        value_fields = [opts.get_field(name) for name in fields]
+        all_fields = key_fields + value_fields
+        placeholder = '(%s)' % ', '.join(['%s'] * len(all_fields))
+
+        assignments = ', '.join('%s = v.%s::%s' % (qn(f.column), qn(f.column), f.db_type(connection))
+                                for f in value_fields)
+        conditions = ' AND '.join('t.%s = v.%s::%s' % (qn(f.column), qn(f.column), f.db_type(connection))
+                                  for f in key_fields)
+        sql_template = 'UPDATE %s AS t SET %s FROM (VALUES %%s) AS v(%s) WHERE %s' % (
+            qn(opts.db_table), assignments, ', '.join(qn(f.column) for f in all_fields), conditions)
+
+        updated = 0
+
+        with connection.cursor() as cursor:
+            for start in range(0, len(rows), batch_size):
+                batch = rows[start:start + batch_size]
+                params = [f.get_db_prep_save(row[f.attname], connection) for row in batch for f in all_fields]
+                cursor.execute(sql_template % ', '.join([placeholder] * len(batch)), params)
+                updated += cursor.rowcount
+
+        return updated
+
+
+class MediaItemManager(models.Manager):
+
+    """Table level operations for MediaItem model"""
+
+    def create_for_entries(self, entries):
+        """Create media items from items field of stored entries, in one query"""
+        entry_ids = self._entry_ids(entries)
+        media = [self.model(entry_id=entry_ids[(entry.channel_id, entry.url)], kind=kind, url=url, position=position)
+                 for entry in entries if (entry.channel_id, entry.url) in entry_ids
+                 for kind, urls in (entry.items or {}).items() if kind in self.model.KINDS
+                 for position, url in enumerate(urls)]
+        return self.bulk_create(media)
+
+    def rebuild_for_entries(self, entries):
+        """Replace media items of stored entries with ones from their items field"""
+        entry_ids = self._entry_ids(entries)
+        super(MediaItemManager, self).get_queryset().filter(entry_id__in=entry_ids.values()).delete()
+        return self.create_for_entries(entries)
+
+    def shared_urls(self, min_entries=2):
+        """Urls of media items found in at least `min_entries` entries, with number of entries"""
+        return (super(MediaItemManager, self).get_queryset()
+                .values('url')
+                .annotate(entries=Count('entry', distinct=True))
+                .filter(entries__gte=min_entries))
+
+    def _entry_ids(self, entries):
+        return self.model._meta.get_field('entry').related_model.objects.ids_by_url(entries)
+
+
+class PrunedEntryManager(models.Manager):
+
+    """Table level operations for PrunedEntry model"""
+
+    def add_for_entries(self, ids):
+        """Record urls of entries with given ids, before they are pruned. Returns number of new records"""
+        connection = connections[self.db]
+        qn = connection.ops.quote_name
+        entry_model = self.model._meta.get_field('channel').related_model._meta.get_field('entry').related_model
+
+        with connection.cursor() as cursor:
+            cursor.execute('INSERT INTO %s (channel_id, url, pruned) SELECT channel_id, url, now() FROM %s '
+                           'WHERE id = ANY(%%s) ON CONFLICT DO NOTHING' % (
+                               qn(self.model._meta.db_table), qn(entry_model._meta.db_table)), [list(ids)])
+            return cursor.rowcount
+
+
+class ChannelRunStatManager(models.Manager):
+
+    """Table level operations for ChannelRunStat model"""
+
+    def trends(self, runs=10):
+        """Per-channel average cost (fetch + parse seconds) over last `runs` runs and the `runs` before them,
+        highest growth first. Returns list of dicts"""
+        run_model = self.model._meta.get_field('run').related_model
+        run_ids = list(run_model.objects.order_by('-started').values_list('id', flat=True)[:runs * 2])
+        cost = F('fetch_time') + F('parse_time')
+
+        rows = (self.get_queryset()
+                .filter(run_id__in=run_ids)
+                .values('channel_id', 'channel__title')
+                .annotate(recent=runs_avg(run_ids[:runs], cost),
+                          previous=runs_avg(run_ids[runs:], cost),
+                          recent_bytes=runs_avg(run_ids[:runs], F('bytes')),
+                          runs=Count('run_id')))
+
+        for row in rows:
+            row['growth'] = row['recent'] / row['previous'] if row['recent'] and row['previous'] else None
+
+        return sorted(rows, key=lambda r: (r['growth'] is None, -(r['growth'] or 0), -(r['recent'] or 0)))
+
+
+def runs_avg(run_ids, expression):
+    """Average of expression over rows of given runs, NULL if there are none"""
+    if not run_ids:
+        return Value(None, output_field=FloatField())
+
+    return Avg(Case(When(run_id__in=run_ids, then=expression), output_field=FloatField()))
@@ -0,0 +1,20 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.11 on 2026-10-19 09:12
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('webscraper', '0004_auto_20170414_0054'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='channel',
+            name='scraped',
+            field=models.DateTimeField(blank=True, null=True, verbose_name='last scraped'),
+        ),
+    ]
@@ -0,0 +1,35 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.11 on 2026-10-19 11:40
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('webscraper', '0005_channel_scraped'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='channel',
+            name='auto_interval',
+            field=models.DurationField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='channel',
+            name='changes',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='channel',
+            name='polls',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.AlterField(
+            model_name='channel',
+            name='interval',
+            field=models.CharField(choices=[('MAN', 'Manual'), ('10M', 'Every 10 minutes'), ('1H', 'Every hour'), ('1D', 'Every day'), ('AUT', 'Automatic')], default='1D', max_length=3),
+        ),
+    ]
@@ -0,0 +1,34 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.11 on 2026-10-19 14:05
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('webscraper', '0006_channel_auto_interval'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='MediaItem',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('kind', models.CharField(choices=[('images', 'Images'), ('videos', 'Videos'), ('streaming', 'Streaming')], max_length=16)),
+                ('url', models.URLField(max_length=2048)),
+                ('position', models.IntegerField()),
+                ('entry', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='media', to='webscraper.Entry')),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='mediaitem',
+            index=models.Index(fields=['kind', 'entry'], name='webscraper_media_kind_entry'),
+        ),
+        migrations.AddIndex(
+            model_name='mediaitem',
+            index=models.Index(fields=['url'], name='webscraper_media_url'),
+        ),
+    ]
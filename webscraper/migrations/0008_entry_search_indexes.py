@@ -0,0 +1,27 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.contrib.postgres.operations import TrigramExtension
+from django.db import migrations
+
+
+# Admin search runs `UPPER("col"::text) LIKE UPPER('%term%')` for each of EntryAdmin.search_fields. Trigram GIN
+# indexes over the same expression let PostgreSQL answer these with bitmap index scans instead of a sequential scan
+SEARCH_COLUMNS = ['title', 'url', 'final_url']
+
+CREATE_INDEX = 'CREATE INDEX CONCURRENTLY IF NOT EXISTS webscraper_entry_%s_trgm ' \
+               'ON webscraper_entry USING gin (UPPER(%s::text) gin_trgm_ops)'
+DROP_INDEX = 'DROP INDEX CONCURRENTLY IF EXISTS webscraper_entry_%s_trgm'
+
+
+class Migration(migrations.Migration):
+
+    atomic = False  # CREATE INDEX CONCURRENTLY can not run in a transaction, and does not block inserts
+
+    dependencies = [
+        ('webscraper', '0007_mediaitem'),
+    ]
+
+    operations = [TrigramExtension()] + [
+        migrations.RunSQL(CREATE_INDEX % (column, column), DROP_INDEX % column) for column in SEARCH_COLUMNS
+    ]
@@ -0,0 +1,25 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.11 on 2026-10-19 19:55
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('webscraper', '0009_entry_added_id_index'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='channel',
+            name='max_age',
+            field=models.DurationField(blank=True, null=True, verbose_name='delete entries older than'),
+        ),
+        migrations.AddField(
+            model_name='channel',
+            name='max_entries',
+            field=models.IntegerField(blank=True, null=True, verbose_name='keep at most N newest entries'),
+        ),
+    ]
@@ -0,0 +1,24 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.11 on 2026-10-19 20:40
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('webscraper', '0010_channel_retention'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='channel',
+            name='group',
+            field=models.SlugField(blank=True, help_text='Channels of a group are also served as one feed', max_length=64),
+        ),
+        migrations.AddIndex(
+            model_name='entry',
+            index=models.Index(fields=['channel', '-added', '-id'], name='webscraper_entry_channel_added'),
+        ),
+    ]
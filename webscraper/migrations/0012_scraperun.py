@@ -0,0 +1,49 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.11 on 2026-10-19 21:40
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('webscraper', '0011_channel_group'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ScrapeRun',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('started', models.DateTimeField(db_index=True)),
+                ('finished', models.DateTimeField()),
+                ('channels', models.IntegerField(default=0)),
+                ('entries', models.IntegerField(default=0, verbose_name='entries fetched')),
+                ('bytes', models.BigIntegerField(default=0, verbose_name='bytes fetched')),
+                ('channels_shed', models.IntegerField(default=0)),
+                ('entries_shed', models.IntegerField(default=0)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='ChannelRunStat',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('entries', models.IntegerField(default=0, verbose_name='entries fetched')),
+                ('bytes', models.BigIntegerField(default=0, verbose_name='bytes fetched')),
+                ('fetch_time', models.FloatField(default=0)),
+                ('parse_time', models.FloatField(default=0)),
+                ('entries_new', models.IntegerField(default=0)),
+                ('entries_deleted', models.IntegerField(default=0)),
+                ('status_before', models.IntegerField(choices=[(0, 'New'), (1, 'Ok'), (2, 'Warning'), (3, 'Error')])),
+                ('status_after', models.IntegerField(choices=[(0, 'New'), (1, 'Ok'), (2, 'Warning'), (3, 'Error')])),
+                ('channel', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='run_stats', to='webscraper.Channel')),
+                ('run', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='channel_stats', to='webscraper.ScrapeRun')),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='channelrunstat',
+            index=models.Index(fields=['channel', 'run'], name='webscraper_runstat_channel'),
+        ),
+    ]
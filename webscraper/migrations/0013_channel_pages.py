@@ -0,0 +1,30 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.11 on 2026-10-19 23:10
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('webscraper', '0012_scraperun'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='channel',
+            name='max_pages',
+            field=models.IntegerField(default=1, help_text='Pages fetched per scrape, including the first one'),
+        ),
+        migrations.AddField(
+            model_name='channel',
+            name='next_page_selector',
+            field=models.CharField(blank=True, help_text='Selects url of the next page', max_length=512),
+        ),
+        migrations.AddField(
+            model_name='channel',
+            name='page_url_template',
+            field=models.CharField(blank=True, help_text='Url of page N with {page} placeholder, pages 2 and on are fetched at once', max_length=2048),
+        ),
+    ]
@@ -0,0 +1,38 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+# Near-duplicate lookup (EntryManager.fingerprint_matches) selects entries sharing any 16-bit band of the fingerprint,
+# each band has an index over the same expression
+BANDS = 4
+
+CREATE_INDEX = 'CREATE INDEX CONCURRENTLY IF NOT EXISTS webscraper_entry_fingerprint_%d ' \
+               'ON webscraper_entry (((fingerprint >> %d) & 65535))'
+DROP_INDEX = 'DROP INDEX CONCURRENTLY IF EXISTS webscraper_entry_fingerprint_%d'
+
+
+class Migration(migrations.Migration):
+
+    atomic = False  # CREATE INDEX CONCURRENTLY can not run in a transaction, and does not block inserts
+
+    dependencies = [
+        ('webscraper', '0013_channel_pages'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='entry',
+            name='duplicate_of',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='duplicates', to='webscraper.Entry'),
+        ),
+        migrations.AddField(
+            model_name='entry',
+            name='fingerprint',
+            field=models.BigIntegerField(blank=True, null=True),
+        ),
+    ] + [
+        migrations.RunSQL(CREATE_INDEX % (band, band * 16), DROP_INDEX % band) for band in range(BANDS)
+    ]
@@ -0,0 +1,20 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.11 on 2026-10-19 23:52
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('webscraper', '0014_entry_fingerprint'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='scraperun',
+            name='dns_time',
+            field=models.FloatField(default=0, verbose_name='DNS time'),
+        ),
+    ]
@@ -0,0 +1,26 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.11 on 2026-10-20 00:31
+from __future__ import unicode_literals
+
+import django.contrib.postgres.fields.jsonb
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('webscraper', '0015_scraperun_dns_time'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='channel',
+            name='request_headers',
+            field=django.contrib.postgres.fields.jsonb.JSONField(blank=True, default=dict, help_text='Headers sent with requests for channel and its entries, e.g. {"Referer": "http://example.com/"}'),
+        ),
+        migrations.AddField(
+            model_name='scraperun',
+            name='wire_bytes',
+            field=models.BigIntegerField(default=0, verbose_name='bytes received'),
+        ),
+    ]
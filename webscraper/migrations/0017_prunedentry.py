@@ -0,0 +1,29 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.11 on 2026-10-20 10:12
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('webscraper', '0016_channel_request_headers'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PrunedEntry',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('url', models.URLField(max_length=2048)),
+                ('pruned', models.DateTimeField(auto_now_add=True)),
+                ('channel', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='pruned_entries', to='webscraper.Channel')),
+            ],
+        ),
+        migrations.AlterUniqueTogether(
+            name='prunedentry',
+            unique_together=set([('channel', 'url')]),
+        ),
+    ]
@@ -0,0 +1,20 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('webscraper', '0017_prunedentry'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='channel',
+            name='updated',
+            field=models.DateTimeField(blank=True, null=True, verbose_name='entries updated'),
+        ),
+        migrations.RunSQL('UPDATE webscraper_channel SET updated = scraped', migrations.RunSQL.noop),
+    ]
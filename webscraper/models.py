@@ -1,9 +1,15 @@
+import logging
+from datetime import timedelta
+
 from django.contrib.postgres.fields import JSONField
 from django.db.models import (Model, CharField, DateTimeField, ForeignKey, URLField, CASCADE, BooleanField,
-                              IntegerField)
+                              IntegerField, DurationField, Index, SlugField, BigIntegerField, FloatField, SET_NULL)
 from django.utils.crypto import get_random_string
 
-from .managers import ChannelManager, EntryManager
+from .managers import ChannelManager, EntryManager, MediaItemManager, ChannelRunStatManager, PrunedEntryManager
+
+
+logger = logging.getLogger(__name__)
 
 
 class Channel(Model):
@@ -14,14 +20,23 @@ class Channel(Model):
     I_10MIN = '10M'
     I_1HOUR = '1H'
     I_1DAY = '1D'
+    I_AUTO = 'AUT'
 
     INTERVAL_CHOICES = (
         (I_MANUAL, 'Manual'),
         (I_10MIN, 'Every 10 minutes'),
         (I_1HOUR, 'Every hour'),
         (I_1DAY, 'Every day'),
+        (I_AUTO, 'Automatic'),
     )
 
+    # Bounds and step factors for automatic polling interval
+    AUTO_INTERVAL_MIN = timedelta(minutes=10)
+    AUTO_INTERVAL_MAX = timedelta(days=1)
+    AUTO_INTERVAL_INITIAL = timedelta(hours=1)
+    AUTO_SPEEDUP = 0.5
+    AUTO_BACKOFF = 1.5
+
     ST_NEW = 0
     ST_OK = 1
     ST_WARNING = 2
@@ -40,21 +55,51 @@ class Channel(Model):
     url = URLField(max_length=2048)
     slug = CharField(max_length=32, null=False, unique=True)
     status = IntegerField(null=False, default=ST_NEW, choices=STATUS_CHOICES)
+    scraped = DateTimeField('last scraped', null=True, blank=True)
+    updated = DateTimeField('entries updated', null=True, blank=True)  # Feed Last-Modified, see ChannelManager.touch
+    group = SlugField(max_length=64, blank=True, help_text='Channels of a group are also served as one feed')
+
+    # Automatic interval state: learned interval, number of polls and polls that returned new entries
+    auto_interval = DurationField(null=True, blank=True)
+    polls = IntegerField(default=0)
+    changes = IntegerField(default=0)
+
+    # Retention limits, see `manage.py prune`. ENTRY_MAX_ENTRIES and ENTRY_MAX_AGE_DAYS settings apply if unset
+    max_entries = IntegerField('keep at most N newest entries', null=True, blank=True)
+    max_age = DurationField('delete entries older than', null=True, blank=True)
 
     row_selector = CharField(max_length=512)
     url_selector = CharField(max_length=512)
     title_selector = CharField(max_length=512)
     extra_selector = CharField(max_length=512, blank=True)
 
+    # Listings spread over several pages: next page link, or predictable page urls fetched concurrently
+    next_page_selector = CharField(max_length=512, blank=True, help_text='Selects url of the next page')
+    page_url_template = CharField(max_length=2048, blank=True,
+                                  help_text='Url of page N with {page} placeholder, pages 2 and on are fetched '
+                                            'at once')
+    max_pages = IntegerField(default=1, help_text='Pages fetched per scrape, including the first one')
+
+    request_headers = JSONField(default=dict, blank=True,
+                                help_text='Headers sent with requests for channel and its entries, e.g. '
+                                          '{"Referer": "http://example.com/"}')
+
     objects = ChannelManager()
 
     @classmethod
     def make_slug(cls):
-        while True:
-            slug = get_random_string(length=32)
-            if not cls.objects.filter(slug=slug).exists():
-                break
-        return slug
+        return cls.make_slugs(1)[0]
+
+    @classmethod
+    def make_slugs(cls, count):
+        """`count` unique new slugs, checked against existing ones with one query"""
+        slugs = set()
+
+        while len(slugs) < count:
+            candidates = {get_random_string(length=32) for _ in range(count - len(slugs))} - slugs
+            slugs |= candidates - set(cls.objects.filter(slug__in=candidates).values_list('slug', flat=True))
+
+        return list(slugs)
 
     def save(self, *args, **kwargs):
         if not self.id:     # new channel
@@ -62,6 +107,31 @@ class Channel(Model):
 
         super(Channel, self).save(*args, **kwargs)
 
+    def page_urls(self):
+        """Urls of pages after the first one, from page url template. Empty if template can't be formatted"""
+        if not self.page_url_template:
+            return []
+
+        try:
+            return [self.page_url_template.format(page=page) for page in range(2, self.max_pages + 1)]
+
+        except (KeyError, IndexError, ValueError, AttributeError) as e:
+            logger.warning('Bad page url template of channel %s - %r', self.id, e)
+            return []
+
+    def adapt_interval(self, changed):
+        """Poll more often if channel had new entries since last poll, back off otherwise"""
+        self.polls += 1
+        interval = self.auto_interval or self.AUTO_INTERVAL_INITIAL
+
+        if changed:
+            self.changes += 1
+            interval *= self.AUTO_SPEEDUP
+        else:
+            interval *= self.AUTO_BACKOFF
+
+        self.auto_interval = max(self.AUTO_INTERVAL_MIN, min(self.AUTO_INTERVAL_MAX, interval))
+
     def __str__(self):
         return self.title
 
@@ -71,6 +141,10 @@ class Entry(Model):
 
     class Meta:
         unique_together = ('channel', 'url')
+        indexes = [
+            Index(fields=['-added', '-id'], name='webscraper_entry_added_id'),     # Admin keyset pagination
+            Index(fields=['channel', '-added', '-id'], name='webscraper_entry_channel_added'),     # Feeds
+        ]
 
     ST_NEW = 0
     ST_OK = 1
@@ -96,6 +170,12 @@ class Entry(Model):
     # {'media_type_1': ['url 1', 'url 2', ], 'media_type_2': ['url1', ...], ...}
     items = JSONField(default=None, null=True, blank=True)
 
+    # Simhash of media file names and title, see webscraper.fingerprint. Near-duplicates link to the earliest entry
+    # of the same channel, their items are not kept and feeds leave them out. When the original is deleted, the
+    # earliest duplicate takes over its items, see EntryManager.promote_duplicates
+    fingerprint = BigIntegerField(null=True, blank=True)
+    duplicate_of = ForeignKey('self', on_delete=SET_NULL, null=True, blank=True, related_name='duplicates')
+
     objects = EntryManager()
 
     @property
@@ -107,5 +187,113 @@ class Entry(Model):
         if self.url != value:
             self.final_url = value
 
+    def itemsets(self):
+        """Media urls by kind, from prefetched media items if entry has any or from items field otherwise.
+        Entries stored before MEDIA_ITEMS was turned on have no media items"""
+        media = getattr(self, '_prefetched_objects_cache', {}).get('media')
+
+        if not media:
+            return self.items or {}
+
+        itemsets = {}
+
+        for item in sorted(media, key=lambda i: (MediaItem.KINDS.index(i.kind), i.position)):
+            itemsets.setdefault(item.kind, []).append(item.url)
+
+        return itemsets
+
     def __str__(self):
         return self.title
+
+
+class MediaItem(Model):
+    """Media url found on entry page"""
+
+    class Meta:
+        indexes = [
+            Index(fields=['kind', 'entry'], name='webscraper_media_kind_entry'),
+            Index(fields=['url'], name='webscraper_media_url'),
+        ]
+
+    K_IMAGES = 'images'
+    K_VIDEOS = 'videos'
+    K_STREAMING = 'streaming'
+
+    KINDS = [K_IMAGES, K_VIDEOS, K_STREAMING]
+    KIND_CHOICES = [(kind, kind.title()) for kind in KINDS]
+
+    entry = ForeignKey(Entry, on_delete=CASCADE, related_name='media')
+    kind = CharField(max_length=16, choices=KIND_CHOICES)
+    url = URLField(max_length=2048)
+    position = IntegerField()
+
+    objects = MediaItemManager()
+
+    def __str__(self):
+        return self.url
+
+
+class PrunedEntry(Model):
+    """Url of entry deleted by `manage.py prune`, so it is not added again while channel page still lists it"""
+
+    class Meta:
+        unique_together = ('channel', 'url')
+
+    channel = ForeignKey(Channel, on_delete=CASCADE, related_name='pruned_entries')
+    url = URLField(max_length=2048)
+    pruned = DateTimeField(auto_now_add=True)
+
+    objects = PrunedEntryManager()
+
+    def __str__(self):
+        return self.url
+
+
+class ScrapeRun(Model):
+    """Scrape run totals, see ChannelRunStat for per-channel figures"""
+
+    started = DateTimeField(db_index=True)
+    finished = DateTimeField()
+    channels = IntegerField(default=0)
+    entries = IntegerField('entries fetched', default=0)
+    bytes = BigIntegerField('bytes fetched', default=0)
+    wire_bytes = BigIntegerField('bytes received', default=0)   # Before decompression
+    channels_shed = IntegerField(default=0)     # Deferred to next run by deadline
+    entries_shed = IntegerField(default=0)
+    dns_time = FloatField('DNS time', default=0)    # Seconds spent in DNS queries, cache hits take none
+
+    @property
+    def duration(self):
+        return self.finished - self.started
+
+    def __str__(self):
+        return 'Scrape run %s' % self.started
+
+
+class ChannelRunStat(Model):
+    """Figures of one channel in a scrape run. Times are wall seconds, summed over the channel and its entries"""
+
+    class Meta:
+        indexes = [
+            Index(fields=['channel', 'run'], name='webscraper_runstat_channel'),
+        ]
+
+    run = ForeignKey(ScrapeRun, on_delete=CASCADE, related_name='channel_stats')
+    channel = ForeignKey(Channel, on_delete=CASCADE, related_name='run_stats')
+    entries = IntegerField('entries fetched', default=0)
+    bytes = BigIntegerField('bytes fetched', default=0)
+    fetch_time = FloatField(default=0)
+    parse_time = FloatField(default=0)
+    entries_new = IntegerField(default=0)
+    entries_deleted = IntegerField(default=0)
+    status_before = IntegerField(choices=Channel.STATUS_CHOICES)
+    status_after = IntegerField(choices=Channel.STATUS_CHOICES)
+
+    objects = ChannelRunStatManager()
+
+    @property
+    def cost(self):
+        return self.fetch_time + self.parse_time
+
+    def __str__(self):
+        return '%s in %s' % (self.channel, self.run)
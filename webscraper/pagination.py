@@ -0,0 +1,65 @@
+"""Pagination helpers for large tables: planner row estimates instead of COUNT(*), keyset cursors"""
+from django.core.paginator import Paginator
+from django.db import connections
+from django.db.models import Q
+from django.utils.dateparse import parse_datetime
+from django.utils.functional import cached_property
+
+
+# Default values
+ESTIMATE_THRESHOLD = 10000  # Count rows exactly if planner estimate is below this
+
+
+class EstimatedCountPaginator(Paginator):
+
+    """Paginator taking object count from query planner estimate when it is above threshold. Exact count otherwise"""
+
+    threshold = ESTIMATE_THRESHOLD
+
+    def __init__(self, *args, **kwargs):
+        super(EstimatedCountPaginator, self).__init__(*args, **kwargs)
+        self.estimated = False
+
+    @cached_property
+    def count(self):
+        estimate = estimate_count(self.object_list)
+
+        if estimate is None or estimate < self.threshold:
+            return self.object_list.count()
+
+        self.estimated = True
+        return estimate
+
+
+def estimate_count(queryset):
+    """Row count estimate for queryset: pg_class.reltuples if unfiltered, EXPLAIN otherwise. None if not available"""
+    connection = connections[queryset.db]
+
+    if connection.vendor != 'postgresql':
+        return None
+
+    with connection.cursor() as cursor:
+        if not queryset.query.where:
+            cursor.execute('SELECT reltuples FROM pg_class WHERE oid = %s::regclass', [queryset.model._meta.db_table])
+            row = cursor.fetchone()
+            return int(row[0]) if row and row[0] >= 0 else None     # -1 if table was never analyzed
+
+        sql, params = queryset.query.sql_with_params()
+        cursor.execute('EXPLAIN (FORMAT JSON) ' + sql, params)
+        return cursor.fetchone()[0][0]['Plan']['Plan Rows']
+
+
+def keyset_cursor(obj):
+    """Cursor pointing after obj in (added, id) descending order"""
+    return '%s,%d' % (obj.added.isoformat(), obj.pk)
+
+
+def keyset_filter(cursor):
+    """Q object selecting rows after cursor in (added, id) descending order. Raises ValueError on invalid cursor"""
+    added, _, pk = cursor.rpartition(',')
+    added = parse_datetime(added)
+
+    if added is None:
+        raise ValueError('Invalid cursor %r' % cursor)
+
+    return Q(added__lt=added) | Q(added=added, pk__lt=int(pk))
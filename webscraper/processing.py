@@ -1,84 +1,133 @@
 import logging
 
-from django.core.exceptions import ValidationError
+from django.utils import timezone
 
 from .aiohttpdownloader import DownloadError
-from .extractors import ChannelExtractor, EntryExtractor, ParseError
+from .extractors import ChannelExtractor, EntryExtractor, FieldExtractor, ParseError, ensure_element
+from .fingerprint import entry_fingerprint
 from .postprocessing import postprocess_items
+from .profiling import null_profiler
 from .models import Channel, Entry
+from .records import RowValidator
 
 
 logger = logging.getLogger(__name__)
+entry_logger = logging.getLogger(__name__ + '.entries')    # Per-entry messages, sampled, see LOG_ENTRY_SAMPLE_RATE
+row_validator = RowValidator()
 
 
-def process_channel(channel, fut):
-    """Set channel status, return sequence of new entries"""
+def process_channel(channel, fut, profiler=null_profiler, stats=None, more_pages=()):
+    """Set channel status, return sequence of new entries. Deleted entries are counted in `stats` if given.
 
+    `more_pages` are futures of channel pages after the first one, their entries are tracked together.
+    If any of them failed, entries missing from the others are kept
+    """
     new_entries = []
+    channel.scraped = timezone.now()
 
     try:
-        response, html = fut.result()
+        response, body, encoding = fut.result()
         base_url = str(response.url)
-        entries = list(parse_channel(channel, base_url, html))
+
+        with profiler.stage('parse_channel', channel.id):
+            entries = list(parse_channel(channel, base_url, body, encoding))
+            complete = parse_pages(channel, more_pages, entries)
 
     except DownloadError as e:
         channel.status = Channel.ST_WARNING
-        logger.warning('%r - %r' % (channel, e))
+        logger.warning('%r - %r', channel, e)
 
     except ParseError as e:
         channel.status = Channel.ST_ERROR
-        logger.exception('%r - %r' % (channel, e))
+        logger.exception('%r - %r', channel, e)
 
     else:
         if entries:
-            channel.status = Channel.ST_OK
-            new_entries = Entry.objects.track_entries(channel, entries)
+            channel.status = Channel.ST_OK if complete else Channel.ST_WARNING
+
+            with profiler.stage('track_entries', channel.id):
+                new_entries = Entry.objects.track_entries(channel, entries, stats, delete_missing=complete)
+
+            if channel.interval == Channel.I_AUTO:
+                channel.adapt_interval(changed=bool(new_entries))
         else:
             channel.status = Channel.ST_WARNING
-            logger.info('%r - no entries' % channel)
+            logger.info('%r - no entries', channel)
 
     return new_entries
 
 
-def parse_channel(channel, base_url, html):
-    """Generates sequence of entries from channel html"""
+def parse_channel(channel, base_url, html, encoding=None):
+    """Generates sequence of entry records from channel html (str or bytes in `encoding`)"""
     extractor = ChannelExtractor.from_channel(channel)
+    records, invalid_rows = row_validator.records(channel, extractor.extract(html, base_url, encoding))
+
+    for row in invalid_rows:
+        logger.warning("Invalid row %r in channel %r", row, channel)
+
+    yield from records
+
+
+def parse_pages(channel, pages, entries):
+    """Extend entries with records from channel pages in futures. Returns False if some page failed"""
+    complete = True
 
-    for row in extractor.extract(html, base_url):
+    for fut in pages:
         try:
-            entry = Entry(channel=channel, **row)
-            entry.clean_fields(exclude=['channel'])
-            yield entry
+            response, body, encoding = fut.result()
+            entries.extend(parse_channel(channel, str(response.url), body, encoding))
+
+        except (DownloadError, ParseError) as e:
+            complete = False
+            logger.warning('%r - more pages - %r', channel, e)
+
+    return complete
+
+
+def next_page_url(channel, fut):
+    """Url of channel page following the one in future, from next page selector. None if there is none"""
+    try:
+        response, body, encoding = fut.result()
+        tree = ensure_element(body, str(response.url), encoding)
+        url = FieldExtractor(selector=channel.next_page_selector).extract(tree)
+
+    except (DownloadError, ParseError):
+        return None
+
+    if not isinstance(url, str):    # Nothing selected, or an element instead of url
+        return None
 
-        except ValidationError as e:
-            logger.warning("Invalid row %r in channel %r" % (row, channel))
+    return str(url).strip() or None
 
 
-def process_entry(entry, fut):
-    """Set entry status, populate entry.items"""
+def process_entry(entry, fut, profiler=null_profiler):
+    """Set entry status, populate entry.items and entry.fingerprint"""
     try:
-        resp, html = fut.result()
+        resp, body, encoding = fut.result()
         entry.real_url = str(resp.url)
-        items = parse_entry(entry.real_url, html)
+        items = parse_entry(entry.real_url, body, encoding, profiler=profiler, channel_id=entry.channel_id)
 
     except (DownloadError, ParseError) as e:
         entry.status = Entry.ST_ERROR
-        logger.info('%r - %r' % (entry, e))
+        entry_logger.info('%r - %r', entry, e)
 
     else:
         if items:
             entry.status = Entry.ST_OK
             entry.items = items
+            entry.fingerprint = entry_fingerprint(entry.title, items)
 
         else:
             entry.status = Entry.ST_WARNING
-            logger.info('%r - No items' % (entry, ))
+            entry_logger.info('%r - No items', entry)
 
     return entry
 
 
-def parse_entry(base_url, html):
-    """Parse entry html, return sets of item urls"""
-    extracted = EntryExtractor.extract_items(html, base_url)
+def parse_entry(base_url, html, encoding=None, profiler=null_profiler, channel_id=None):
+    """Parse entry html (str or bytes in `encoding`), return sets of item urls"""
+    with profiler.stage('parse_entry', channel_id):
+        extracted = EntryExtractor.extract_items(html, base_url, encoding)
 
-    return postprocess_items(extracted)
+    with profiler.stage('postprocess_items', channel_id):
+        return postprocess_items(extracted)
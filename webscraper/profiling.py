@@ -0,0 +1,224 @@
+"""Scrape profiling: wall and CPU time per stage, slowest channels and hosts, optional cProfile and tracemalloc.
+Selector profiling for a single channel page"""
+import cProfile
+import io
+import os
+import pstats
+import time
+import timeit
+import tracemalloc
+from collections import Counter, defaultdict, namedtuple
+
+from .extractors import ChannelExtractor, ensure_element
+from .hoststats import host_of
+
+
+# Default values
+TOP_N = 20  # Rows in each report ranking
+SELECTOR_REPEAT = 20    # Runs per measurement in selector profile, best time is reported
+
+SelectorTiming = namedtuple('SelectorTiming', 'name selector time matches')
+ChannelProfile = namedtuple('ChannelProfile', 'parse_time extract_time peak_memory rows selectors')
+
+
+class StageTotals:
+
+    __slots__ = ('calls', 'wall', 'cpu')
+
+    def __init__(self):
+        self.calls, self.wall, self.cpu = 0, 0.0, 0.0
+
+
+class ScrapeProfiler:
+
+    """Accumulates time spent in scrape stages, attributed to channels and hosts"""
+
+    def __init__(self, cprofile=False, trace_malloc=False):
+        self.stages = defaultdict(StageTotals)
+        self.channel_time = Counter()
+        self.host_time = Counter()
+        self._cprofile = cProfile.Profile() if cprofile else None
+        self._trace_malloc = trace_malloc
+        self._snapshot = None
+        self._started = self._cpu_started = None
+        self.wall = self.cpu = 0.0
+
+    def start(self):
+        self._started, self._cpu_started = time.perf_counter(), time.process_time()
+
+        if self._trace_malloc:
+            tracemalloc.start()
+
+        if self._cprofile is not None:
+            self._cprofile.enable()
+
+    def stop(self):
+        if self._cprofile is not None:
+            self._cprofile.disable()
+
+        if self._trace_malloc:
+            self._snapshot = tracemalloc.take_snapshot()
+            tracemalloc.stop()
+
+        self.wall = time.perf_counter() - self._started
+        self.cpu = time.process_time() - self._cpu_started
+
+    def stage(self, name, channel_id=None, url=None, cpu=True):
+        """Context manager timing one stage call. Set `cpu` to False for stages that await, their CPU time
+        would include work of other coroutines"""
+        return StageTimer(self, name, channel_id, url, cpu)
+
+    def record(self, name, wall, cpu=None, channel_id=None, url=None):
+        totals = self.stages[name]
+        totals.calls += 1
+        totals.wall += wall
+        totals.cpu += cpu or 0.0
+
+        if channel_id is not None:
+            self.channel_time[channel_id] += wall
+
+        if url is not None and name == 'download':
+            self.host_time[host_of(url)] += wall
+
+    def report(self, channels=(), top=TOP_N):
+        """Text report: stage totals, slowest channels and hosts, cProfile and tracemalloc top entries"""
+        titles = {channel.id: channel.title for channel in channels}
+        lines = ['Wall time %.1f s, CPU time %.1f s' % (self.wall, self.cpu), '',
+                 '%-20s %8s %10s %10s' % ('Stage', 'Calls', 'Wall, s', 'CPU, s')]
+
+        for name, totals in sorted(self.stages.items(), key=lambda i: -i[1].wall):
+            lines.append('%-20s %8d %10.2f %10.2f' % (name, totals.calls, totals.wall, totals.cpu))
+
+        lines += ['', 'Download wall time is summed over concurrent downloads', '', 'Slowest channels:']
+        lines += ['%10.2f s  %s (#%s)' % (wall, titles.get(channel_id, ''), channel_id)
+                  for channel_id, wall in self.channel_time.most_common(top)]
+        lines += ['', 'Slowest hosts (download):']
+        lines += ['%10.2f s  %s' % (wall, host) for host, wall in self.host_time.most_common(top)]
+
+        if self._cprofile is not None:
+            out = io.StringIO()
+            pstats.Stats(self._cprofile, stream=out).sort_stats('cumulative').print_stats(top)
+            lines += ['', 'cProfile, by cumulative time:', out.getvalue()]
+
+        if self._snapshot is not None:
+            lines += ['', 'tracemalloc, top allocations by line:']
+            lines += [str(stat) for stat in self._snapshot.statistics('lineno')[:top]]
+
+        return '\n'.join(lines)
+
+    def dump(self, directory, prefix):
+        """Write cProfile stats and tracemalloc snapshot files to directory. Returns list of paths"""
+        paths = []
+
+        if self._cprofile is not None:
+            paths.append(os.path.join(directory, prefix + '.prof'))
+            self._cprofile.dump_stats(paths[-1])
+
+        if self._snapshot is not None:
+            paths.append(os.path.join(directory, prefix + '.tracemalloc'))
+            self._snapshot.dump(paths[-1])
+
+        return paths
+
+
+class StageTimer:
+
+    __slots__ = ('_profiler', '_name', '_channel_id', '_url', '_cpu', '_wall_started', '_cpu_started')
+
+    def __init__(self, profiler, name, channel_id, url, cpu):
+        self._profiler, self._name, self._channel_id, self._url, self._cpu = profiler, name, channel_id, url, cpu
+
+    def __enter__(self):
+        self._wall_started = time.perf_counter()
+        self._cpu_started = time.process_time() if self._cpu else None
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        cpu = time.process_time() - self._cpu_started if self._cpu else None
+        self._profiler.record(self._name, time.perf_counter() - self._wall_started, cpu, self._channel_id, self._url)
+        return False
+
+
+class NullProfiler:
+
+    """Profiler that records nothing, used when profiling is off"""
+
+    def stage(self, *args, **kwargs):
+        return NULL_STAGE
+
+
+class NullStage:
+
+    def __enter__(self):
+        pass
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        return False
+
+
+NULL_STAGE = NullStage()
+null_profiler = NullProfiler()
+
+
+class TimedWriter:
+
+    """Wraps InsertBuffer writer, timing each batch insert"""
+
+    def __init__(self, writer, profiler):
+        self._writer = writer
+        self._profiler = profiler
+
+    def write(self, model, objs):
+        with self._profiler.stage('insert'):
+            return self._writer.write(model, objs)
+
+
+def profile_selectors(channel, html, base_url, encoding=None, repeat=SELECTOR_REPEAT):
+    """Time document parsing, each channel selector over the whole page and complete extraction.
+    Returns ChannelProfile, times are best of `repeat` runs in seconds. Peak memory is of Python heap as traced by
+    tracemalloc, memory libxml2 allocates for the document tree is not counted"""
+    extractor = ChannelExtractor.from_channel(channel)
+    tree = ensure_element(html, base_url, encoding)
+    rows = extractor.row_extractor.extract(tree, base_url)
+    selectors = [SelectorTiming('row_selector', extractor.row_extractor.selector,
+                                best_time(lambda: extractor.row_extractor.extract(tree, base_url), repeat), len(rows))]
+
+    for name, field_extractor in sorted(extractor.field_extractors.items()):
+        values = [field_extractor.extract(row, base_url) for row in rows]
+        elapsed = best_time(lambda: [field_extractor.extract(row, base_url) for row in rows], repeat)
+        matches = sum(value is not None for value in values)
+        selectors.append(SelectorTiming(name + '_selector', field_extractor.selector, elapsed, matches))
+
+    tracemalloc.start()
+
+    try:
+        extractor.extract(html, base_url, encoding)
+        _, peak_memory = tracemalloc.get_traced_memory()
+
+    finally:
+        tracemalloc.stop()
+
+    return ChannelProfile(parse_time=best_time(lambda: ensure_element(html, base_url, encoding), repeat),
+                          extract_time=best_time(lambda: extractor.extract(html, base_url, encoding), repeat),
+                          peak_memory=peak_memory, rows=len(rows), selectors=selectors)
+
+
+def selector_hints(profile):
+    """Suggestions for making channel extraction faster"""
+    hints = []
+    slowest = max(profile.selectors, key=lambda s: s.time)
+    selector_time = sum(s.time for s in profile.selectors)
+
+    if selector_time:
+        share = 100 * slowest.time / selector_time
+        hints.append('Slowest selector: %s, %.0f%% of selector time' % (slowest.name, share))
+
+    for timing in profile.selectors[1:]:
+        if timing.selector.startswith('//'):
+            hints.append('%s starts with "//" and searches the whole document for each row, '
+                         'use ".//" to search within the row' % timing.name)
+
+    return hints
+
+
+def best_time(func, repeat):
+    return min(timeit.repeat(func, number=1, repeat=repeat))
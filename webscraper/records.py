@@ -0,0 +1,70 @@
+"""Lightweight entry records, passed through the scrape pipeline instead of model instances"""
+from django.core.exceptions import ValidationError
+from django.core.validators import URLValidator
+
+from .models import Entry
+
+
+class EntryRecord:
+
+    """Entry data on its way from channel page to database. Converted to Entry model instance on insert"""
+
+    __slots__ = ('channel_id', 'url', 'title', 'extra', 'final_url', 'status', 'items')
+
+    def __init__(self, channel_id, url, title, extra='', final_url='', status=Entry.ST_NEW, items=None):
+        self.channel_id = channel_id
+        self.url = url
+        self.title = title
+        self.extra = extra
+        self.final_url = final_url
+        self.status = status
+        self.items = items
+
+    @property
+    def real_url(self):
+        return self.final_url if self.final_url else self.url
+
+    @real_url.setter
+    def real_url(self, value):
+        if self.url != value:
+            self.final_url = value
+
+    def to_model(self):
+        return Entry(channel_id=self.channel_id, url=self.url, title=self.title, extra=self.extra,
+                     final_url=self.final_url, status=self.status, items=self.items)
+
+    def __repr__(self):
+        return '<%s: %s>' % (self.__class__.__name__, self.title)
+
+
+class RowValidator:
+
+    """Validates extracted channel rows against Entry field constraints, all rows in one pass"""
+
+    def __init__(self):
+        self._validate_url = URLValidator()
+        self._max_length = {name: Entry._meta.get_field(name).max_length for name in ('url', 'title', 'extra')}
+
+    def records(self, channel, rows):
+        """Returns (list of EntryRecords for valid rows, list of invalid rows)"""
+        valid, invalid = [], []
+        max_url, max_title, max_extra = self._max_length['url'], self._max_length['title'], self._max_length['extra']
+
+        for row in rows:
+            # Extracted values are lxml "smart strings" holding a reference to the whole document tree
+            url, title, extra = str(row.get('url') or ''), str(row.get('title') or ''), str(row.get('extra') or '')
+
+            if not title or len(title) > max_title or len(url) > max_url or len(extra) > max_extra:
+                invalid.append(row)
+                continue
+
+            try:
+                self._validate_url(url)
+
+            except ValidationError:
+                invalid.append(row)
+                continue
+
+            valid.append(EntryRecord(channel.id, url, title, extra))
+
+        return valid, invalid
@@ -0,0 +1,142 @@
+"""Offline re-extraction of channels and entries from archived responses"""
+import glob
+import logging
+import os
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
+
+from django.conf import settings
+from django.db import connections, transaction
+
+from .aiohttpdownloader import detect_encoding, content_type_charset
+from .archive import index_archive, read_record
+from .extractors import ParseError
+from .fingerprint import entry_fingerprint
+from .models import Channel, Entry, MediaItem
+from .processing import parse_channel, parse_entry
+from .signals import feeds_changed
+
+
+CHUNK_SIZE = 16     # Archived responses per task sent to worker process
+BATCH_SIZE = 1000   # Archived responses parsed and written to database at once
+
+logger = logging.getLogger(__name__)
+
+
+def reextract(paths, processes=None, batch_size=BATCH_SIZE):
+    """Re-run channel and entry extraction over archive files, update entries in batches. Returns statistics"""
+    stats = Counter()
+    index = latest_records(paths)
+    channels = Channel.objects.in_bulk({int(channel) for kind, channel, url in index if channel})
+    tasks = sorted((path, offset, kind, channels[int(channel)])     # Read each archive file front to back
+                   for (kind, channel, url), (timestamp, path, offset) in index.items()
+                   if kind in ('channel', 'entry') and int(channel or 0) in channels)
+
+    for results in run_tasks(tasks, batch_size, processes):
+        channel_rows, entry_rows = [], []
+
+        for kind, rows in results:
+            stats[kind + '_pages'] += 1
+            (channel_rows if kind == 'channel' else entry_rows).extend(rows)
+
+        with transaction.atomic():
+            entry_rows = skip_duplicates(entry_rows)
+            stats['entries_updated'] += Entry.objects.bulk_update_by_url(channel_rows, ['title', 'extra'])
+            stats['entries_updated'] += Entry.objects.bulk_update_by_url(entry_rows, ['final_url', 'items', 'status'])
+            update_fingerprints(channel_rows + entry_rows)
+
+            if getattr(settings, 'MEDIA_ITEMS', False):
+                entries = [Entry(channel_id=row['channel_id'], url=row['url'], items=row['items'])
+                           for row in entry_rows]
+                MediaItem.objects.rebuild_for_entries(entries)
+
+    if channels:
+        Channel.objects.touch(list(channels.values()))
+        feeds_changed.send(sender=Channel, channels=list(channels.values()))
+
+    return stats
+
+
+def run_tasks(tasks, batch_size, processes=None):
+    """Generates list of extraction results for each batch of tasks"""
+    batches = (tasks[i:i + batch_size] for i in range(0, len(tasks), batch_size))
+
+    if processes == 1:
+        yield from (list(map(extract, batch)) for batch in batches)
+        return
+
+    with ProcessPoolExecutor(max_workers=processes) as executor:
+        for batch in batches:
+            connections.close_all()     # Do not share database connections with workers forked on submit
+            yield list(executor.map(extract, batch, chunksize=CHUNK_SIZE))
+
+
+def extract(task):
+    """Parse one archived response, read from archive file. Returns (kind, list of entry field dicts)"""
+    path, offset, kind, channel = task
+    response = read_record(path, offset)
+    encoding = detect_encoding(response.body, content_type_charset(response.headers.get('Content-Type')))
+
+    if kind == 'channel':
+        try:
+            records = parse_channel(channel, response.final_url, response.body, encoding)
+            rows = [{'channel_id': channel.id, 'url': r.url, 'title': r.title, 'extra': r.extra} for r in records]
+
+        except ParseError as e:
+            logger.warning('%r - %r', channel, e)
+            rows = []
+
+        return kind, rows
+
+    row = {'channel_id': channel.id, 'url': response.url, 'items': None, 'status': Entry.ST_ERROR,
+           'final_url': response.final_url if response.final_url != response.url else ''}
+
+    try:
+        row['items'] = parse_entry(response.final_url, response.body, encoding) or None
+        row['status'] = Entry.ST_OK if row['items'] else Entry.ST_WARNING
+
+    except ParseError as e:
+        logger.info('%s - %r', response.url, e)
+
+    return kind, [row]
+
+
+def stored_entries(rows, **filters):
+    """Entries identified by channel_id and url of rows"""
+    keys = {(row['channel_id'], row['url']) for row in rows}
+    entries = Entry.objects.filter(channel_id__in={channel_id for channel_id, url in keys},
+                                   url__in={url for channel_id, url in keys}, **filters)
+    return [entry for entry in entries.only('channel_id', 'url', 'title', 'items')
+            if (entry.channel_id, entry.url) in keys]
+
+
+def skip_duplicates(rows):
+    """Rows of entries that are not linked near-duplicates, which keep no items of their own"""
+    duplicates = {(e.channel_id, e.url) for e in stored_entries(rows, duplicate_of__isnull=False)}
+    return [row for row in rows if (row['channel_id'], row['url']) not in duplicates]
+
+
+def update_fingerprints(rows):
+    """Recompute content fingerprints of re-extracted entries from their stored title and items"""
+    fingerprints = [{'channel_id': e.channel_id, 'url': e.url, 'fingerprint': entry_fingerprint(e.title, e.items)}
+                    for e in stored_entries(rows, duplicate_of__isnull=True)]
+    return Entry.objects.bulk_update_by_url(fingerprints, ['fingerprint'])
+
+
+def latest_records(paths):
+    """Location of most recent archived response for each page: {(kind, channel, url): (timestamp, path, offset)}"""
+    latest = {}
+
+    for path in paths:
+        for offset, response in index_archive(path):
+            key = (response.meta.get('kind'), response.meta.get('channel'), response.url)
+
+            if key not in latest or response.timestamp >= latest[key][0]:
+                latest[key] = (response.timestamp, path, offset)
+
+    return latest
+
+
+def archive_paths(archive_dir):
+    """All archive files in directory, oldest first"""
+    return sorted(glob.glob(os.path.join(archive_dir, '*.warc.gz')))
@@ -0,0 +1,100 @@
+"""Entry retention: deletes entries over per-channel limits in bounded batches of raw SQL"""
+from collections import Counter
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import connections, transaction
+from django.utils import timezone
+
+from .models import Channel, Entry, PrunedEntry
+from .signals import feeds_changed
+
+
+# Default values
+BATCH_SIZE = 1000   # Entries deleted per transaction
+
+
+def prune(channels, now=None, batch_size=BATCH_SIZE, dry_run=False):
+    """Delete entries of channels that are over their retention limits. Returns statistics"""
+    stats = Counter()
+    now = now or timezone.now()
+    pruned = []
+
+    for channel in channels:
+        max_entries, max_age = retention_limits(channel)
+
+        if max_entries is None and max_age is None:
+            continue
+
+        cutoff = now - max_age if max_age is not None else None
+
+        if dry_run:
+            deleted = len(expired_ids(channel, max_entries, cutoff))
+
+        else:
+            deleted = delete_in_batches(channel, max_entries, cutoff, batch_size)
+
+        stats['entries'] += deleted
+        stats['channels'] += 1 if deleted else 0
+
+        if deleted and not dry_run:
+            pruned.append(channel)
+
+    if pruned:
+        Channel.objects.touch(pruned)
+        feeds_changed.send(sender=Channel, channels=pruned)
+
+    return stats
+
+
+def delete_in_batches(channel, max_entries, cutoff, batch_size):
+    """Delete expired entries one batch per transaction, so locks are short and memory use is bounded.
+    Their urls are kept as PrunedEntry, so next scrape does not add them again"""
+    deleted = 0
+
+    while True:
+        with transaction.atomic():
+            ids = expired_ids(channel, max_entries, cutoff, limit=batch_size)
+
+            if ids:
+                PrunedEntry.objects.add_for_entries(ids)
+                deleted += Entry.objects.delete_by_ids(ids)
+
+        if len(ids) < batch_size:
+            return deleted
+
+
+def expired_ids(channel, max_entries=None, cutoff=None, limit=None):
+    """Ids of channel entries added before `cutoff` or beyond `max_entries` newest ones"""
+    connection = connections[Entry.objects.db]
+    table = connection.ops.quote_name(Entry._meta.db_table)
+    queries, params = [], []
+
+    if cutoff is not None:
+        queries.append('SELECT id FROM %s WHERE channel_id = %%s AND added < %%s' % table)
+        params += [channel.id, cutoff]
+
+    if max_entries is not None:
+        queries.append('(SELECT id FROM %s WHERE channel_id = %%s ORDER BY added DESC, id DESC OFFSET %%s)' % table)
+        params += [channel.id, max_entries]
+
+    sql = ' UNION '.join(queries)
+
+    if limit is not None:
+        sql += ' LIMIT %s'
+        params.append(limit)
+
+    with connection.cursor() as cursor:
+        cursor.execute(sql, params)
+        return [row[0] for row in cursor.fetchall()]
+
+
+def retention_limits(channel):
+    """(max entries, max age) for channel, falling back to settings"""
+    max_entries = channel.max_entries if channel.max_entries is not None else settings.ENTRY_MAX_ENTRIES
+    max_age = channel.max_age
+
+    if max_age is None and settings.ENTRY_MAX_AGE_DAYS is not None:
+        max_age = timedelta(days=settings.ENTRY_MAX_AGE_DAYS)
+
+    return max_entries, max_age
@@ -0,0 +1,55 @@
+"""Scrape run history: per-channel figures collected during a run, saved in bulk when it ends"""
+from collections import Counter, defaultdict
+
+from django.db import transaction
+from django.utils import timezone
+
+from .aiohttpdownloader import transfer_size
+from .models import ScrapeRun, ChannelRunStat
+
+
+class RunRecorder:
+
+    """Accumulates per-channel counters while scraping, see ChannelRunStat fields"""
+
+    def __init__(self, channels):
+        self.started = timezone.now()
+        self.status_before = {channel.id: channel.status for channel in channels}
+        self.scraped_before = {channel.id: channel.scraped for channel in channels}
+        self.channels = defaultdict(Counter)
+        self.shed = set()   # Ids of channels that had entries shed at deadline
+
+    def add(self, channel_id, **values):
+        self.channels[channel_id].update(values)
+
+    def changed(self, channels):
+        """Channels that had entries added or deleted"""
+        figures = {channel.id: self.channels.get(channel.id, {}) for channel in channels}
+        return [channel for channel in channels
+                if figures[channel.id].get('entries_new') or figures[channel.id].get('entries_deleted')]
+
+    def save(self, channels, stats):
+        """Write ScrapeRun with ChannelRunStat for each channel that has figures. Returns ScrapeRun"""
+        with transaction.atomic():
+            run = ScrapeRun.objects.create(
+                started=self.started, finished=timezone.now(), channels=stats['channels'],
+                entries=stats['entries'], bytes=sum(c['bytes'] for c in self.channels.values()),
+                wire_bytes=stats['wire_bytes'],
+                channels_shed=stats['channels_shed'], entries_shed=stats['entries_shed'], dns_time=stats['dns_time'])
+
+            ChannelRunStat.objects.bulk_create([
+                ChannelRunStat(run=run, channel=channel, status_before=self.status_before[channel.id],
+                               status_after=channel.status, **self.channels[channel.id])
+                for channel in channels if channel.id in self.channels])
+
+        return run
+
+
+def response_size(fut):
+    """Body size of downloaded response in future, 0 if download failed"""
+    return 0 if fut.exception() is not None else len(fut.result()[1])
+
+
+def wire_size(fut):
+    """Bytes received for downloaded response in future, before decompression. 0 if download failed"""
+    return 0 if fut.exception() is not None else transfer_size(*fut.result()[:2])
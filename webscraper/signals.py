@@ -0,0 +1,8 @@
+from django.dispatch import Signal
+
+
+# Sent at the end of scrape run, after all new entries are stored. `channels` - channels that were scraped
+scrape_finished = Signal(providing_args=['channels'])
+
+# Sent when feed entries of `channels` changed outside of scrape run: entries pruned or re-extracted, admin edits
+feeds_changed = Signal(providing_args=['channels'])
@@ -1,8 +1,15 @@
-from django.test import TestCase
+from unittest.mock import patch
 
-from webscraper.admin import ChannelAdminForm, entry_title_with_link, entry_site, channel_feed_link
-from webscraper.models import Channel, Entry
-from .util import CHANNEL_DEFAULTS
+from django.contrib import admin
+from django.contrib.auth.models import User
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.client import RequestFactory
+from django.utils import timezone
+
+from webscraper.admin import ChannelAdminForm, EntryAdmin, entry_title_with_link, entry_site, channel_feed_link
+from webscraper.models import Channel, Entry, ScrapeRun, ChannelRunStat
+from .util import CHANNEL_DEFAULTS, create_channel, create_entry
 
 
 class ChannelAdminFormTestCase(TestCase):
@@ -12,6 +19,31 @@ class ChannelAdminFormTestCase(TestCase):
         slug_field = form.fields['slug']
         self.assertTrue(slug_field.disabled)
 
+    def test_request_headers_must_be_strings(self):
+        data = dict(CHANNEL_DEFAULTS, status=Channel.ST_NEW, max_pages=1)
+        valid = ChannelAdminForm(data=dict(data, request_headers='{"Referer": "http://ho.st/"}'))
+        invalid = ChannelAdminForm(data=dict(data, request_headers='{"Referer": 1}'))
+        self.assertTrue(valid.is_valid(), valid.errors)
+        self.assertIn('request_headers', invalid.errors)
+
+    def test_selectors_must_compile(self):
+        data = dict(CHANNEL_DEFAULTS, status=Channel.ST_NEW, max_pages=1, row_selector='//a[@href',
+                    next_page_selector='//a[@rel="next"]/@href')
+        form = ChannelAdminForm(data=data)
+        self.assertFalse(form.is_valid())
+        self.assertEqual(list(form.errors), ['row_selector'])
+
+    def test_page_url_template_and_max_pages_checked(self):
+        data = dict(CHANNEL_DEFAULTS, status=Channel.ST_NEW, max_pages=3)
+        self.assertTrue(ChannelAdminForm(data=dict(data, page_url_template='http://ho.st/?p={page}')).is_valid())
+
+        for template in ['http://ho.st/?p=2', 'http://ho.st/{page}/{0}', 'http://ho.st/{pg}', 'http://ho.st/{page']:
+            form = ChannelAdminForm(data=dict(data, page_url_template=template))
+            self.assertEqual(list(form.errors), ['page_url_template'], template)
+
+        form = ChannelAdminForm(data=dict(data, max_pages=0))
+        self.assertEqual(list(form.errors), ['max_pages'])
+
 
 class AdminHelpersTestCase(TestCase):
 
@@ -31,3 +63,83 @@ class AdminHelpersTestCase(TestCase):
         c.save()    # slug generated on first save
         rv = channel_feed_link(c)
         self.assertIn(c.slug, rv)
+
+
+class EntryAdminSearchTestCase(TestCase):
+
+    def test_search_uses_trigram_indexes(self):
+        model_admin = EntryAdmin(Entry, admin.site)
+        qs, _ = model_admin.get_search_results(RequestFactory().get('/'), Entry.objects.all(), 'needle')
+        sql, params = qs.query.sql_with_params()
+
+        with connection.cursor() as cursor:
+            cursor.execute('SET LOCAL enable_seqscan = off')     # Test table is too small for planner to pick index
+            cursor.execute('EXPLAIN ' + sql, params)
+            plan = '\n'.join(row[0] for row in cursor.fetchall())
+
+        for column in model_admin.search_fields:
+            self.assertIn('webscraper_entry_%s_trgm' % column, plan)
+
+
+@override_settings(STATICFILES_STORAGE='django.contrib.staticfiles.storage.StaticFilesStorage')  # No manifest in tests
+@patch.object(EntryAdmin, 'list_per_page', 2)
+class EntryChangeListTestCase(TestCase):
+
+    def setUp(self):
+        self.channel = create_channel(title='Some channel')
+        self.entries = [create_entry(channel=self.channel, url='http://ho.st/%d' % i) for i in range(3)]
+        user = User.objects.create_superuser('admin', 'admin@example.com', 'password')
+        self.client.force_login(user)
+
+    def test_changelist_is_paged_by_cursor(self):
+        newest_first = sorted(self.entries, key=lambda e: (e.added, e.id), reverse=True)
+        cl = self.client.get('/admin/webscraper/entry/').context['cl']
+        self.assertEqual(list(cl.result_list), newest_first[:2])
+        self.assertIn('after=', cl.next_url)
+
+        cl = self.client.get('/admin/webscraper/entry/' + cl.next_url).context['cl']
+        self.assertEqual(list(cl.result_list), newest_first[2:])
+        self.assertIsNone(cl.next_url)
+        self.assertEqual(cl.result_count, 3)
+
+    def test_changelist_uses_offset_paging_when_sorted(self):
+        cl = self.client.get('/admin/webscraper/entry/?o=2').context['cl']
+        self.assertFalse(cl.keyset)
+        self.assertEqual(len(cl.result_list), 2)
+
+    def test_changelist_filters_by_channel(self):
+        other = create_entry(channel=create_channel())
+        cl = self.client.get('/admin/webscraper/entry/?channel=%d' % other.channel_id).context['cl']
+        self.assertEqual(list(cl.result_list), [other])
+
+    def test_invalid_cursor_redirects(self):
+        response = self.client.get('/admin/webscraper/entry/?after=garbage')
+        self.assertRedirects(response, '/admin/webscraper/entry/?e=1', fetch_redirect_response=False)
+
+    def test_channel_autocomplete(self):
+        create_channel(title='Another')
+        response = self.client.get('/admin/webscraper/channel/autocomplete/?term=some')
+        self.assertEqual(response.json(), {'results': [{'id': self.channel.id, 'title': 'Some channel'}]})
+
+
+@override_settings(STATICFILES_STORAGE='django.contrib.staticfiles.storage.StaticFilesStorage')  # No manifest in tests
+class ScrapeRunAdminTestCase(TestCase):
+
+    def setUp(self):
+        user = User.objects.create_superuser('admin', 'admin@example.com', 'password')
+        self.client.force_login(user)
+
+    def test_trends_view(self):
+        channel = create_channel(title='Some channel')
+        run = ScrapeRun.objects.create(started=timezone.now(), finished=timezone.now())
+        ChannelRunStat.objects.create(run=run, channel=channel, fetch_time=1.5, status_before=0, status_after=1)
+        response = self.client.get('/admin/webscraper/scraperun/trends/')
+        self.assertContains(response, 'Some channel')
+        self.assertContains(response, '1.50')
+
+    def test_run_change_view_lists_channel_stats(self):
+        channel = create_channel(title='Some channel')
+        run = ScrapeRun.objects.create(started=timezone.now(), finished=timezone.now())
+        ChannelRunStat.objects.create(run=run, channel=channel, status_before=0, status_after=1)
+        response = self.client.get('/admin/webscraper/scraperun/%d/change/' % run.id)
+        self.assertContains(response, 'Some channel')
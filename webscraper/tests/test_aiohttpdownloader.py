@@ -1,11 +1,17 @@
+import asyncio
+import gzip
 import os
 import unittest
 from functools import wraps
+from unittest.mock import patch
 
 from vcr_unittest import VCRMixin
 
-from webscraper.aiohttpdownloader import fetch, DownloadError, RetryableDownloadError, make_session, download_to_future
+from webscraper.aiohttpdownloader import (fetch, DownloadError, RetryableDownloadError, make_session,
+                                          download_to_future, detect_encoding, meta_charset, codec_name,
+                                          ClientFactory, transfer_size, DEFAULT_HEADERS)
 from webscraper.futurelite import FutureLite
+from webscraper.hoststats import HostLatency
 from .util import AsyncioTestCase
 
 
@@ -13,9 +19,10 @@ class AioHttpDownloaderTestCase(VCRMixin, AsyncioTestCase):
 
     def test_fetch_downloads(self):
         coro = with_session(fetch, loop=self.loop)
-        resp, body = self.loop.run_until_complete(coro('http://httpbin.org/'))
+        resp, body, encoding = self.loop.run_until_complete(coro('http://httpbin.org/'))
         self.assertEquals(resp.status, 200)
-        self.assertIn('ENDPOINTS', body)
+        self.assertIn(b'ENDPOINTS', body)
+        self.assertEquals(encoding, 'utf-8')
 
     def test_get_raises_404(self):
         coro = with_session(fetch, loop=self.loop)
@@ -35,16 +42,16 @@ class AioHttpDownloaderTestCase(VCRMixin, AsyncioTestCase):
     def test_make_session_sets_headers(self):
         headers = {'Boo': 'hoo'}
         coro = with_session(fetch, loop=self.loop, headers=headers)
-        resp, text = self.loop.run_until_complete(coro('http://httpbin.org/headers'))
-        self.assertIn('"Boo": "hoo"', text)
+        resp, body, encoding = self.loop.run_until_complete(coro('http://httpbin.org/headers'))
+        self.assertIn(b'"Boo": "hoo"', body)
 
     def test_download_to_future_sets_result(self):
         fut = FutureLite()
         coro = with_session(download_to_future, loop=self.loop)
         self.loop.run_until_complete(coro('http://httpbin.org/', fut))
-        resp, text = fut.result()
+        resp, body, encoding = fut.result()
         self.assertEqual(resp.status, 200)
-        self.assertIn('ENDPOINTS', text)
+        self.assertIn(b'ENDPOINTS', body)
 
     def test_download_to_future_sets_exception(self):
         fut = FutureLite()
@@ -58,6 +65,32 @@ class AioHttpDownloaderTestCase(VCRMixin, AsyncioTestCase):
         with self.assertRaises(RetryableDownloadError):
             self.loop.run_until_complete(coro('https://httpbin.org/delay/1'))
 
+    def test_fetch_records_latency(self):
+        latency = HostLatency(default_timeout=6)
+        coro = with_session(fetch, loop=self.loop)
+        self.loop.run_until_complete(coro('http://httpbin.org/', latency=latency))
+        self.assertEqual(len(latency.to_dict()['httpbin.org']), 1)
+
+
+class DownloadToFutureTestCase(AsyncioTestCase):
+
+    def test_failed_archive_write_keeps_result(self):
+
+        class BrokenArchive:
+            def write(self, url, resp, body, **meta):
+                raise OSError(28, 'No space left on device')
+
+        async def fetch_stub(url, **kw):
+            return 'resp', b'body', 'utf-8'
+
+        fut = FutureLite()
+
+        with patch('webscraper.aiohttpdownloader.fetch', fetch_stub), self.assertLogs('webscraper', 'WARNING'):
+            self.loop.run_until_complete(download_to_future('http://host.com/', fut, session=None,
+                                                            archive=BrokenArchive()))
+
+        self.assertEqual(fut.result(), ('resp', b'body', 'utf-8'))
+
 
 class TimeoutTestCase(AsyncioTestCase):
 
@@ -75,6 +108,108 @@ class TimeoutTestCase(AsyncioTestCase):
             self.loop.run_until_complete(coro('http://10.255.255.1/'))
 
 
+class ClientFactoryTestCase(AsyncioTestCase):
+
+    def session_attrs(self, session):
+
+        async def go():
+            async with session:
+                return session.connector, dict(session._default_headers)
+
+        return self.loop.run_until_complete(go())
+
+    def test_session_uses_limits(self):
+        factory = ClientFactory(limit=10, limit_per_host=3, keepalive_timeout=5)
+        connector, _ = self.session_attrs(factory.session(self.loop))
+        self.assertEqual((connector.limit, connector.limit_per_host), (10, 3))
+
+    def test_headers_override_defaults(self):
+        _, headers = self.session_attrs(ClientFactory(headers={'User-agent': 'test'}).session(self.loop))
+        self.assertEqual(headers['User-agent'], 'test')
+        self.assertIn('gzip', headers['Accept-Encoding'])
+
+    def test_make_session_leaves_default_headers_intact(self):
+        defaults = dict(DEFAULT_HEADERS)
+        self.session_attrs(make_session(self.loop, headers={'Boo': 'hoo'}))
+        self.assertEqual(DEFAULT_HEADERS, defaults)
+
+
+class TransferSizeTestCase(unittest.TestCase):
+
+    def test_compressed_response_size_from_content_length(self):
+        resp = ResponseStub({'Content-Encoding': 'gzip', 'Content-Length': '10'})
+        self.assertEqual(transfer_size(resp, b'decompressed body'), 10)
+
+    def test_body_size_otherwise(self):
+        self.assertEqual(transfer_size(ResponseStub({'Content-Length': '10'}), b'body'), 4)
+        self.assertEqual(transfer_size(ResponseStub({'Content-Encoding': 'gzip'}), b'body'), 4)
+
+
+class WireSizeTestCase(AsyncioTestCase):
+
+    def serve(self, response):
+        """Start local server answering each request with `response` bytes, return its url"""
+
+        class Protocol(asyncio.Protocol):
+            def connection_made(self, transport):
+                self.transport = transport
+
+            def data_received(self, data):
+                if b'\r\n\r\n' in data:
+                    self.transport.write(response)
+
+        server = self.loop.run_until_complete(self.loop.create_server(Protocol, '127.0.0.1', 0))
+        self.addCleanup(server.close)
+        return 'http://127.0.0.1:%d/' % server.sockets[0].getsockname()[1]
+
+    def test_counts_bytes_of_chunked_compressed_response(self):
+        body = b'<html>' + b'repeated content ' * 200 + b'</html>'
+        compressed = gzip.compress(body)
+        response = (b'HTTP/1.1 200 OK\r\nContent-Type: text/html\r\nContent-Encoding: gzip\r\n'
+                    b'Transfer-Encoding: chunked\r\n\r\n%x\r\n%s\r\n0\r\n\r\n' % (len(compressed), compressed))
+        url = self.serve(response)
+
+        async def go():
+            async with make_session(self.loop) as session:
+                first = await fetch(url, session=session)
+                second = await fetch(url, session=session)   # Over the same kept-alive connection
+                return first, second
+
+        for resp, received, _ in self.loop.run_until_complete(go()):
+            self.assertEqual(received, body)
+            self.assertEqual(transfer_size(resp, received), len(response))
+
+
+class ResponseStub:
+
+    def __init__(self, headers):
+        self.headers = headers
+
+
+class DetectEncodingTestCase(unittest.TestCase):
+
+    def test_header_charset_comes_first(self):
+        body = b'<meta charset="windows-1251">'
+        self.assertEqual(detect_encoding(body, 'ISO-8859-1'), 'iso8859-1')
+
+    def test_meta_charset_used_without_header(self):
+        body = b'<meta http-equiv="Content-Type" content="text/html; charset=windows-1251">'
+        self.assertEqual(detect_encoding(body), 'cp1251')
+
+    def test_detects_from_content(self):
+        body = ('<p>%s</p>' % ('Съешь же ещё этих мягких французских булок' * 10)).encode('utf-8')
+        self.assertEqual(detect_encoding(body), 'utf-8')
+
+    def test_skips_unknown_charsets(self):
+        body = b'<meta charset="no-such-charset"><p>plain</p>'
+        encoding = detect_encoding(body, 'bogus')
+        self.assertEqual(codec_name(encoding), encoding)
+        self.assertIsNone(codec_name('bogus'))
+
+    def test_meta_charset_missing(self):
+        self.assertIsNone(meta_charset(b'<html></html>'))
+
+
 def with_session(f, *, loop, **sess_kw):
     """Create session and call function with it passed as keyword argument"""
     @wraps(f)
@@ -1,11 +1,23 @@
 import asyncio
-from collections import deque
-from unittest.mock import Mock
-
-from django.test import TestCase
-
-from webscraper.aioscraper import AioScraper, entry_worker
-from .util import AsyncioTestCase
+import os
+import tempfile
+from collections import deque, Counter
+from datetime import timedelta
+from unittest.mock import MagicMock, Mock, patch
+
+from django.test import TestCase, override_settings
+from django.utils import timezone
+
+from webscraper.aioscraper import (AioScraper, Deadline, download_channel_pages, entry_worker, make_on_insert,
+                                   shed_channels, scrape, client_session, close_client)
+from webscraper.aiohttpdownloader import ClientFactory
+from webscraper.dnscache import DnsCache
+from webscraper.futurelite import FutureLite
+from webscraper.models import Channel, Entry
+from webscraper.models import ScrapeRun
+from webscraper.runhistory import RunRecorder
+from webscraper.signals import scrape_finished
+from .util import AsyncioTestCase, create_channel
 
 
 class AioScraperTestCase(AsyncioTestCase, TestCase):
@@ -22,6 +34,181 @@ class AioScraperTestCase(AsyncioTestCase, TestCase):
         s.run([])
         self.assertEquals(self.buf.flush.call_count, 1)
 
+    def test_run_returns_stats(self):
+        s = AioScraper(loop=self.loop, insert_buffer=self.buf, entry_queue=self.entry_queue, deadline=0)
+        stats = s.run([])
+        self.assertEquals(stats['channels_shed'], 0)
+
+    def test_prefetch_dns_resolves_channel_hosts(self):
+        resolver = Mock()
+        resolver.prefetch.return_value = self.async_result(1)
+        s = AioScraper(loop=self.loop, insert_buffer=self.buf, entry_queue=self.entry_queue)
+        s._channel_queue = deque([Channel(url='http://host.com/', page_url_template='http://cdn.host.com/{page}',
+                                          max_pages=2), None])
+        self.loop.run_until_complete(s.prefetch_dns(resolver, s.channel_hosts()))
+        resolver.prefetch.assert_called_once_with({'host.com', 'cdn.host.com'})
+
+    @patch('webscraper.aioscraper.DNS_PREFETCH_TIMEOUT', 0.01)
+    def test_prefetch_dns_gives_up_after_timeout(self):
+        resolver = Mock()
+        resolver.prefetch.return_value = asyncio.sleep(10)
+        s = AioScraper(loop=self.loop, insert_buffer=self.buf, entry_queue=self.entry_queue)
+
+        with self.assertLogs('webscraper.aioscraper', 'WARNING'):
+            self.loop.run_until_complete(asyncio.wait_for(s.prefetch_dns(resolver, {'host.com'}), 1))
+
+    async def async_result(self, value):
+        return value
+
+
+class ScrapeTestCase(AsyncioTestCase, TestCase):
+
+    def test_sends_scrape_finished_with_scraped_channels(self):
+        scraped, shed = create_channel(), create_channel()
+        receiver = Mock()
+        scrape_finished.connect(receiver)
+        self.addCleanup(scrape_finished.disconnect, receiver)
+
+        def run(self, channels):
+            channels[0].scraped = timezone.now()
+            return Counter()
+
+        with patch.object(AioScraper, 'run', run):
+            scrape([scraped, shed])
+
+        _, kwargs = receiver.call_args
+        self.assertEqual(kwargs['channels'], [scraped])
+
+    def test_saves_scrape_run(self):
+        channel = create_channel()
+
+        def run(self, channels):
+            channels[0].scraped = timezone.now()
+            self._recorder.add(channels[0].id, fetch_time=0.5, bytes=100)
+            return Counter(channels=1)
+
+        with patch.object(AioScraper, 'run', run):
+            scrape([channel])
+
+        run = ScrapeRun.objects.get()
+        self.assertEqual((run.channels, run.bytes), (1, 100))
+        self.assertEqual(run.channel_stats.get().fetch_time, 0.5)
+
+    def test_channels_with_shed_entries_keep_scrape_order(self):
+        last_scraped = timezone.now() - timedelta(days=1)
+        channel = create_channel(scraped=last_scraped)
+
+        def run(self, channels):
+            channels[0].scraped = timezone.now()
+            channels[0].save()
+            self._recorder.shed.add(channels[0].id)
+            return Counter(channels=1)
+
+        with patch.object(AioScraper, 'run', run):
+            stats = scrape([channel])
+
+        channel.refresh_from_db()
+        self.assertEqual(channel.scraped, last_scraped)
+        self.assertEqual(stats['channels_deferred'], 1)
+
+    def test_marks_only_changed_channels_updated(self):
+        changed, unchanged = create_channel(), create_channel()
+
+        def run(self, channels):
+            for channel in channels:
+                channel.scraped = timezone.now()
+
+            self._recorder.add(changed.id, entries_new=1)
+            self._recorder.add(unchanged.id, entries_new=0, entries_deleted=0)
+            return Counter(channels=2)
+
+        with patch.object(AioScraper, 'run', run):
+            scrape([changed, unchanged])
+
+        updated = dict(Channel.objects.values_list('id', 'updated'))
+        self.assertIsNotNone(updated[changed.id])
+        self.assertIsNone(updated[unchanged.id])
+
+    def test_keeps_dns_cache_in_state_dir(self):
+
+        def run(self, channels):
+            self._dns_cache.put('host.com', ['10.0.0.1'], ttl=300)
+            return Counter()
+
+        with tempfile.TemporaryDirectory() as tmpdir, override_settings(SCRAPER_STATE_DIR=tmpdir):
+            with patch.object(AioScraper, 'run', run):
+                scrape([])
+
+            cache = DnsCache.load(os.path.join(tmpdir, 'dns_cache.json'))
+
+        self.assertEqual(cache.get('host.com'), ['10.0.0.1'])
+
+    def test_creates_missing_state_dir(self):
+        with tempfile.TemporaryDirectory() as tmpdir:
+            state_dir = os.path.join(tmpdir, 'state')
+
+            with override_settings(SCRAPER_STATE_DIR=state_dir):
+                with patch.object(AioScraper, 'run', Mock(return_value=Counter())):
+                    scrape([])
+
+            self.assertTrue(os.path.exists(os.path.join(state_dir, 'dns_cache.json')))
+
+    def test_logs_state_save_errors(self):
+        with tempfile.NamedTemporaryFile() as f, override_settings(SCRAPER_STATE_DIR=f.name):
+            with patch.object(AioScraper, 'run', Mock(return_value=Counter())):
+                with self.assertLogs('webscraper.aioscraper', 'WARNING'):
+                    scrape([])
+
+
+class ClientSessionTestCase(AsyncioTestCase):
+
+    def test_session_is_kept_between_runs(self):
+        first_stats, second_stats = Counter(), Counter()
+        session, resolver = client_session(self.loop, ClientFactory(), DnsCache(), first_stats)
+        again, resolver_again = client_session(self.loop, ClientFactory(), DnsCache(), second_stats)
+        self.assertIs(again, session)
+        self.assertIs(resolver_again.stats, second_stats)
+
+        close_client(self.loop)
+        self.assertTrue(session.closed)
+        self.assertIsNot(client_session(self.loop, ClientFactory(), DnsCache(), Counter())[0], session)
+        close_client(self.loop)
+
+
+class MakeOnInsertTestCase(TestCase):
+
+    def test_none_when_off(self):
+        self.assertIsNone(make_on_insert())
+
+    @patch('webscraper.aioscraper.MediaItem.objects.create_for_entries')
+    @patch('webscraper.aioscraper.Entry.objects.link_duplicates')
+    def test_skips_media_items_of_duplicates(self, link_duplicates, create_for_entries):
+        original, duplicate = Entry(url='http://ho.st/1'), Entry(url='http://ho.st/2')
+        link_duplicates.return_value = [duplicate]
+        make_on_insert(duplicate_distance=3, media_items=True)([original, duplicate])
+        link_duplicates.assert_called_once_with([original, duplicate], 3)
+        create_for_entries.assert_called_once_with([original])
+
+
+class DeadlineTestCase(AsyncioTestCase):
+
+    def test_no_deadline_never_expires(self):
+        self.assertFalse(Deadline(self.loop).expired())
+
+    def test_expires_after_deadline(self):
+        self.assertTrue(Deadline(self.loop, 0).expired())
+        self.assertFalse(Deadline(self.loop, 3600).expired())
+
+    def test_margin_brings_deadline_forward(self):
+        self.assertTrue(Deadline(self.loop, 10, margin=10).expired())
+
+    def test_shed_channels_keeps_shutdown_signals(self):
+        queue = deque(['chan1', 'chan2', None, None])
+        stats = {'channels_shed': 0}
+        shed_channels(queue, stats)
+        self.assertEquals(list(queue), [None, None])
+        self.assertEquals(stats['channels_shed'], 2)
+
 
 class EntryWorkerTestCase(AsyncioTestCase):
 
@@ -63,12 +250,107 @@ class EntryWorkerTestCase(AsyncioTestCase):
 
         self.assertEquals(len(self.sess.calls), 1)
 
+    def test_traces_entry(self):
+        tracer = MagicMock()
+
+        async def go(entry):
+            await self.queue.put(entry)
+            await entry_worker(0, self.queue, self.sess, self.buf, tracer=tracer)
+
+        entry = Mock()
+        self.loop.run_until_complete(go(entry))
+
+        tracer.entry_span.assert_called_once_with(entry)
+        self.assertEqual([c[0][0] for c in tracer.span.call_args_list], ['download', 'parse'])
+
+    def test_sends_channel_headers(self):
+
+        async def go(entry):
+            await self.queue.put(entry)
+            await entry_worker(0, self.queue, self.sess, self.buf, channel_headers={1: {'Referer': 'http://ho.st/'}})
+
+        self.loop.run_until_complete(go(Mock(channel_id=1)))
+        _, kw = self.sess.calls[0]
+        self.assertEqual(kw['headers'], {'Referer': 'http://ho.st/'})
+
+    def test_sheds_entries_after_deadline(self):
+
+        async def go(entry):
+            await self.queue.put(entry)
+            await entry_worker(0, self.queue, self.sess, self.buf, deadline=Deadline(self.loop, 0), stats=stats)
+
+        stats = {'entries_shed': 0}
+        self.loop.run_until_complete(go(Mock()))
+
+        self.assertEquals(self.buf, set())
+        self.assertEquals(len(self.sess.calls), 0)
+        self.assertEquals(stats['entries_shed'], 1)
+
+    def test_records_channels_with_shed_entries(self):
+        recorder = RunRecorder([])
+
+        async def go(entry):
+            await self.queue.put(entry)
+            await entry_worker(0, self.queue, self.sess, self.buf, deadline=Deadline(self.loop, 0), recorder=recorder)
+
+        self.loop.run_until_complete(go(Mock(channel_id=7)))
+        self.assertEqual(recorder.shed, {7})
+
+
+class DownloadChannelPagesTestCase(AsyncioTestCase):
+
+    def download(self, channel, session):
+        fut = FutureLite()
+        more_pages = self.loop.run_until_complete(download_channel_pages(channel, fut, session=session))
+        return fut, more_pages
+
+    def test_downloads_template_pages(self):
+        channel = Channel(id=1, url='http://host.com/', page_url_template='http://host.com/?p={page}', max_pages=3)
+        session = SessionStub()
+        fut, more_pages = self.download(channel, session)
+        self.assertEqual(len(more_pages), 2)
+        self.assertEqual([url for url, _ in session.calls],
+                         ['http://host.com/', 'http://host.com/?p=2', 'http://host.com/?p=3'])
+
+    def test_follows_next_page_links(self):
+        channel = Channel(id=1, url='http://host.com/', next_page_selector='//a[@rel="next"]/@href', max_pages=5)
+        session = PagedSessionStub({
+            'http://host.com/': b'<a rel="next" href="/2">Next</a>',
+            'http://host.com/2': b'<a rel="next" href="/3">Next</a>',
+            'http://host.com/3': b'<a rel="next" href="/2">Previous is not next</a>',
+        })
+        fut, more_pages = self.download(channel, session)
+        self.assertEqual(len(more_pages), 2)
+        self.assertEqual([url for url, _ in session.calls],
+                         ['http://host.com/', 'http://host.com/2', 'http://host.com/3'])
+
+    def test_stops_following_next_page_links_after_deadline(self):
+        channel = Channel(id=1, url='http://host.com/', next_page_selector='//a[@rel="next"]/@href', max_pages=5)
+        session = PagedSessionStub({'http://host.com/': b'<a rel="next" href="/2">Next</a>'})
+        more_pages = self.loop.run_until_complete(download_channel_pages(channel, FutureLite(), session=session,
+                                                                         deadline=Deadline(self.loop, 0)))
+        self.assertEqual(more_pages, [])
+        self.assertEqual([url for url, _ in session.calls], ['http://host.com/'])
+
+    def test_sends_channel_headers(self):
+        channel = Channel(id=1, url='http://host.com/', request_headers={'Cookie': 'adult=1'})
+        session = SessionStub()
+        self.download(channel, session)
+        _, kw = session.calls[0]
+        self.assertEqual(kw['headers'], {'Cookie': 'adult=1'})
+
+    def test_single_page_by_default(self):
+        channel = Channel(id=1, url='http://host.com/', next_page_selector='//a/@href')
+        fut, more_pages = self.download(channel, SessionStub())
+        self.assertEqual(more_pages, [])
+        self.assertTrue(fut.done())
+
 
 class SessionStub:
 
     def __init__(self, response=None):
         self.calls = []
-        self._response = response or ResponseStub('http://host.com/', '<html></html>')
+        self._response = response or ResponseStub('http://host.com/', b'<html></html>')
 
     def set_response(self, resp):
         self._response = resp
@@ -86,13 +368,27 @@ class SessionStub:
         pass
 
 
+class PagedSessionStub(SessionStub):
+
+    def __init__(self, pages):
+        super(PagedSessionStub, self).__init__()
+        self._pages = pages
+
+    def get(self, url, **kw):
+        self.calls.append((url, kw))
+        return ResponseStub(url, self._pages[url])
+
+
 class ResponseStub:
 
+    charset = 'utf-8'
+    headers = {}
+
     def __init__(self, url, rv):
         self.url = url
         self._rv = rv
 
-    async def text(self, *args, **kw):
+    async def read(self):
         if issubclass(type(self._rv), Exception):
             raise self._rv
         else:
@@ -0,0 +1,72 @@
+import os
+import tempfile
+import unittest
+
+from webscraper.archive import ResponseArchive, read_archive, index_archive, read_record, open_run_archive
+
+
+class ResponseStub:
+    url = 'http://host.com/final'
+    status = 200
+    reason = 'OK'
+    headers = {'Content-Type': 'text/html; charset=utf-8'}
+
+
+class ResponseArchiveTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tmpdir.name, 'test.warc.gz')
+
+    def tearDown(self):
+        self.tmpdir.cleanup()
+
+    def test_write_and_read(self):
+        body = b'<html>\r\n\r\nbody</html>'
+
+        with ResponseArchive(self.path) as archive:
+            archive.write('http://host.com/', ResponseStub(), body, kind='entry', channel=5)
+            archive.write('http://host.com/2', ResponseStub(), b'second')
+
+        first, second = list(read_archive(self.path))
+        self.assertEqual(first.url, 'http://host.com/')
+        self.assertEqual(first.final_url, 'http://host.com/final')
+        self.assertEqual(first.status, 200)
+        self.assertEqual(first.headers['Content-Type'], 'text/html; charset=utf-8')
+        self.assertEqual(first.body, body)
+        self.assertEqual(first.meta, {'kind': 'entry', 'channel': '5'})
+        self.assertEqual(second.body, b'second')
+
+    def test_leaves_out_headers_of_encoded_body(self):
+        response = ResponseStub()
+        response.headers = {'Content-Type': 'text/html', 'Content-Encoding': 'gzip', 'Content-Length': '10'}
+
+        with ResponseArchive(self.path) as archive:
+            archive.write('http://host.com/', response, b'decompressed body')
+
+        record, = read_archive(self.path)
+        self.assertEqual(set(record.headers), {'Content-Type'})
+
+    def test_appends_to_existing_archive(self):
+        for _ in range(2):
+            with ResponseArchive(self.path) as archive:
+                archive.write('http://host.com/', ResponseStub(), b'body')
+
+        self.assertEqual(len(list(read_archive(self.path))), 2)
+
+    def test_read_record_by_offset(self):
+        with ResponseArchive(self.path) as archive:
+            archive.write('http://host.com/', ResponseStub(), b'first')
+            archive.write('http://host.com/2', ResponseStub(), b'second')
+
+        index = list(index_archive(self.path))
+        self.assertEqual([r.body for offset, r in index], [b'first', b'second'])
+        self.assertEqual(index[0][0], 0)
+        self.assertEqual(read_record(self.path, index[1][0]).body, b'second')
+
+    def test_open_run_archive_creates_directory(self):
+        archive_dir = os.path.join(self.tmpdir.name, 'archive')
+
+        with open_run_archive(archive_dir) as archive:
+            self.assertTrue(archive.path.startswith(archive_dir))
+            self.assertTrue(os.path.exists(archive.path))
@@ -0,0 +1,79 @@
+import io
+import json
+from datetime import timedelta
+
+from django.test import TestCase
+
+from webscraper.channelio import (ChannelImportError, import_channels, read_channels, validate_channels,
+                                  write_channels)
+from webscraper.models import Channel
+from .util import CHANNEL_DEFAULTS, create_channel
+
+
+class ImportChannelsTestCase(TestCase):
+
+    def test_creates_channels_with_slugs(self):
+        rows = [dict(CHANNEL_DEFAULTS, url='http://ho.st/%d' % i) for i in range(3)]
+
+        with self.assertNumQueries(4):  # Slug check and insert, in test case transaction savepoint
+            import_channels(rows)
+
+        slugs = Channel.objects.values_list('slug', flat=True)
+        self.assertEqual(len(set(slugs)), 3)
+        self.assertTrue(all(len(slug) == 32 for slug in slugs))
+
+    def test_fills_in_model_defaults(self):
+        channel, = import_channels([{'title': 'Title', 'url': 'http://ho.st/', 'row_selector': '//a',
+                                     'url_selector': '@href', 'title_selector': 'text()'}])
+        self.assertEqual((channel.interval, channel.enabled, channel.max_pages), (Channel.I_1DAY, True, 1))
+        self.assertEqual(channel.request_headers, {})
+
+    def test_creates_nothing_if_any_row_is_invalid(self):
+        rows = [CHANNEL_DEFAULTS, dict(CHANNEL_DEFAULTS, row_selector='//a[', url='not an url')]
+
+        with self.assertRaises(ChannelImportError) as cm:
+            import_channels(rows)
+
+        (num, errors), = cm.exception.errors
+        self.assertEqual(num, 2)
+        self.assertEqual(set(errors), {'row_selector', 'url'})
+        self.assertEqual(Channel.objects.count(), 0)
+
+    def test_skip_existing(self):
+        create_channel(url='http://ho.st/1')
+        rows = [dict(CHANNEL_DEFAULTS, url='http://ho.st/1'), dict(CHANNEL_DEFAULTS, url='http://ho.st/2')]
+        channels = import_channels(rows, skip_existing=True)
+        self.assertEqual([channel.url for channel in channels], ['http://ho.st/2'])
+
+    def test_skip_existing_leaves_out_repeated_urls(self):
+        rows = [dict(CHANNEL_DEFAULTS, url='http://ho.st/1', title=title) for title in ('First', 'Second')]
+        channel, = import_channels(rows, skip_existing=True)
+        self.assertEqual(channel.title, 'First')
+
+
+class ChannelFormatsTestCase(TestCase):
+
+    def setUp(self):
+        self.channel = create_channel(max_age=timedelta(days=3), request_headers={'Referer': 'http://ho.st/'},
+                                      enabled=False)
+
+    def round_trip(self, fmt):
+        f = io.StringIO()
+        write_channels(f, [self.channel], fmt)
+        f.seek(0)
+        channel, = validate_channels(read_channels(f, fmt))
+        return channel
+
+    def test_json_round_trip(self):
+        channel = self.round_trip('json')
+        self.assertEqual((channel.url, channel.enabled, channel.max_age), (self.channel.url, False, timedelta(days=3)))
+        self.assertEqual(channel.request_headers, {'Referer': 'http://ho.st/'})
+
+    def test_csv_round_trip(self):
+        channel = self.round_trip('csv')
+        self.assertEqual((channel.url, channel.enabled, channel.max_age), (self.channel.url, False, timedelta(days=3)))
+        self.assertEqual((channel.request_headers, channel.max_entries), ({'Referer': 'http://ho.st/'}, None))
+
+    def test_json_must_be_list_of_objects(self):
+        with self.assertRaises(ValueError):
+            read_channels(io.StringIO(json.dumps({'url': 'http://ho.st/'})), 'json')
@@ -1,10 +1,21 @@
+import csv
+import json
+import os
+import tempfile
+from collections import Counter
 from unittest.mock import patch
 
 from django.test import TestCase
 from django.utils.six import StringIO
-from .util import create_channel
+from .util import CHANNEL_DEFAULTS, create_channel
 
+from django.core.management import CommandError
+from django.test import override_settings
+
+from webscraper.aiohttpdownloader import DownloadError
 from webscraper.management.commands.scrape import Command
+from webscraper.management.commands import reextract, prune, profile_channel, import_channels, export_channels
+from webscraper.models import Channel
 
 
 class ScrapeCommandTestCase(TestCase):
@@ -13,10 +24,165 @@ class ScrapeCommandTestCase(TestCase):
         self.stdout = StringIO()
         self.cmd = Command(stdout=self.stdout, no_color=True)
 
-    @patch('webscraper.management.commands.scrape.scrape')
+    @patch('webscraper.management.commands.scrape.scrape', return_value=Counter())
     def test_handle_calls_scrape(self, mocked_scrape):
         channel = create_channel()
         self.cmd.handle()
         self.assertEquals(mocked_scrape.call_count, 1)
         call_args, _ = mocked_scrape.call_args
         self.assertEquals(list(call_args[0]), [channel])
+
+    @patch('webscraper.management.commands.scrape.scrape', return_value=Counter(dns_lookups=2, dns_time=0.25))
+    def test_reports_dns_time(self, mocked_scrape):
+        self.cmd.handle()
+        self.assertIn('DNS: 2 lookups in 0.25s', self.stdout.getvalue())
+
+    @patch('webscraper.management.commands.scrape.scrape',
+           return_value=Counter(channels=3, channels_deferred=1, entries_shed=5))
+    def test_deferred_channels_are_not_counted_as_processed(self, mocked_scrape):
+        self.cmd.handle()
+        self.assertIn('Processed 2 channels', self.stdout.getvalue())
+        self.assertIn('5 entries of 1 more channels', self.stdout.getvalue())
+
+    @patch('webscraper.management.commands.scrape.scrape', return_value=Counter())
+    def test_profile_writes_report(self, mocked_scrape):
+        create_channel()
+
+        with tempfile.TemporaryDirectory() as tmpdir:
+            self.cmd.handle(profile=True, profile_dir=tmpdir)
+            _, kwargs = mocked_scrape.call_args
+            self.assertIsNotNone(kwargs['profiler'])
+            self.assertEqual(len([f for f in os.listdir(tmpdir) if f.endswith('.txt')]), 1)
+
+
+class ReextractCommandTestCase(TestCase):
+
+    def setUp(self):
+        self.stdout = StringIO()
+        self.cmd = reextract.Command(stdout=self.stdout, no_color=True)
+
+    @override_settings(SCRAPER_ARCHIVE_DIR=None)
+    def test_raises_without_archives(self):
+        with self.assertRaises(CommandError):
+            self.cmd.handle()
+
+    @patch('webscraper.management.commands.reextract.reextract')
+    def test_handle_calls_reextract(self, mocked_reextract):
+        mocked_reextract.return_value = {'channel_pages': 1, 'entry_pages': 2, 'entries_updated': 3}
+        self.cmd.handle(paths=['archive.warc.gz'], processes=2)
+        mocked_reextract.assert_called_once_with(['archive.warc.gz'], processes=2)
+        self.assertIn('updated 3 entries', self.stdout.getvalue())
+
+
+class PruneCommandTestCase(TestCase):
+
+    def setUp(self):
+        self.stdout = StringIO()
+        self.cmd = prune.Command(stdout=self.stdout, no_color=True)
+
+    @patch('webscraper.management.commands.prune.prune')
+    def test_handle_filters_channels_by_slug(self, mocked_prune):
+        channel = create_channel()
+        create_channel()
+        mocked_prune.return_value = {'entries': 0, 'channels': 0}
+        self.cmd.handle(channels=[channel.slug])
+        call_args, _ = mocked_prune.call_args
+        self.assertEqual(list(call_args[0]), [channel])
+
+
+class ProfileChannelCommandTestCase(TestCase):
+
+    def setUp(self):
+        self.stdout = StringIO()
+        self.cmd = profile_channel.Command(stdout=self.stdout, no_color=True)
+
+    def test_profiles_page_from_file(self):
+        channel = create_channel(row_selector='//a[@href]', url_selector='@href', title_selector='text()')
+
+        with tempfile.NamedTemporaryFile(suffix='.html') as f:
+            f.write(b'<html><body><a href="/1">One</a><a href="/2">Two</a></body></html>')
+            f.flush()
+            self.cmd.handle(slug=channel.slug, file=f.name, repeat=2)
+
+        output = self.stdout.getvalue()
+        self.assertIn('2 rows', output)
+        self.assertIn('row_selector', output)
+        self.assertIn('Slowest selector', output)
+
+    def test_raises_for_unknown_channel(self):
+        with self.assertRaises(CommandError):
+            self.cmd.handle(slug='nonexistent')
+
+    def test_raises_for_repeat_below_one(self):
+        with self.assertRaises(CommandError):
+            self.cmd.handle(slug=create_channel().slug, repeat=0)
+
+    def test_raises_for_missing_file(self):
+        with self.assertRaises(CommandError):
+            self.cmd.handle(slug=create_channel().slug, file='/nonexistent/page.html')
+
+    @patch('webscraper.management.commands.profile_channel.fetch')
+    def test_downloads_with_channel_request_headers(self, fetch):
+        channel = create_channel(request_headers={'Cookie': 'a=1'})
+        fetch.side_effect = DownloadError('failed')
+
+        with self.assertRaises(CommandError):
+            self.cmd.handle(slug=channel.slug)
+
+        _, kwargs = fetch.call_args
+        self.assertEqual(kwargs['headers'], {'Cookie': 'a=1'})
+
+
+class ChannelImportExportCommandTestCase(TestCase):
+
+    def setUp(self):
+        self.stdout, self.stderr = StringIO(), StringIO()
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmpdir.cleanup)
+
+    def export(self, fmt, channels=()):
+        path = os.path.join(self.tmpdir.name, 'channels.' + fmt)
+        cmd = export_channels.Command(stdout=StringIO(), no_color=True)
+        cmd.handle(channels=list(channels), format=fmt)
+
+        with open(path, 'w') as f:
+            f.write(cmd.stdout._out.getvalue())
+
+        return path
+
+    def import_(self, path, **options):
+        cmd = import_channels.Command(stdout=self.stdout, stderr=self.stderr, no_color=True)
+        cmd.handle(path=path, **options)
+
+    def test_export_and_import(self):
+        for fmt in ('json', 'csv'):
+            channel = create_channel(title='Exported ' + fmt)
+            path = self.export(fmt, [channel.slug])
+            self.import_(path)
+            self.assertEqual(Channel.objects.filter(title='Exported ' + fmt).count(), 2)
+
+    def test_dry_run_creates_nothing(self):
+        create_channel()
+        self.import_(self.export('json'), dry_run=True)
+        self.assertEqual(Channel.objects.count(), 1)
+        self.assertIn('1 valid channels', self.stdout.getvalue())
+
+    def test_reports_invalid_channels(self):
+        path = os.path.join(self.tmpdir.name, 'channels.json')
+
+        with open(path, 'w') as f:
+            json.dump([dict(CHANNEL_DEFAULTS, title_selector='text(')], f)
+
+        with self.assertRaises(CommandError):
+            self.import_(path)
+
+        self.assertIn('Channel #1 title_selector', self.stderr.getvalue())
+
+    def test_raises_for_malformed_csv(self):
+        path = os.path.join(self.tmpdir.name, 'channels.csv')
+
+        with open(path, 'w') as f:
+            f.write('title,url\n"%s",http://ho.st/\n' % ('x' * (csv.field_size_limit() + 1)))
+
+        with self.assertRaises(CommandError):
+            self.import_(path)
@@ -0,0 +1,56 @@
+import asyncio
+
+from webscraper.concurrency import AdaptiveLimiter, WINDOW_SIZE
+from .util import AsyncioTestCase
+
+
+class AdaptiveLimiterTestCase(AsyncioTestCase):
+
+    def setUp(self):
+        super(AdaptiveLimiterTestCase, self).setUp()
+        self.stats = {}
+        self.limiter = AdaptiveLimiter(floor=2, ceiling=8, initial=4, stats=self.stats, loop=self.loop)
+
+    def record_window(self, latency, error=False):
+        for _ in range(WINDOW_SIZE):
+            self.limiter.record(latency, error)
+
+    def test_initial_limit_is_clamped(self):
+        limiter = AdaptiveLimiter(floor=2, ceiling=8, initial=100, loop=self.loop)
+        self.assertEqual(limiter.limit, 8)
+
+    def test_increases_on_healthy_window(self):
+        self.record_window(0.1)
+        self.assertEqual(self.limiter.limit, 5)
+
+    def test_decreases_on_errors(self):
+        self.record_window(0.1, error=True)
+        self.assertEqual(self.limiter.limit, 3)
+
+    def test_decreases_on_latency_growth(self):
+        self.record_window(0.1)
+        self.record_window(1.0)
+        self.assertEqual(self.limiter.limit, 3)
+
+    def test_respects_floor(self):
+        for _ in range(10):
+            self.record_window(0.1, error=True)
+        self.assertEqual(self.limiter.limit, 2)
+
+    def test_exposes_limit_in_stats(self):
+        self.record_window(0.1)
+        self.assertEqual(self.stats['entry_limit'], self.limiter.limit)
+
+    def test_wait_turn_blocks_workers_above_limit(self):
+        with self.assertRaises(asyncio.TimeoutError):
+            self.loop.run_until_complete(asyncio.wait_for(self.limiter.wait_turn(6), 0.01, loop=self.loop))
+
+    def test_drain_releases_all_workers(self):
+
+        async def go():
+            waiter = asyncio.ensure_future(self.limiter.wait_turn(6), loop=self.loop)
+            await asyncio.sleep(0, loop=self.loop)
+            self.limiter.drain()
+            await asyncio.wait_for(waiter, 1, loop=self.loop)
+
+        self.loop.run_until_complete(go())
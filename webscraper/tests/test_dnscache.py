@@ -0,0 +1,128 @@
+import asyncio
+import os
+import tempfile
+import time
+import unittest
+from collections import namedtuple
+
+from aiodns.error import DNSError
+
+from webscraper.dnscache import DnsCache, CachingResolver, TTL_MIN, TTL_MAX
+from .util import AsyncioTestCase
+
+
+Record = namedtuple('Record', 'host ttl')
+
+
+class DnsCacheTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.cache = DnsCache()
+
+    def test_unknown_host(self):
+        self.assertIsNone(self.cache.get('host.com'))
+
+    def test_record_expires_after_ttl(self):
+        self.cache.put('host.com', ['10.0.0.1'], ttl=600, now=1000)
+        self.assertEqual(self.cache.get('host.com', now=1599), ['10.0.0.1'])
+        self.assertIsNone(self.cache.get('host.com', now=1600))
+
+    def test_ttl_is_bounded(self):
+        self.cache.put('short.com', ['10.0.0.1'], ttl=0, now=0)
+        self.cache.put('long.com', ['10.0.0.2'], ttl=10 ** 6, now=0)
+        self.assertIsNotNone(self.cache.get('short.com', now=TTL_MIN - 1))
+        self.assertIsNone(self.cache.get('long.com', now=TTL_MAX))
+
+    def test_save_and_load_keeps_unexpired_records(self):
+        self.cache.put('host.com', ['10.0.0.1'], ttl=600)
+        self.cache.put('gone.com', ['10.0.0.2'], ttl=600, now=0)
+
+        with tempfile.TemporaryDirectory() as tmpdir:
+            path = os.path.join(tmpdir, 'dns.json')
+            self.cache.save(path)
+            loaded = DnsCache.load(path)
+
+        self.assertEqual(len(loaded), 1)
+        self.assertEqual(loaded.get('host.com'), ['10.0.0.1'])
+
+    def test_load_missing_file_starts_empty(self):
+        self.assertEqual(len(DnsCache.load('/non/existent/path.json')), 0)
+
+
+class CachingResolverTestCase(AsyncioTestCase):
+
+    def setUp(self):
+        super(CachingResolverTestCase, self).setUp()
+        self.dns = DNSResolverStub({'host.com': [Record('10.0.0.1', 300), Record('10.0.0.2', 100)]})
+        self.resolver = CachingResolver(DnsCache(), resolver=self.dns)
+
+    def resolve(self, host):
+        return self.loop.run_until_complete(self.resolver.resolve(host, 80))
+
+    def test_resolves_and_caches(self):
+        hosts = self.resolve('host.com')
+        self.assertEqual([(h['host'], h['port']) for h in hosts], [('10.0.0.1', 80), ('10.0.0.2', 80)])
+        self.resolve('host.com')
+        self.assertEqual(self.dns.queries, ['host.com'])
+        self.assertEqual((self.resolver.stats['dns_lookups'], self.resolver.stats['dns_cache_hits']), (1, 1))
+
+    def test_caches_for_shortest_ttl(self):
+        self.resolve('host.com')
+        expires, _ = self.resolver.cache.to_dict()['host.com']
+        self.assertAlmostEqual(expires - time.time(), 100, delta=5)
+
+    def test_concurrent_lookups_share_query(self):
+
+        async def go():
+            return await asyncio.gather(self.resolver.resolve('host.com'), self.resolver.resolve('host.com'))
+
+        first, second = self.loop.run_until_complete(go())
+        self.assertEqual(first, second)
+        self.assertEqual(self.dns.queries, ['host.com'])
+
+    def test_cancelled_lookup_does_not_cancel_shared_query(self):
+
+        async def go():
+            first = asyncio.ensure_future(self.resolver.resolve('host.com'))
+            second = asyncio.ensure_future(self.resolver.resolve('host.com'))
+            await asyncio.sleep(0)
+            first.cancel()
+            return await second
+
+        self.assertEqual(len(self.loop.run_until_complete(go())), 2)
+        self.assertEqual(self.dns.queries, ['host.com'])
+        self.assertEqual(self.resolver._pending, {})
+
+    def test_failed_lookup_is_not_cached(self):
+        with self.assertRaises(DNSError):
+            self.resolve('missing.com')
+
+        self.assertIsNone(self.resolver.cache.get('missing.com'))
+        self.assertEqual(self.resolver.stats['dns_lookups'], 1)
+        self.assertEqual(self.resolver._pending, {})
+
+    def test_prefetch_skips_cached_hosts_and_addresses(self):
+        self.resolver.cache.put('cached.com', ['10.0.0.3'], ttl=300)
+        resolved = self.loop.run_until_complete(
+            self.resolver.prefetch(['host.com', 'missing.com', 'cached.com', '10.0.0.4', None]))
+        self.assertEqual(resolved, 2)
+        self.assertEqual(sorted(self.dns.queries), ['host.com', 'missing.com'])
+
+
+class DNSResolverStub:
+
+    def __init__(self, records):
+        self.queries = []
+        self._records = records
+
+    async def query(self, host, qtype):
+        self.queries.append(host)
+        await asyncio.sleep(0)
+
+        if host not in self._records:
+            raise DNSError(4, 'Domain name not found')
+
+        return self._records[host]
+
+    def cancel(self):
+        pass
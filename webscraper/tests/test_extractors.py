@@ -93,6 +93,18 @@ class RegexExtractorTestCase(unittest.TestCase):
         doc = '''<html><script>var url='path/to/file.doc';</script></html>'''
         self.assertEquals(ex.extract(doc, '/'), ['/path/to/file.doc'])
 
+    def test_extracts_from_bytes(self):
+        ex = RegexExtractor(['doc'])
+        doc = '<script>var url="путь/file.doc";</script>'
+        self.assertEquals(ex.extract(doc.encode('utf-8'), '/', 'utf-8'), ['/путь/file.doc'])
+        self.assertEquals(ex.extract(doc.encode('utf-16'), '/', 'utf-16'), ['/путь/file.doc'])
+
+    def test_bytes_matches_leave_out_non_word_characters(self):
+        ex = RegexExtractor(['doc'])
+        doc = '<p>«a.doc»\u00a0b.doc</p>'
+        self.assertEquals(ex.extract(doc.encode('utf-8'), '/', 'utf-8'), ex.extract(doc, '/'))
+        self.assertEquals(ex.extract(doc.encode('utf-8'), '/', 'utf-8'), ['/a.doc', '/b.doc'])
+
 
 class EntryExtractorTestCase(unittest.TestCase):
 
@@ -144,6 +156,18 @@ class UtilTestCase(unittest.TestCase):
         rv = ensure_element('<p>test</p>')
         self.assertIs(rv, ensure_element(rv))
 
+    def test_ensure_element_parses_bytes_in_given_encoding(self):
+        rv = ensure_element('<p>тест</p>'.encode('koi8-r'), encoding='koi8-r')
+        self.assertEqual(rv.text_content(), 'тест')
+
+    def test_ensure_element_decodes_encodings_unknown_to_libxml2(self):
+        rv = ensure_element('<p>テスト</p>'.encode('euc_jp'), encoding='euc_jp')
+        self.assertEqual(rv.text_content(), 'テスト')
+
+    def test_ensure_element_uses_meta_charset(self):
+        rv = ensure_element('<meta charset="cp1251"><p>тест</p>'.encode('cp1251'))
+        self.assertEqual(rv.xpath('string(//p)'), 'тест')
+
     def test_ensure_element_raises_on_invalid_doc(self):
         with self.assertRaises(ParseError):
             ensure_element(None)
@@ -0,0 +1,31 @@
+import unittest
+
+from webscraper.fingerprint import bands, entry_fingerprint, hamming, simhash
+
+
+ITEMS = {'images': ['http://host.com/a/%d.jpg' % i for i in range(10)], 'videos': ['http://host.com/v/clip.mp4']}
+
+
+class FingerprintTestCase(unittest.TestCase):
+
+    def test_ignores_hosts_and_paths(self):
+        mirrored = {kind: [url.replace('host.com/a', 'mirror.net/b') for url in urls] for kind, urls in ITEMS.items()}
+        self.assertEqual(entry_fingerprint('Some title', ITEMS), entry_fingerprint('Some title', mirrored))
+
+    def test_similar_content_is_close(self):
+        fingerprint = entry_fingerprint('Some title', ITEMS)
+        similar = entry_fingerprint('Some title', dict(ITEMS, images=ITEMS['images'][:-1]))
+        other = entry_fingerprint('Other', {'images': ['http://host.com/%d.png' % i for i in range(10)]})
+        self.assertLess(hamming(fingerprint, similar), hamming(fingerprint, other))
+
+    def test_none_without_media(self):
+        self.assertIsNone(entry_fingerprint('Some title', {'images': [], 'videos': []}))
+        self.assertIsNone(entry_fingerprint('Some title', None))
+
+    def test_fits_signed_bigint(self):
+        for i in range(100):
+            self.assertTrue(-2 ** 63 <= simhash([str(i)]) < 2 ** 63)
+
+    def test_bands_of_negative_fingerprint(self):
+        self.assertEqual(bands(-1), [65535] * 4)
+        self.assertEqual(bands(0x0001000200030004), [4, 3, 2, 1])
@@ -47,3 +47,8 @@ class BrightFutureTestCase(unittest.TestCase):
     def test_result_raises_if_pending(self):
         with self.assertRaises(InvalidStateError):
             self.fut.result()
+
+    def test_exception_returns_exception(self):
+        exc = Exception()
+        self.fut.set_exception(exc)
+        self.assertIs(self.fut.exception(), exc)
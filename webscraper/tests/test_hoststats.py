@@ -0,0 +1,73 @@
+import os
+import tempfile
+import unittest
+
+from webscraper.hoststats import (HostLatency, percentile, host_of, MIN_SAMPLES, SAMPLE_SIZE, TIMEOUT_MIN,
+                                  TIMEOUT_MAX)
+
+
+class HostLatencyTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.latency = HostLatency(default_timeout=6)
+
+    def record(self, url, value, times=MIN_SAMPLES):
+        for _ in range(times):
+            self.latency.record(url, value)
+
+    def test_default_timeout_for_unknown_host(self):
+        self.assertEqual(self.latency.timeout('http://host.com/'), 6)
+
+    def test_default_timeout_until_enough_samples(self):
+        self.record('http://host.com/', 1, times=MIN_SAMPLES - 1)
+        self.assertEqual(self.latency.timeout('http://host.com/'), 6)
+
+    def test_timeout_follows_latency(self):
+        self.record('http://host.com/1', 1.5)
+        self.assertEqual(self.latency.timeout('http://host.com/2'), 4.5)
+
+    def test_timeout_is_bounded(self):
+        self.record('http://fast.com/', 0.01)
+        self.record('http://slow.com/', 60)
+        self.assertEqual(self.latency.timeout('http://fast.com/'), TIMEOUT_MIN)
+        self.assertEqual(self.latency.timeout('http://slow.com/'), TIMEOUT_MAX)
+
+    def test_timeouts_do_not_count_as_latency(self):
+        self.record('http://host.com/', 1.5)
+        self.latency.record_timeout('http://host.com/')
+        self.assertEqual(self.latency.timeout('http://host.com/'), 4.5)
+
+    def test_frequent_timeouts_cap_timeout_at_default(self):
+        self.record('http://slow.com/', 10)
+
+        for _ in range(MIN_SAMPLES):
+            self.latency.record_timeout('http://slow.com/')
+            self.latency.record_timeout('http://dead.com/')
+
+        self.assertEqual(self.latency.timeout('http://slow.com/'), 6)
+        self.assertEqual(self.latency.timeout('http://dead.com/'), 6)
+
+        self.record('http://slow.com/', 10, times=SAMPLE_SIZE)
+        self.assertEqual(self.latency.timeout('http://slow.com/'), TIMEOUT_MAX)
+
+    def test_save_and_load(self):
+        self.record('http://host.com/', 1.5)
+        self.latency.record_timeout('http://host.com/')
+
+        with tempfile.TemporaryDirectory() as tmpdir:
+            path = os.path.join(tmpdir, 'latency.json')
+            self.latency.save(path)
+            loaded = HostLatency.load(path, default_timeout=6)
+
+        self.assertEqual(loaded.to_dict(), self.latency.to_dict())
+
+    def test_load_missing_file_starts_empty(self):
+        loaded = HostLatency.load('/non/existent/path.json', default_timeout=6)
+        self.assertEqual(len(loaded), 0)
+
+    def test_percentile(self):
+        self.assertEqual(percentile(range(1, 101), 0.95), 95)
+        self.assertEqual(percentile([3], 0.95), 3)
+
+    def test_host_of(self):
+        self.assertEqual(host_of('http://Host.com:8080/path'), 'host.com')
@@ -3,7 +3,8 @@ from django.db import connection
 from django.conf import settings
 
 from webscraper.models import Entry
-from webscraper.insbuffer import InsertBuffer, split_chunk
+from webscraper.insbuffer import InsertBuffer, CopyWriter, split_chunk, copy_value
+from webscraper.records import EntryRecord
 from .util import create_channel, ENTRY_DEFAULTS
 
 
@@ -33,11 +34,67 @@ class InsertBufferTestCase(TestCase):
         self.assertEqual(num_queries, 2)
         self.assertEqual(len(self.buf), 0)
 
+    def test_inserts_records_as_models(self):
+        with self.buf as buffer:
+            buffer.add(EntryRecord(self.channel.id, 'http://ho.st/1', 'Title'))
+            buffer.add(Entry(channel=self.channel, **ENTRY_DEFAULTS))
+
+        self.assertEqual(len(self.channel.entry_set.all()), 2)
+
+    def test_calls_on_insert_with_inserted_models(self):
+        inserted = []
+        buf = InsertBuffer(3, on_insert=inserted.extend)
+
+        with buf as buffer:
+            buffer.add(EntryRecord(self.channel.id, 'http://ho.st/1', 'Title'))
+
+        self.assertEqual(len(inserted), 1)
+        self.assertIsInstance(inserted[0], Entry)
+
     def test_len(self):
         for _ in range(2):
             self.buf.add(Entry(channel=self.channel, **ENTRY_DEFAULTS))
         self.assertEquals(len(self.buf), 2)
 
+    def test_copy_writer_inserts(self):
+        buf = InsertBuffer(3, writer=CopyWriter())
+
+        with buf as buffer:
+            for i in range(5):
+                buffer.add(EntryRecord(self.channel.id, 'http://ho.st/%d' % i, 'Title\twith\ttabs',
+                                       items={'images': ['1.jpg']}))
+
+        entries = self.channel.entry_set.order_by('url')
+        self.assertEqual(len(entries), 5)
+        self.assertEqual(entries[0].title, 'Title\twith\ttabs')
+        self.assertEqual(entries[0].items, {'images': ['1.jpg']})
+        self.assertIsNotNone(entries[0].added)
+
+    def test_copy_writer_skips_duplicates(self):
+        Entry.objects.create(channel=self.channel, **ENTRY_DEFAULTS)
+        inserted = []
+
+        with InsertBuffer(3, writer=CopyWriter(), on_insert=inserted.extend) as buffer:
+            buffer.add(Entry(channel=self.channel, **ENTRY_DEFAULTS))
+            buffer.add(EntryRecord(self.channel.id, 'http://ho.st/new', 'Title'))
+
+        self.assertEqual(len(self.channel.entry_set.all()), 2)
+        self.assertEqual([entry.url for entry in inserted], ['http://ho.st/new'])
+        self.assertEqual(inserted[0].pk, self.channel.entry_set.get(url='http://ho.st/new').pk)
+
+    def test_copy_writer_reuses_staging_table(self):
+        writer = CopyWriter()
+        writer.write(Entry, [Entry(channel=self.channel, url='http://ho.st/1', title='One')])
+        writer.write(Entry, [Entry(channel=self.channel, url='http://ho.st/2', title='Two')])
+        statements = [q['sql'] for q in connection.queries]
+        self.assertFalse([sql for sql in statements if sql.startswith('DROP')])
+        self.assertEqual(self.channel.entry_set.count(), 2)
+
+    def test_copy_value_escapes(self):
+        self.assertEqual(copy_value(None), '\\N')
+        self.assertEqual(copy_value('a\tb\nc\\'), 'a\\tb\\nc\\\\')
+        self.assertEqual(copy_value(True), 't')
+
     def test_split_chunk_splits(self):
         val = [1, 2, 3]
         chunk, remainder = split_chunk(val, 2)
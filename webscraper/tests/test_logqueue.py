@@ -0,0 +1,76 @@
+import logging
+import os
+import tempfile
+import unittest
+from unittest.mock import patch
+
+from webscraper.logqueue import QueueListenerHandler, SamplingFilter
+
+
+class QueueListenerHandlerTestCase(unittest.TestCase):
+
+    def setUp(self):
+        tmpdir = tempfile.TemporaryDirectory()
+        self.addCleanup(tmpdir.cleanup)
+        self.path = os.path.join(tmpdir.name, 'test.log')
+        self.logger = logging.getLogger('webscraper.tests.logqueue')
+        self.logger.propagate = False
+        self.logger.setLevel(logging.INFO)
+
+    def test_writes_formatted_records_through_target(self):
+        handler = QueueListenerHandler('logging.FileHandler', filename=self.path, delay=True)
+        handler.setFormatter(logging.Formatter('%(levelname)s %(message)s'))
+        self.logger.addHandler(handler)
+
+        try:
+            self.logger.info('%d entries in %r', 3, 'channel')
+            self.logger.debug('Not logged %s', 'at all')
+
+        finally:
+            self.logger.removeHandler(handler)
+            handler.close()
+
+        with open(self.path) as f:
+            self.assertEqual(f.read(), "INFO 3 entries in 'channel'\n")
+
+    def test_forked_process_writes_directly(self):
+        handler = QueueListenerHandler('logging.FileHandler', filename=self.path, delay=True)
+        handler.setFormatter(logging.Formatter('%(levelname)s %(message)s'))
+        self.logger.addHandler(handler)
+
+        try:
+            with patch('webscraper.logqueue.os.getpid', return_value=-1):
+                self.logger.warning('From %s', 'worker')
+
+                with open(self.path) as f:
+                    self.assertEqual(f.read(), 'WARNING From worker\n')
+
+                self.assertTrue(handler.queue.empty())
+
+        finally:
+            self.logger.removeHandler(handler)
+            handler.close()
+
+    def test_close_is_idempotent(self):
+        handler = QueueListenerHandler('logging.FileHandler', filename=self.path, delay=True)
+        handler.close()
+        handler.close()
+
+
+class SamplingFilterTestCase(unittest.TestCase):
+
+    def record(self, level):
+        return logging.LogRecord('webscraper', level, __file__, 1, 'message', None, None)
+
+    def test_passes_all_at_full_rate(self):
+        self.assertTrue(SamplingFilter(rate=1).filter(self.record(logging.INFO)))
+
+    def test_samples_records_below_level(self):
+        sample_filter = SamplingFilter(rate=0.25)
+
+        with patch('webscraper.logqueue.random.random', side_effect=[0.1, 0.5]):
+            self.assertTrue(sample_filter.filter(self.record(logging.INFO)))
+            self.assertFalse(sample_filter.filter(self.record(logging.INFO)))
+
+    def test_always_passes_warnings(self):
+        self.assertTrue(SamplingFilter(rate=0).filter(self.record(logging.WARNING)))
@@ -1,6 +1,10 @@
+from collections import Counter
+from datetime import timedelta
+
 from django.test import TestCase
+from django.utils import timezone
 
-from webscraper.models import Channel, Entry
+from webscraper.models import Channel, Entry, MediaItem
 from .util import create_channel, create_entry, ENTRY_DEFAULTS
 
 
@@ -13,6 +17,24 @@ class ChannelManagerTestCase(TestCase):
         self.assertIn(c1, channels)
         self.assertNotIn(c2, channels)
 
+    def test_due_returns_least_recently_scraped_first(self):
+        now = timezone.now()
+        c1 = create_channel(scraped=now)
+        c2 = create_channel(scraped=None)
+        c3 = create_channel(scraped=now - timedelta(hours=1))
+        self.assertEqual(list(Channel.objects.due()), [c2, c3, c1])
+
+    def test_due_skips_auto_channels_until_interval_passed(self):
+        now = timezone.now()
+        fields = {'interval': Channel.I_AUTO, 'auto_interval': timedelta(hours=2)}
+        waiting = create_channel(scraped=now - timedelta(hours=1), **fields)
+        due = create_channel(scraped=now - timedelta(hours=3), **fields)
+        never_scraped = create_channel(interval=Channel.I_AUTO)
+        channels = list(Channel.objects.due(now))
+        self.assertNotIn(waiting, channels)
+        self.assertIn(due, channels)
+        self.assertIn(never_scraped, channels)
+
 
 class EntryManagerTestCase(TestCase):
 
@@ -31,6 +53,15 @@ class EntryManagerTestCase(TestCase):
         Entry.objects.track_entries(self.channel, [])
         self.assertEqual(len(self.channel.entry_set.all()), 0)
 
+    def test_track_keeps_missing_entries_unless_told_to_delete(self):
+        Entry.objects.track_entries(self.channel, [], delete_missing=False)
+        self.assertEqual(len(self.channel.entry_set.all()), 1)
+
+    def test_track_counts_deleted_entries(self):
+        stats = Counter()
+        Entry.objects.track_entries(self.channel, [], stats)
+        self.assertEqual(stats['entries_deleted'], 1)
+
     def test_get_id_url_for_channel_returns_fields(self):
         resultset = Entry.objects.get_id_url_for_channel(self.channel)
 
@@ -63,3 +94,111 @@ class EntryManagerTestCase(TestCase):
 
         self.assertEqual(len(entries), 0)
         self.assertEqual(len(c2_entries), 1)
+
+    def test_bulk_update_by_url(self):
+        rows = [{'channel_id': self.channel.id, 'url': self.old_entry.url, 'status': Entry.ST_OK,
+                 'items': {'images': ['new.jpg']}}]
+        updated = Entry.objects.bulk_update_by_url(rows, ['status', 'items'])
+        self.old_entry.refresh_from_db()
+        self.assertEqual(updated, 1)
+        self.assertEqual(self.old_entry.status, Entry.ST_OK)
+        self.assertEqual(self.old_entry.items, {'images': ['new.jpg']})
+
+    def test_bulk_update_by_url_filters_by_channel(self):
+        c2 = create_channel()
+        rows = [{'channel_id': c2.id, 'url': self.old_entry.url, 'title': 'Changed'}]
+        self.assertEqual(Entry.objects.bulk_update_by_url(rows, ['title']), 0)
+
+    def test_with_media_filters_by_kind(self):
+        e2 = create_entry(channel=self.channel)
+        MediaItem.objects.create(entry=e2, kind=MediaItem.K_VIDEOS, url='http://ho.st/1.mp4', position=0)
+        MediaItem.objects.create(entry=e2, kind=MediaItem.K_VIDEOS, url='http://ho.st/2.mp4', position=1)
+        self.assertEqual(list(Entry.objects.with_media(MediaItem.K_VIDEOS)), [e2])
+        self.assertEqual(list(Entry.objects.with_media(MediaItem.K_STREAMING)), [])
+
+
+class EntryDuplicatesTestCase(TestCase):
+
+    def setUp(self):
+        self.channel = create_channel()
+        self.original = create_entry(channel=self.channel, url='http://ho.st/1', fingerprint=0b1011)
+
+    def test_links_near_duplicates_to_earliest_entry(self):
+        entries = [create_entry(channel=self.channel, url='http://ho.st/%d' % i, fingerprint=fp)
+                   for i, fp in [(2, 0b1010), (3, 0b1011), (4, -1)]]
+        linked = Entry.objects.link_duplicates(entries, 1)
+
+        self.assertEqual(linked, entries[:2])
+        self.assertEqual([e.duplicate_of_id for e in Entry.objects.filter(pk__in=[e.pk for e in entries])
+                          .order_by('pk')], [self.original.pk, self.original.pk, None])
+        self.assertIsNone(Entry.objects.get(pk=entries[0].pk).items)
+
+    def test_links_within_batch(self):
+        entries = [create_entry(channel=self.channel, url='http://ho.st/%d' % i, fingerprint=-8) for i in (2, 3)]
+        Entry.objects.link_duplicates(entries, 0)
+        self.assertEqual(Entry.objects.get(pk=entries[1].pk).duplicate_of_id, entries[0].pk)
+
+    def test_finds_entries_inserted_without_ids(self):
+        create_entry(channel=self.channel, url='http://ho.st/2', fingerprint=0b1011)
+        linked = Entry.objects.link_duplicates([Entry(channel=self.channel, url='http://ho.st/2',
+                                                      fingerprint=0b1011)], 0)
+        self.assertEqual(linked[0].duplicate_of_id, self.original.pk)
+
+    def test_deleting_original_promotes_earliest_duplicate(self):
+        other_channel = create_channel()
+        first, second = [create_entry(channel=other_channel, url='http://mirr.or/%d' % i, items=None,
+                                      duplicate_of=self.original) for i in (1, 2)]
+        MediaItem.objects.create_for_entries([self.original])
+        Entry.objects.track_entries(self.channel, [])
+
+        first.refresh_from_db()
+        second.refresh_from_db()
+        self.assertEqual((first.duplicate_of_id, first.items), (None, ENTRY_DEFAULTS['items']))
+        self.assertEqual((second.duplicate_of_id, second.items), (first.pk, None))
+        self.assertEqual(MediaItem.objects.filter(entry=first).count(), 4)
+
+    def test_band_lookup(self):
+        create_entry(channel=self.channel, url='http://ho.st/2', fingerprint=0x7fff7fff7fff7fff)
+        matches = Entry.objects.fingerprint_matches([0b1000], [self.channel.id])
+        self.assertEqual(matches, [(self.original.pk, self.channel.id, 0b1011)])
+
+    def test_does_not_link_entries_of_other_channels(self):
+        entry = create_entry(channel=create_channel(), url='http://ho.st/1', fingerprint=0b1011)
+        self.assertEqual(Entry.objects.link_duplicates([entry], 0), [])
+        self.assertEqual(Entry.objects.fingerprint_matches([0b1011], [entry.channel_id]),
+                         [(entry.pk, entry.channel_id, 0b1011)])
+
+
+class MediaItemManagerTestCase(TestCase):
+
+    def setUp(self):
+        self.channel = create_channel()
+        self.entry = create_entry(channel=self.channel, url='http://ho.st/entry',
+                                  items={'images': ['http://ho.st/1.jpg', 'http://ho.st/2.jpg'],
+                                         'videos': ['http://ho.st/1.mp4']})
+
+    def test_create_for_entries_creates_item_per_url(self):
+        MediaItem.objects.create_for_entries([self.entry])
+        rv = MediaItem.objects.filter(entry=self.entry).order_by('kind', 'position')
+        self.assertEqual([(m.kind, m.url, m.position) for m in rv], [
+            ('images', 'http://ho.st/1.jpg', 0),
+            ('images', 'http://ho.st/2.jpg', 1),
+            ('videos', 'http://ho.st/1.mp4', 0),
+        ])
+
+    def test_create_for_entries_looks_up_missing_ids(self):
+        unsaved = Entry(channel_id=self.channel.id, url=self.entry.url, items=self.entry.items)
+        MediaItem.objects.create_for_entries([unsaved])
+        self.assertEqual(MediaItem.objects.filter(entry=self.entry).count(), 3)
+
+    def test_rebuild_for_entries_replaces_items(self):
+        MediaItem.objects.create_for_entries([self.entry])
+        self.entry.items = {'streaming': ['http://ho.st/s.mp4']}
+        MediaItem.objects.rebuild_for_entries([self.entry])
+        self.assertEqual(list(MediaItem.objects.filter(entry=self.entry).values_list('kind', 'url')),
+                         [('streaming', 'http://ho.st/s.mp4')])
+
+    def test_shared_urls_counts_entries(self):
+        e2 = create_entry(channel=self.channel, items={'images': ['http://ho.st/1.jpg']})
+        MediaItem.objects.create_for_entries([self.entry, e2])
+        self.assertEqual(list(MediaItem.objects.shared_urls()), [{'url': 'http://ho.st/1.jpg', 'entries': 2}])
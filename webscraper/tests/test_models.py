@@ -1,3 +1,5 @@
+from unittest.mock import patch
+
 from django.test import TestCase
 
 from webscraper.models import Channel, Entry
@@ -24,6 +26,41 @@ class ChannelTestCase(TestCase):
         other_channel.save()
         self.assertNotEqual(channel.slug, other_channel.slug)
 
+    def test_make_slugs_replaces_taken_ones(self):
+        taken = create_channel().slug
+
+        with patch('webscraper.models.get_random_string', side_effect=[taken, 'a' * 32, 'b' * 32]):
+            self.assertEqual(sorted(Channel.make_slugs(2)), ['a' * 32, 'b' * 32])
+
+    def test_adapt_interval_backs_off_without_changes(self):
+        channel = Channel(**CHANNEL_DEFAULTS)
+        channel.adapt_interval(changed=False)
+        self.assertEqual(channel.auto_interval, Channel.AUTO_INTERVAL_INITIAL * Channel.AUTO_BACKOFF)
+        self.assertEqual((channel.polls, channel.changes), (1, 0))
+
+    def test_adapt_interval_speeds_up_on_changes(self):
+        channel = Channel(**CHANNEL_DEFAULTS)
+        channel.adapt_interval(changed=True)
+        self.assertEqual(channel.auto_interval, Channel.AUTO_INTERVAL_INITIAL * Channel.AUTO_SPEEDUP)
+        self.assertEqual((channel.polls, channel.changes), (1, 1))
+
+    def test_adapt_interval_is_bounded(self):
+        channel = Channel(**CHANNEL_DEFAULTS)
+
+        for _ in range(20):
+            channel.adapt_interval(changed=False)
+        self.assertEqual(channel.auto_interval, Channel.AUTO_INTERVAL_MAX)
+
+        for _ in range(20):
+            channel.adapt_interval(changed=True)
+        self.assertEqual(channel.auto_interval, Channel.AUTO_INTERVAL_MIN)
+
+    def test_page_urls(self):
+        channel = Channel(page_url_template='http://host.com/?page={page}', max_pages=3)
+        self.assertEqual(channel.page_urls(), ['http://host.com/?page=2', 'http://host.com/?page=3'])
+        self.assertEqual(Channel(max_pages=3).page_urls(), [])
+        self.assertEqual(Channel(page_url_template='http://host.com/{p}', max_pages=3).page_urls(), [])
+
 
 class EntryTestCase(TestCase):
 
@@ -0,0 +1,52 @@
+from unittest.mock import patch
+
+from django.db import connection
+from django.test import TestCase
+
+from webscraper.models import Entry
+from webscraper.pagination import EstimatedCountPaginator, estimate_count, keyset_cursor, keyset_filter
+from .util import create_channel, create_entry
+
+
+class EstimateCountTestCase(TestCase):
+
+    def setUp(self):
+        self.channel = create_channel()
+        self.entries = [create_entry(channel=self.channel, url='http://ho.st/%d' % i) for i in range(3)]
+
+    def test_estimate_count_uses_reltuples_for_whole_table(self):
+        with connection.cursor() as cursor:
+            cursor.execute('ANALYZE webscraper_entry')
+
+        self.assertEqual(estimate_count(Entry.objects.all()), 3)
+
+    def test_estimate_count_explains_filtered_query(self):
+        self.assertIsInstance(estimate_count(Entry.objects.filter(channel=self.channel)), int)
+
+    def test_paginator_counts_exactly_below_threshold(self):
+        paginator = EstimatedCountPaginator(Entry.objects.filter(channel=self.channel), 2)
+        self.assertEqual(paginator.count, 3)
+        self.assertFalse(paginator.estimated)
+
+    def test_paginator_uses_estimate_above_threshold(self):
+        with patch('webscraper.pagination.estimate_count', return_value=50000):
+            paginator = EstimatedCountPaginator(Entry.objects.all(), 100)
+            self.assertEqual(paginator.count, 50000)
+            self.assertTrue(paginator.estimated)
+
+
+class KeysetTestCase(TestCase):
+
+    def setUp(self):
+        self.channel = create_channel()
+        self.entries = [create_entry(channel=self.channel, url='http://ho.st/%d' % i) for i in range(3)]
+
+    def test_keyset_filter_selects_rows_after_cursor(self):
+        ordered = list(Entry.objects.order_by('-added', '-id'))
+        rv = Entry.objects.filter(keyset_filter(keyset_cursor(ordered[0]))).order_by('-added', '-id')
+        self.assertEqual(list(rv), ordered[1:])
+
+    def test_keyset_filter_rejects_invalid_cursor(self):
+        for cursor in ('', 'garbage', '2017-01-01T00:00:00+00:00,x'):
+            with self.assertRaises(ValueError):
+                keyset_filter(cursor)
@@ -2,7 +2,7 @@ import unittest
 from unittest import mock
 
 from webscraper.models import Channel, Entry
-from webscraper.processing import process_channel, process_entry, parse_channel, parse_entry
+from webscraper.processing import process_channel, process_entry, parse_channel, parse_entry, next_page_url
 from webscraper.futurelite import FutureLite
 from webscraper.aiohttpdownloader import DownloadError
 from webscraper.extractors import ParseError, EntryExtractor
@@ -10,7 +10,7 @@ from webscraper.extractors import ParseError, EntryExtractor
 from django.core.exceptions import ValidationError
 
 from django.test import TestCase
-from .util import create_channel, CHANNEL_DEFAULTS, ENTRY_DEFAULTS
+from .util import create_channel, create_entry, CHANNEL_DEFAULTS, ENTRY_DEFAULTS
 
 
 class FakeResponse:
@@ -19,19 +19,19 @@ class FakeResponse:
 
 
 class ProcessChannelTestCase(TestCase):
-    GOOD_HTML = '<html><a href="1.html">Title</a></html>'
+    GOOD_HTML = b'<html><a href="1.html">Title</a></html>'
 
     def setUp(self):
         self.channel = Channel(**CHANNEL_DEFAULTS)
         self.future = FutureLite()
 
     def test_sets_status_ok(self):
-        self.future.set_result((FakeResponse(), self.GOOD_HTML))
+        self.future.set_result((FakeResponse(), self.GOOD_HTML, 'utf-8'))
         rv = process_channel(self.channel, self.future)
         self.assertEqual(self.channel.status, Channel.ST_OK)
 
     def test_sets_status_warn_if_no_entries(self):
-        self.future.set_result((FakeResponse(), '<html>No entries here</html>'))
+        self.future.set_result((FakeResponse(), b'<html>No entries here</html>', 'utf-8'))
         rv = process_channel(self.channel, self.future)
         self.assertEqual(self.channel.status, Channel.ST_WARNING)
 
@@ -45,15 +45,64 @@ class ProcessChannelTestCase(TestCase):
         process_channel(self.channel, self.future)
         self.assertEqual(self.channel.status, Channel.ST_WARNING)
 
+    def test_adapts_auto_interval(self):
+        self.channel.interval = Channel.I_AUTO
+        self.channel.save()
+        self.future.set_result((FakeResponse(), self.GOOD_HTML, 'utf-8'))
+        process_channel(self.channel, self.future)
+        self.assertEqual(self.channel.changes, 1)
+        self.assertIsNotNone(self.channel.auto_interval)
+
     def test_returns_only_new_entries(self):
         self.channel.save()
         entry_fields = ENTRY_DEFAULTS.copy()
         entry_fields['url'] = 'http://old_url.com'
         e = Entry(channel=self.channel, **entry_fields).save()
-        self.future.set_result((FakeResponse(), self.GOOD_HTML))
+        self.future.set_result((FakeResponse(), self.GOOD_HTML, 'utf-8'))
         rv = process_channel(self.channel, self.future)
         self.assertEqual(len(rv), 1)
 
+    def test_tracks_entries_of_all_pages(self):
+        self.channel.save()
+        create_entry(channel=self.channel, url='http://host.com/old.html')
+        page2 = FutureLite()
+        page2.set_result((FakeResponse(), b'<html><a href="2.html">Title 2</a></html>', 'utf-8'))
+        self.future.set_result((FakeResponse(), self.GOOD_HTML, 'utf-8'))
+        rv = process_channel(self.channel, self.future, more_pages=[page2])
+        self.assertEqual({e.url for e in rv}, {'http://host.com/1.html', 'http://host.com/2.html'})
+        self.assertEqual(self.channel.status, Channel.ST_OK)
+        self.assertFalse(self.channel.entry_set.filter(url='http://host.com/old.html').exists())
+
+    def test_keeps_entries_if_page_failed(self):
+        self.channel.save()
+        create_entry(channel=self.channel, url='http://host.com/old.html')
+        page2 = FutureLite()
+        page2.set_exception(DownloadError('test'))
+        self.future.set_result((FakeResponse(), self.GOOD_HTML, 'utf-8'))
+        rv = process_channel(self.channel, self.future, more_pages=[page2])
+        self.assertEqual(len(rv), 1)
+        self.assertEqual(self.channel.status, Channel.ST_WARNING)
+        self.assertTrue(self.channel.entry_set.filter(url='http://host.com/old.html').exists())
+
+
+class NextPageUrlTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.channel = Channel(next_page_selector='//a[@rel="next"]/@href')
+        self.future = FutureLite()
+
+    def test_returns_absolute_url(self):
+        self.future.set_result((FakeResponse(), b'<html><a rel="next" href="?page=2">Next</a></html>', 'utf-8'))
+        self.assertEqual(next_page_url(self.channel, self.future), 'http://host.com/?page=2')
+
+    def test_returns_none_without_link_or_page(self):
+        self.future.set_result((FakeResponse(), b'<html><a href="?page=2">Next</a></html>', 'utf-8'))
+        self.assertIsNone(next_page_url(self.channel, self.future))
+
+        failed = FutureLite()
+        failed.set_exception(DownloadError('test'))
+        self.assertIsNone(next_page_url(self.channel, failed))
+
 
 class ParseChannelTestCase(unittest.TestCase):
 
@@ -73,14 +122,14 @@ class ParseChannelTestCase(unittest.TestCase):
 
 
 class ProcessEntryTestCase(unittest.TestCase):
-    GOOD_HTML = '<a href="1.jpg"><img src="1tn.jpg"></a>'
+    GOOD_HTML = b'<a href="1.jpg"><img src="1tn.jpg"></a>'
 
     def setUp(self):
         self.entry = Entry(**ENTRY_DEFAULTS)
         self.future = FutureLite()
 
     def test_sets_status_ok(self):
-        self.future.set_result((FakeResponse(), self.GOOD_HTML))
+        self.future.set_result((FakeResponse(), self.GOOD_HTML, 'utf-8'))
         rv = process_entry(self.entry, self.future)
         self.assertEqual(self.entry.status, Entry.ST_OK)
 
@@ -95,10 +144,15 @@ class ProcessEntryTestCase(unittest.TestCase):
         self.assertEqual(self.entry.status, Entry.ST_ERROR)
 
     def test_sets_status_warning_if_no_items(self):
-        self.future.set_result((FakeResponse(), '<html></html>'))
+        self.future.set_result((FakeResponse(), b'<html></html>', 'utf-8'))
         rv = process_entry(self.entry, self.future)
         self.assertEqual(self.entry.status, Entry.ST_WARNING)
 
+    def test_sets_fingerprint(self):
+        self.future.set_result((FakeResponse(), self.GOOD_HTML, 'utf-8'))
+        process_entry(self.entry, self.future)
+        self.assertIsNotNone(self.entry.fingerprint)
+
 
 class ParseEntryTestCase(unittest.TestCase):
 
@@ -112,3 +166,8 @@ class ParseEntryTestCase(unittest.TestCase):
         rv = parse_entry('http://host.com/', self.GOOD_HTML)
         extracted_image_url = rv['images'][0]
         self.assertEqual(extracted_image_url, 'http://host.com/1.jpg')
+
+    def test_parses_bytes_in_given_encoding(self):
+        html = '<a href="фото.jpg"><img src="1tn.jpg"></a>'.encode('cp1251')
+        rv = parse_entry('http://host.com/', html, 'cp1251')
+        self.assertEqual(rv['images'], ['http://host.com/фото.jpg'])
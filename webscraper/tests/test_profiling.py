@@ -0,0 +1,103 @@
+import os
+import tempfile
+import unittest
+from types import SimpleNamespace
+from unittest.mock import Mock
+
+from webscraper.models import Channel
+from webscraper.profiling import ScrapeProfiler, TimedWriter, null_profiler, profile_selectors, selector_hints
+
+
+class ScrapeProfilerTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.profiler = ScrapeProfiler()
+
+    def test_stage_records_calls_and_time(self):
+        for _ in range(3):
+            with self.profiler.stage('parse_entry', 1):
+                sum(range(1000))
+
+        totals = self.profiler.stages['parse_entry']
+        self.assertEqual(totals.calls, 3)
+        self.assertGreater(totals.wall, 0)
+        self.assertGreaterEqual(totals.cpu, 0)
+
+    def test_stage_records_on_exception(self):
+        with self.assertRaises(ValueError):
+            with self.profiler.stage('parse_channel', 1):
+                raise ValueError
+
+        self.assertEqual(self.profiler.stages['parse_channel'].calls, 1)
+
+    def test_attributes_time_to_channels_and_hosts(self):
+        self.profiler.record('download', 2.0, channel_id=1, url='http://slow.com/1')
+        self.profiler.record('download', 0.5, channel_id=2, url='http://fast.com/1')
+        self.profiler.record('parse_entry', 1.0, 0.9, channel_id=2, url='http://fast.com/1')
+
+        self.assertEqual(self.profiler.channel_time.most_common(), [(1, 2.0), (2, 1.5)])
+        self.assertEqual(self.profiler.host_time.most_common(), [('slow.com', 2.0), ('fast.com', 0.5)])
+
+    def test_report_ranks_slowest(self):
+        self.profiler.start()
+        self.profiler.record('download', 2.0, channel_id=1, url='http://slow.com/1')
+        self.profiler.record('download', 0.5, channel_id=2, url='http://fast.com/1')
+        self.profiler.stop()
+        channels = [SimpleNamespace(id=1, title='Slow channel'), SimpleNamespace(id=2, title='Fast channel')]
+        report = self.profiler.report(channels)
+
+        self.assertIn('download', report)
+        self.assertLess(report.index('Slow channel'), report.index('Fast channel'))
+        self.assertLess(report.index('slow.com'), report.index('fast.com'))
+
+    def test_cprofile_and_tracemalloc(self):
+        profiler = ScrapeProfiler(cprofile=True, trace_malloc=True)
+        profiler.start()
+        [str(i) for i in range(1000)]
+        profiler.stop()
+
+        report = profiler.report()
+        self.assertIn('cProfile', report)
+        self.assertIn('tracemalloc', report)
+
+        with tempfile.TemporaryDirectory() as tmpdir:
+            paths = profiler.dump(tmpdir, 'run')
+            self.assertEqual([os.path.basename(p) for p in paths], ['run.prof', 'run.tracemalloc'])
+            self.assertTrue(all(os.path.exists(p) for p in paths))
+
+    def test_null_profiler(self):
+        with null_profiler.stage('download', 1, 'http://host.com/', cpu=False):
+            pass
+
+    def test_timed_writer(self):
+        writer = Mock()
+        TimedWriter(writer, self.profiler).write('model', ['obj'])
+        writer.write.assert_called_once_with('model', ['obj'])
+        self.assertEqual(self.profiler.stages['insert'].calls, 1)
+
+
+PAGE = b"""<html><body>
+<div class="item"><a href="/1">One</a></div>
+<div class="item"><a href="/2">Two</a></div>
+</body></html>"""
+
+
+class SelectorProfileTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.channel = Channel(row_selector='//div[@class="item"]', url_selector='.//a/@href',
+                               title_selector='.//a/text()', extra_selector='')
+
+    def test_profile_selectors(self):
+        profile = profile_selectors(self.channel, PAGE, 'http://host.com/', 'utf-8', repeat=2)
+        self.assertEqual(profile.rows, 2)
+        self.assertEqual([(t.name, t.matches) for t in profile.selectors],
+                         [('row_selector', 2), ('title_selector', 2), ('url_selector', 2)])
+        self.assertGreater(profile.extract_time, 0)
+        self.assertGreater(profile.peak_memory, 0)
+
+    def test_hints_name_slowest_and_document_wide_selectors(self):
+        self.channel.title_selector = '//a/text()'
+        hints = selector_hints(profile_selectors(self.channel, PAGE, 'http://host.com/', repeat=2))
+        self.assertTrue(hints[0].startswith('Slowest selector'))
+        self.assertIn('title_selector starts with "//"', hints[1])
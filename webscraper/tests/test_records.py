@@ -0,0 +1,59 @@
+import unittest
+
+from webscraper.models import Channel, Entry
+from webscraper.records import EntryRecord, RowValidator
+from .util import CHANNEL_DEFAULTS
+
+
+class EntryRecordTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.record = EntryRecord(1, 'http://host.com/1', 'Title')
+
+    def test_has_no_instance_dict(self):
+        with self.assertRaises(AttributeError):
+            self.record.whatever = 1
+
+    def test_real_url(self):
+        self.assertEqual(self.record.real_url, 'http://host.com/1')
+        self.record.real_url = 'http://host.com/2'
+        self.assertEqual(self.record.final_url, 'http://host.com/2')
+        self.assertEqual(self.record.real_url, 'http://host.com/2')
+
+    def test_to_model(self):
+        self.record.status = Entry.ST_OK
+        self.record.items = {'images': ['1.jpg']}
+        entry = self.record.to_model()
+        self.assertIsInstance(entry, Entry)
+        self.assertEqual(entry.channel_id, 1)
+        self.assertEqual((entry.url, entry.title, entry.status), ('http://host.com/1', 'Title', Entry.ST_OK))
+        self.assertEqual(entry.items, {'images': ['1.jpg']})
+
+
+class RowValidatorTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.channel = Channel(id=1, **CHANNEL_DEFAULTS)
+        self.validator = RowValidator()
+
+    def test_splits_valid_and_invalid_rows(self):
+        rows = [
+            {'url': 'http://host.com/1', 'title': 'Good'},
+            {'url': 'invalid_url', 'title': 'Bad url'},
+            {'url': 'http://host.com/2', 'title': None},
+            {'url': 'http://host.com/3', 'title': 'x' * 513},
+        ]
+        valid, invalid = self.validator.records(self.channel, rows)
+        self.assertEqual([r.url for r in valid], ['http://host.com/1'])
+        self.assertEqual(invalid, rows[1:])
+
+    def test_missing_extra_becomes_empty_string(self):
+        valid, _ = self.validator.records(self.channel, [{'url': 'http://host.com/', 'title': 'T', 'extra': None}])
+        self.assertEqual(valid[0].extra, '')
+
+    def test_values_are_plain_strings(self):
+        class SmartString(str):
+            pass
+
+        valid, _ = self.validator.records(self.channel, [{'url': SmartString('http://host.com/'), 'title': 'T'}])
+        self.assertIs(type(valid[0].url), str)
@@ -0,0 +1,90 @@
+import os
+import tempfile
+
+from django.test import TestCase
+
+from webscraper.archive import ResponseArchive
+from webscraper.fingerprint import entry_fingerprint
+from webscraper.models import Entry
+from webscraper.reextraction import reextract, archive_paths
+from .util import create_channel, create_entry
+
+
+class ResponseStub:
+    status = 200
+    reason = 'OK'
+    headers = {'Content-Type': 'text/html'}
+
+    def __init__(self, url):
+        self.url = url
+
+
+class ReextractTestCase(TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tmpdir.name, 'test.warc.gz')
+        self.channel = create_channel(url='http://host.com/')
+        self.entry = create_entry(channel=self.channel, url='http://host.com/1.html', title='Old', items=None)
+
+    def tearDown(self):
+        self.tmpdir.cleanup()
+
+    def archive(self, *pages):
+        with ResponseArchive(self.path) as archive:
+            for url, body, kind in pages:
+                archive.write(url, ResponseStub(url), body, kind=kind, channel=self.channel.id)
+
+    def test_updates_entry_items(self):
+        self.archive(('http://host.com/1.html', b'<a href="1.jpg"><img src="1tn.jpg"></a>', 'entry'))
+        stats = reextract([self.path], processes=1)
+        self.entry.refresh_from_db()
+        self.assertEqual(stats['entries_updated'], 1)
+        self.assertEqual(self.entry.status, Entry.ST_OK)
+        self.assertEqual(self.entry.items, {'images': ['http://host.com/1.jpg']})
+
+    def test_updates_entry_titles_from_channel_page(self):
+        self.archive(('http://host.com/', b'<a href="1.html">New</a><a href="2.html">Not in db</a>', 'channel'))
+        stats = reextract([self.path], processes=1)
+        self.entry.refresh_from_db()
+        self.assertEqual(stats['channel_pages'], 1)
+        self.assertEqual(stats['entries_updated'], 1)
+        self.assertEqual(self.entry.title, 'New')
+        self.assertEqual(Entry.objects.count(), 1)
+
+    def test_uses_latest_response(self):
+        self.archive(('http://host.com/1.html', b'<a href="1.jpg"><img src="1tn.jpg"></a>', 'entry'),
+                     ('http://host.com/1.html', b'<a href="2.jpg"><img src="2tn.jpg"></a>', 'entry'))
+        reextract([self.path], processes=1)
+        self.entry.refresh_from_db()
+        self.assertEqual(self.entry.items, {'images': ['http://host.com/2.jpg']})
+
+    def test_writes_in_batches(self):
+        entry = create_entry(channel=self.channel, url='http://host.com/2.html', items=None)
+        self.archive(('http://host.com/1.html', b'<a href="1.jpg"><img src="1tn.jpg"></a>', 'entry'),
+                     ('http://host.com/2.html', b'<a href="2.jpg"><img src="2tn.jpg"></a>', 'entry'))
+        stats = reextract([self.path], processes=1, batch_size=1)
+        entry.refresh_from_db()
+        self.assertEqual(stats['entry_pages'], 2)
+        self.assertEqual(stats['entries_updated'], 2)
+        self.assertEqual(entry.items, {'images': ['http://host.com/2.jpg']})
+
+    def test_recomputes_fingerprints(self):
+        self.archive(('http://host.com/1.html', b'<a href="1.jpg"><img src="1tn.jpg"></a>', 'entry'),
+                     ('http://host.com/', b'<a href="1.html">New</a>', 'channel'))
+        reextract([self.path], processes=1)
+        self.entry.refresh_from_db()
+        self.assertEqual(self.entry.fingerprint, entry_fingerprint('New', {'images': ['http://host.com/1.jpg']}))
+
+    def test_keeps_duplicates_without_items(self):
+        duplicate = create_entry(channel=self.channel, url='http://host.com/2.html', items=None,
+                                 duplicate_of=self.entry)
+        self.archive(('http://host.com/2.html', b'<a href="1.jpg"><img src="1tn.jpg"></a>', 'entry'))
+        reextract([self.path], processes=1)
+        duplicate.refresh_from_db()
+        self.assertIsNone(duplicate.items)
+        self.assertEqual(duplicate.duplicate_of_id, self.entry.id)
+
+    def test_archive_paths(self):
+        self.archive()
+        self.assertEqual(archive_paths(self.tmpdir.name), [self.path])
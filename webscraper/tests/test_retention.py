@@ -0,0 +1,95 @@
+from datetime import timedelta
+
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.utils import timezone
+
+from webscraper.models import Channel, Entry, MediaItem, PrunedEntry
+from webscraper.retention import prune, expired_ids, retention_limits
+from .util import create_channel, create_entry
+
+
+@override_settings(ENTRY_MAX_ENTRIES=None, ENTRY_MAX_AGE_DAYS=None)
+class RetentionTestCase(TestCase):
+
+    def setUp(self):
+        self.channel = create_channel()
+        self.entries = [create_entry(channel=self.channel, url='http://ho.st/%d' % i) for i in range(5)]
+        self.now = timezone.now()
+
+        for i, entry in enumerate(self.entries):     # Oldest first, one day apart
+            Entry.objects.filter(pk=entry.pk).update(added=self.now - timedelta(days=len(self.entries) - i))
+
+    def test_expired_ids_by_count_keeps_newest(self):
+        rv = expired_ids(self.channel, max_entries=3)
+        self.assertEqual(sorted(rv), [e.id for e in self.entries[:2]])
+
+    def test_expired_ids_by_age(self):
+        rv = expired_ids(self.channel, cutoff=self.now - timedelta(days=3, hours=12))
+        self.assertEqual(sorted(rv), [e.id for e in self.entries[:2]])
+
+    def test_prune_deletes_in_batches(self):
+        self.channel.max_entries = 1
+        self.channel.save()
+        stats = prune([self.channel], batch_size=2)
+        self.assertEqual(stats['entries'], 4)
+        self.assertEqual(list(self.channel.entry_set.all()), [self.entries[-1]])
+
+    def test_prune_marks_pruned_channels_updated(self):
+        untouched = create_channel()
+        self.channel.max_entries = 1
+        self.channel.save()
+        prune([self.channel, untouched])
+        updated = dict(Channel.objects.values_list('id', 'updated'))
+        self.assertIsNotNone(updated[self.channel.id])
+        self.assertIsNone(updated[untouched.id])
+
+    def test_prune_deletes_media_items(self):
+        MediaItem.objects.create_for_entries(self.entries)
+        self.channel.max_age = timedelta(hours=1)
+        self.channel.save()
+        prune([self.channel], now=self.now)
+        self.assertEqual(MediaItem.objects.count(), 0)
+
+    def test_prune_promotes_duplicates_of_deleted_entries(self):
+        duplicate = create_entry(url='http://mirr.or/1', items=None, duplicate_of=self.entries[0])
+        self.channel.max_entries = 4
+        self.channel.save()
+        prune([self.channel])
+
+        with connection.cursor() as cursor:
+            cursor.execute('SET CONSTRAINTS ALL IMMEDIATE')    # Check deferred foreign keys now
+
+        duplicate.refresh_from_db()
+        self.assertIsNone(duplicate.duplicate_of_id)
+        self.assertEqual(duplicate.items, self.entries[0].items)
+
+    def test_pruned_entries_are_not_added_again(self):
+        self.channel.max_entries = 3
+        self.channel.save()
+        prune([self.channel])
+        listed = [Entry(channel=self.channel, url=e.url) for e in self.entries]
+        new_entries = Entry.objects.track_entries(self.channel, listed + [Entry(url='http://ho.st/new')])
+        self.assertEqual([e.url for e in new_entries], ['http://ho.st/new'])
+        self.assertEqual(self.channel.entry_set.count(), 3)
+
+    def test_pruned_urls_are_forgotten_once_off_listing(self):
+        self.channel.max_entries = 3
+        self.channel.save()
+        prune([self.channel])
+        Entry.objects.track_entries(self.channel, [Entry(url=self.entries[0].url)])
+        self.assertEqual(list(PrunedEntry.objects.values_list('url', flat=True)), [self.entries[0].url])
+
+    def test_prune_dry_run_does_not_delete(self):
+        self.channel.max_entries = 2
+        self.channel.save()
+        stats = prune([self.channel], dry_run=True)
+        self.assertEqual(stats['entries'], 3)
+        self.assertEqual(self.channel.entry_set.count(), 5)
+
+    def test_prune_skips_channels_without_limits(self):
+        self.assertEqual(prune([self.channel])['entries'], 0)
+
+    def test_retention_limits_fall_back_to_settings(self):
+        with self.settings(ENTRY_MAX_ENTRIES=10, ENTRY_MAX_AGE_DAYS=7):
+            self.assertEqual(retention_limits(self.channel), (10, timedelta(days=7)))
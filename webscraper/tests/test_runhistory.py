@@ -0,0 +1,72 @@
+from collections import Counter
+from datetime import timedelta
+from unittest.mock import Mock
+
+from django.test import TestCase
+from django.utils import timezone
+
+from webscraper.futurelite import FutureLite
+from webscraper.models import Channel, ChannelRunStat, ScrapeRun
+from webscraper.runhistory import RunRecorder, response_size, wire_size
+from .util import create_channel
+
+
+class RunRecorderTestCase(TestCase):
+
+    def setUp(self):
+        self.channel, self.shed = create_channel(), create_channel()
+        self.recorder = RunRecorder([self.channel, self.shed])
+
+    def test_save_writes_run_and_channel_stats(self):
+        self.channel.status = Channel.ST_OK
+        self.recorder.add(self.channel.id, fetch_time=0.5, parse_time=0.1, bytes=100, entries_new=2)
+        self.recorder.add(self.channel.id, entries=1, fetch_time=1.0, parse_time=0.2, bytes=50)
+        run = self.recorder.save([self.channel], Counter(channels=1, entries=1, channels_shed=1, dns_time=0.3,
+                                                         wire_bytes=60))
+
+        self.assertEqual((run.channels, run.entries, run.bytes, run.channels_shed), (1, 1, 150, 1))
+        self.assertEqual((run.dns_time, run.wire_bytes), (0.3, 60))
+        stat = run.channel_stats.get()
+        self.assertEqual((stat.channel, stat.entries, stat.bytes, stat.entries_new), (self.channel, 1, 150, 2))
+        self.assertAlmostEqual(stat.cost, 1.8)
+        self.assertEqual((stat.status_before, stat.status_after), (Channel.ST_NEW, Channel.ST_OK))
+
+    def test_response_size(self):
+        ok, failed = FutureLite(), FutureLite()
+        ok.set_result((None, b'12345', 'utf-8'))
+        failed.set_exception(ValueError())
+        self.assertEqual(response_size(ok), 5)
+        self.assertEqual(response_size(failed), 0)
+
+    def test_wire_size(self):
+        ok, failed = FutureLite(), FutureLite()
+        resp = Mock(headers={'Content-Encoding': 'gzip', 'Content-Length': '3'}, wire_size=None)
+        ok.set_result((resp, b'12345', 'utf-8'))
+        failed.set_exception(ValueError())
+        self.assertEqual(wire_size(ok), 3)
+        self.assertEqual(wire_size(failed), 0)
+
+
+class ChannelRunStatTrendsTestCase(TestCase):
+
+    def setUp(self):
+        self.steady, self.creeping = create_channel(title='Steady'), create_channel(title='Creeping')
+        now = timezone.now()
+
+        for i, cost in enumerate([1, 1, 3, 3]):     # Oldest first
+            run = ScrapeRun.objects.create(started=now + timedelta(hours=i), finished=now + timedelta(hours=i))
+            ChannelRunStat.objects.create(run=run, channel=self.steady, fetch_time=1, status_before=1, status_after=1)
+            ChannelRunStat.objects.create(run=run, channel=self.creeping, fetch_time=cost, parse_time=0.5,
+                                          status_before=1, status_after=1)
+
+    def test_trends_rank_growing_channels_first(self):
+        trends = ChannelRunStat.objects.trends(runs=2)
+        self.assertEqual([row['channel__title'] for row in trends], ['Creeping', 'Steady'])
+        self.assertEqual((trends[0]['recent'], trends[0]['previous'], trends[0]['runs']), (3.5, 1.5, 4))
+        self.assertAlmostEqual(trends[0]['growth'], 3.5 / 1.5)
+        self.assertEqual(trends[1]['growth'], 1)
+
+    def test_trends_without_previous_runs(self):
+        trends = ChannelRunStat.objects.trends(runs=10)
+        self.assertEqual({row['previous'] for row in trends}, {None})
+        self.assertEqual({row['growth'] for row in trends}, {None})
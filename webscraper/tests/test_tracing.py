@@ -0,0 +1,77 @@
+import json
+import os
+import tempfile
+import unittest
+from unittest.mock import Mock
+
+from webscraper.models import Channel, Entry
+from webscraper.tracing import TracedWriter, null_tracer, open_run_trace
+
+
+class TracerTestCase(unittest.TestCase):
+
+    def setUp(self):
+        tmpdir = tempfile.TemporaryDirectory()
+        self.addCleanup(tmpdir.cleanup)
+        self.tracer = open_run_trace(os.path.join(tmpdir.name, 'traces'))
+
+    def spans(self):
+        self.tracer.close()
+
+        with open(self.tracer.path) as f:
+            return [json.loads(line) for line in f]
+
+    def test_entry_spans_are_children_of_channel_span(self):
+        channel = Channel(id=1, url='http://host.com/')
+        entry = Entry(channel_id=1, url='http://other.com/1')
+
+        with self.tracer.channel_span(channel) as span:
+            with self.tracer.span('download', span) as download_span:
+                download_span.set(bytes=100)
+
+            self.tracer.adopt(span, [entry])
+
+        with self.tracer.entry_span(entry):
+            pass
+
+        download, channel_span, entry_span = self.spans()
+        self.assertEqual((download['name'], download['attrs']), ('download', {'bytes': 100}))
+        self.assertEqual(download['parent_id'], channel_span['span_id'])
+        self.assertEqual(entry_span['parent_id'], channel_span['span_id'])
+        self.assertEqual({download['trace_id'], entry_span['trace_id']}, {channel_span['trace_id']})
+        self.assertEqual(entry_span['attrs']['host'], 'other.com')
+        self.assertGreaterEqual(channel_span['end'], channel_span['start'])
+
+    def test_span_records_error(self):
+        with self.assertRaises(ValueError):
+            with self.tracer.span('parse', status=None):
+                raise ValueError('bad')
+
+        span, = self.spans()
+        self.assertEqual(span['attrs'], {'error': repr(ValueError('bad'))})
+
+    def test_traced_writer(self):
+        writer = Mock()
+        TracedWriter(writer, self.tracer).write(Entry, ['obj'])
+        writer.write.assert_called_once_with(Entry, ['obj'])
+        span, = self.spans()
+        self.assertEqual(span['attrs'], {'model': 'Entry', 'rows': 1})
+        self.assertEqual(span['links'], [])
+
+    def test_insert_span_links_entry_spans(self):
+        entries = [Entry(channel_id=1, url='http://host.com/%d' % i) for i in range(2)]
+
+        for entry in entries:
+            with self.tracer.entry_span(entry):
+                pass
+
+        TracedWriter(Mock(), self.tracer).write(Entry, entries + [Entry(channel_id=1, url='http://host.com/3')])
+        *entry_spans, insert_span = self.spans()
+        self.assertEqual(insert_span['links'], [{'trace_id': span['trace_id'], 'span_id': span['span_id']}
+                                                for span in entry_spans])
+        self.assertIsNone(entries[0]._trace_parent)
+
+    def test_null_tracer(self):
+        with null_tracer.channel_span(Channel()) as span:
+            with null_tracer.span('download', span):
+                span.set(bytes=1)
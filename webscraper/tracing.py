@@ -0,0 +1,161 @@
+"""Lightweight scrape tracing: a span per channel with child spans per entry, exported as JSON lines"""
+import binascii
+import json
+import os
+import time
+from datetime import datetime, timezone
+
+from .hoststats import host_of
+
+
+class Tracer:
+
+    """Writes finished spans to a file, one JSON object per line.
+
+    Each channel starts a trace, its entries are child spans of the channel span. Span context is kept on entry
+    objects, so it goes away with them
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._file = open(path, 'a')
+        self.spans = 0
+
+    def span(self, name, parent=None, links=(), **attrs):
+        """New span, child of `parent` span if given, linked to spans of (trace_id, span_id) `links`.
+        Use as context manager"""
+        if parent is None:
+            return Span(self, name, new_id(16), None, attrs, links)
+
+        return Span(self, name, parent.trace_id, parent.span_id, attrs, links)
+
+    def channel_span(self, channel):
+        """Root span for channel, parent of its entry spans, see adopt()"""
+        return self.span('channel', channel_id=channel.id, url=channel.url, host=host_of(channel.url))
+
+    def adopt(self, span, entries):
+        """Make span parent of spans of given entries"""
+        for entry in entries:
+            entry._trace_parent = span
+
+    def entry_span(self, entry):
+        """Span for entry, linked to by insert span of its batch, see TracedWriter"""
+        span = self.span('entry', getattr(entry, '_trace_parent', None), channel_id=entry.channel_id,
+                         url=entry.url, host=host_of(entry.url))
+        entry._trace_parent = None
+        entry._trace_context = (span.trace_id, span.span_id)
+        return span
+
+    def links(self, objs):
+        """(trace_id, span_id) of entry spans of given objects"""
+        return [obj._trace_context for obj in objs if getattr(obj, '_trace_context', None)]
+
+    def export(self, span, end, duration):
+        """Write finished span. Attributes set to None are left out, values JSON can not hold are written as repr"""
+        attrs = {name: value for name, value in span.attrs.items() if value is not None}
+        links = [{'trace_id': trace_id, 'span_id': span_id} for trace_id, span_id in span.links]
+        record = {'trace_id': span.trace_id, 'span_id': span.span_id, 'parent_id': span.parent_id, 'links': links,
+                  'name': span.name, 'start': span.start, 'end': end, 'duration': duration, 'attrs': attrs}
+        self._file.write(json.dumps(record, default=repr) + '\n')
+        self.spans += 1
+
+    def close(self):
+        self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+
+class Span:
+
+    __slots__ = ('_tracer', 'name', 'trace_id', 'span_id', 'parent_id', 'links', 'attrs', 'start', '_started')
+
+    def __init__(self, tracer, name, trace_id, parent_id, attrs, links=()):
+        self._tracer = tracer
+        self.name = name
+        self.trace_id = trace_id
+        self.span_id = new_id(8)
+        self.parent_id = parent_id
+        self.links = links
+        self.attrs = attrs
+        self.start = self._started = None
+
+    def set(self, **attrs):
+        self.attrs.update(attrs)
+
+    def __enter__(self):
+        self.start, self._started = time.time(), time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        if exc_val is not None:
+            self.attrs['error'] = exc_val
+
+        duration = time.perf_counter() - self._started
+        self._tracer.export(self, self.start + duration, duration)
+        return False
+
+
+class NullTracer:
+
+    """Tracer that records nothing, used when tracing is off"""
+
+    def span(self, *args, **kwargs):
+        return NULL_SPAN
+
+    def channel_span(self, channel):
+        return NULL_SPAN
+
+    def adopt(self, span, entries):
+        pass
+
+    def entry_span(self, entry):
+        return NULL_SPAN
+
+    def links(self, objs):
+        return []
+
+
+class NullSpan:
+
+    trace_id = span_id = None
+
+    def set(self, **attrs):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        return False
+
+
+NULL_SPAN = NullSpan()
+null_tracer = NullTracer()
+
+
+class TracedWriter:
+
+    """Wraps InsertBuffer writer, recording a span for each batch insert, linked to spans of inserted entries"""
+
+    def __init__(self, writer, tracer):
+        self._writer = writer
+        self._tracer = tracer
+
+    def write(self, model, objs):
+        with self._tracer.span('insert', links=self._tracer.links(objs), model=model.__name__, rows=len(objs)):
+            return self._writer.write(model, objs)
+
+
+def new_id(size):
+    return binascii.hexlify(os.urandom(size)).decode('ascii')
+
+
+def open_run_trace(trace_dir):
+    """Create trace file for current scrape run in given directory"""
+    os.makedirs(trace_dir, exist_ok=True)
+    filename = 'trace-%s.jsonl' % datetime.now(timezone.utc).strftime('%Y%m%d-%H%M%S')
+    return Tracer(os.path.join(trace_dir, filename))